@@ -1,13 +1,42 @@
+import asyncio
 import httpx
-from typing import Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import settings
+from app.utils.instrumentation import instrumented_client
+from app.services.permissions import is_admin_cached
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+# Set by share_current_user() so every sub-request of a batch resolves the
+# user through one WordPress call. Maps token -> task fetching the user.
+_shared_users: ContextVar[Optional[Dict[str, asyncio.Task]]] = ContextVar("shared_users", default=None)
+
+
+@contextmanager
+def share_current_user():
+    """Resolve get_current_user at most once per token inside this block."""
+    reset_token = _shared_users.set({})
+    try:
+        yield
+    finally:
+        _shared_users.reset(reset_token)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    async with httpx.AsyncClient() as client:
+    shared = _shared_users.get()
+    if shared is None:
+        return await fetch_current_user(token)
+    if token not in shared:
+        shared[token] = asyncio.ensure_future(fetch_current_user(token))
+    return await asyncio.shield(shared[token])
+
+
+async def fetch_current_user(token: str):
+    async with instrumented_client("wordpress") as client:
         try:
             response = await client.get(
                 f"{settings.WP_URL}/wp-json/wp/v2/users/me",
@@ -24,6 +53,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
     return response.json()
 
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if not await is_admin_cached(int(current_user["id"])):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 async def get_optional_token(request: Request) -> Optional[str]:
     auth: str = request.headers.get("Authorization")
     if auth and auth.lower().startswith("bearer "):
@@ -0,0 +1,47 @@
+# app/api/v1/endpoints/admin.py
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List
+from app.schemas.admin import ProfilingWindowRequest, ProfilingWindowResponse, ProfileSummary
+from app.utils import profiler
+
+router = APIRouter()
+
+def require_profiler():
+    if not profiler.available():
+        raise HTTPException(status_code=501, detail="Profiling requires pyinstrument")
+
+@router.post("/profiling", response_model=ProfilingWindowResponse)
+async def start_profiling(window: ProfilingWindowRequest):
+    """Profile every request on every worker for the next `seconds`."""
+    require_profiler()
+    until = await profiler.open_window(window.seconds)
+    return {"enabled": True, "until": until}
+
+@router.delete("/profiling", response_model=ProfilingWindowResponse)
+async def stop_profiling():
+    await profiler.close_window()
+    return {"enabled": False}
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+async def list_profiles(limit: int = Query(50, ge=1, le=profiler.PROFILE_INDEX_SIZE)):
+    """Most recent profiles first."""
+    return await profiler.list_profiles(limit)
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    view: str = Query("wall", enum=list(profiler.VIEWS), description="wall: awaits included; cpu: only time spent running"),
+    format: str = Query("speedscope", enum=list(profiler.FORMATS), description="speedscope flamegraph JSON or pyinstrument HTML"),
+):
+    require_profiler()
+    rendered = await profiler.render_profile(profile_id, view, format)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Profile not found or expired")
+
+    body, media_type = rendered
+    extension = "html" if format == "html" else "speedscope.json"
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}-{view}.{extension}"'},
+    )
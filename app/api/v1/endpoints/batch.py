@@ -0,0 +1,122 @@
+# app/api/v1/endpoints/batch.py
+from fastapi import APIRouter, Request
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from urllib.parse import urlsplit
+from app.api.deps import share_current_user
+from app.core.config import settings
+from app.utils import admission
+from app.utils.metrics import REQUESTS_SHED
+from app.schemas.batch import BatchRequest, BatchResponse, BatchSubRequest, BatchItemResponse
+import asyncio
+import json
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1"
+
+# Parent headers that must not leak into sub-requests: the body headers belong
+# to the batch POST, and sub-responses are embedded as JSON so they can't be
+# precompressed.
+DROPPED_HEADERS = {b"content-length", b"content-type", b"accept-encoding", b"if-none-match", b"if-modified-since"}
+
+# Sub-response headers worth passing back to the client
+KEPT_RESPONSE_HEADERS = {"etag", "last-modified", "cache-control", "x-wp-total", "x-wp-totalpages"}
+
+
+def build_scope(parent: dict, sub: BatchSubRequest) -> dict:
+    parts = urlsplit(sub.path)
+    path = parts.path if parts.path.startswith(API_PREFIX) else API_PREFIX + "/" + parts.path.lstrip("/")
+
+    headers = [(k, v) for k, v in parent["headers"] if k not in DROPPED_HEADERS]
+    overrides = {k.lower().encode(): v.encode() for k, v in sub.headers.items()}
+    headers = [(k, v) for k, v in headers if k not in overrides] + list(overrides.items())
+
+    return {
+        **{k: v for k, v in parent.items() if k not in ("router", "route", "endpoint", "path_params")},
+        "method": sub.method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": headers,
+    }
+
+
+async def run_in_router(request: Request, scope: dict):
+    """Run a request scope through the app's router, skipping the middleware stack."""
+    start = {}
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await request.app.router(scope, receive, send)
+    headers = {k.decode().lower(): v.decode() for k, v in start.get("headers", [])}
+    return start.get("status", 500), headers, b"".join(chunks)
+
+
+async def dispatch(request: Request, sub: BatchSubRequest) -> BatchItemResponse:
+    scope = build_scope(request.scope, sub)
+    if scope["path"].rstrip("/") == f"{API_PREFIX}/batch":
+        return BatchItemResponse(id=sub.id, path=sub.path, status=400, body={"detail": "Nested batch requests are not allowed"})
+
+    # Sub-requests skip the middleware stack, so admission control is applied
+    # here: catalog reads in a batch are shed just like single ones
+    if settings.ADMISSION_CONTROL and admission.is_low_priority(scope["method"], scope["path"]):
+        reason = admission.overload_reason(settings.ADMISSION_MAX_LAG_MS / 1000, settings.ADMISSION_MAX_IN_FLIGHT)
+        if reason:
+            REQUESTS_SHED.labels(reason).inc()
+            return BatchItemResponse(
+                id=sub.id,
+                path=sub.path,
+                status=503,
+                headers={"retry-after": str(settings.ADMISSION_RETRY_AFTER)},
+                body={"detail": "Server busy, retry shortly"},
+            )
+
+    try:
+        status, headers, raw = await run_in_router(request, scope)
+        # Follow the router's trailing-slash redirect instead of handing it back
+        if status in (307, 308) and "location" in headers:
+            redirected = sub.model_copy(update={"path": urlsplit(headers["location"])._replace(scheme="", netloc="").geturl()})
+            status, headers, raw = await run_in_router(request, build_scope(request.scope, redirected))
+    except StarletteHTTPException as e:
+        # Raised by the router itself (e.g. unknown path)
+        return BatchItemResponse(id=sub.id, path=sub.path, status=e.status_code, body={"detail": e.detail})
+    except Exception as e:
+        logger.error(f"Batch sub-request {sub.path} failed: {e}")
+        return BatchItemResponse(id=sub.id, path=sub.path, status=500, body={"detail": "Internal server error"})
+
+    body = None
+    if raw:
+        if headers.get("content-type", "").startswith("application/json"):
+            body = json.loads(raw)
+        else:
+            body = raw.decode(errors="replace")
+
+    return BatchItemResponse(
+        id=sub.id,
+        path=sub.path,
+        status=status,
+        headers={k: v for k, v in headers.items() if k in KEPT_RESPONSE_HEADERS},
+        body=body,
+    )
+
+
+@router.post("/", response_model=BatchResponse)
+async def batch(batch_request: BatchRequest, request: Request):
+    """
+    Run several GET requests in one round trip. Sub-requests run concurrently
+    with the batch's own headers (Authorization included), and the current
+    user is resolved once for the whole batch.
+    """
+    with share_current_user():
+        responses = await asyncio.gather(*(dispatch(request, sub) for sub in batch_request.requests))
+    return {"responses": responses}
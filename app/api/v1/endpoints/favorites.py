@@ -1,7 +1,9 @@
 # app/api/v1/endpoints/favorites.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from typing import List
 from app.api.deps import oauth2_scheme
 from app.services.favorites import favorite_service
+from app.schemas.favorite import FavoritesBatchUpdate
 
 router = APIRouter(tags=["favorites"])
 
@@ -9,6 +11,16 @@ router = APIRouter(tags=["favorites"])
 async def list_favorites(token: str = Depends(oauth2_scheme)):
     return await favorite_service.get_favorites(token)
 
+@router.get("/check")
+async def check_favorites(ids: List[int] = Query(...), token: str = Depends(oauth2_scheme)):
+    """Favorite flags for a page of products (?ids=1&ids=2...) in one lookup."""
+    return await favorite_service.are_favorites(token, ids)
+
+@router.post("/batch")
+async def update_favorites(changes: FavoritesBatchUpdate, token: str = Depends(oauth2_scheme)):
+    """Add and remove many favorites at once; returns the resulting favorites."""
+    return await favorite_service.update_favorites(token, changes.add, changes.remove)
+
 @router.post("/{product_id}")
 async def add_favorite(product_id: int, token: str = Depends(oauth2_scheme)):
     return await favorite_service.add_favorite(token, product_id)
@@ -1,24 +1,74 @@
 # app/api/v1/endpoints/orders.py
-from fastapi import APIRouter, Depends
-from typing import Optional
-from app.services.orders import create_user_order, list_user_orders
-from app.schemas.order import OrderCreate, OrderResponse, PaginatedOrderResponse
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import JSONResponse
+from typing import Optional, Union
+from app.services.orders import create_user_order, list_user_orders, list_user_orders_by_cursor
+from app.services.pricing import quote_order
+from app.schemas.order import (
+    OrderCreate, OrderResponse, PaginatedOrderResponse, CursorOrderResponse,
+    OrderQuoteRequest, OrderQuoteResponse,
+)
 from app.api.deps import get_current_user
 from app.schemas.token import TokenData  # or your user schema
+from app.utils.idempotency import run_idempotent, request_fingerprint
+from app.utils.scheduler import upstream_priority
 
 router = APIRouter()
 
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
+    response: Response,
     current_user: TokenData = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
 ):
-    return await create_user_order(order_data, current_user)
+    if not idempotency_key:
+        with upstream_priority("payment"):
+            return await create_user_order(order_data, current_user)
 
-@router.get("/", response_model=PaginatedOrderResponse)
+    # A retried or double-submitted checkout replays the first order instead
+    # of creating a second WooCommerce order and PaymentIntent
+    async def create():
+        with upstream_priority("payment"):
+            order = await create_user_order(order_data, current_user)
+        return order.model_dump()
+
+    result, replayed = await run_idempotent(
+        f"orders:{current_user['id']}",
+        idempotency_key,
+        request_fingerprint(order_data.model_dump()),
+        create,
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return OrderResponse(**result)
+
+@router.post("/quote", response_model=OrderQuoteResponse)
+async def quote(
+    quote_data: OrderQuoteRequest,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """Price a cart and validate its coupons without creating an order."""
+    email = quote_data.email or current_user.get("email")
+    return await quote_order(quote_data.line_items, quote_data.coupon_lines, email)
+
+@router.get("/", response_model=Union[PaginatedOrderResponse, CursorOrderResponse])
 async def list_orders(
     current_user: TokenData = Depends(get_current_user),
-    page: Optional[int] = 1,
-    per_page: Optional[int] = 10,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(
+        None,
+        description="Cursor pagination: empty for the first page, then the returned next_cursor"
+    ),
 ):
-    return await list_user_orders(current_user, page, per_page)
+    if cursor is not None:
+        result = await list_user_orders_by_cursor(current_user, cursor, per_page)
+        headers = {"X-WP-Total": str(result["total"])}
+    else:
+        result = await list_user_orders(current_user, page, per_page)
+        headers = {"X-WP-Total": str(result["total"]), "X-WP-TotalPages": str(result["total_pages"])}
+
+    # Orders are already compact OrderListResponse projections; returning the
+    # response directly skips re-validating every order
+    return JSONResponse(result, headers=headers)
@@ -1,18 +1,31 @@
 # app/api/v1/endpoints/products.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from app.services.products import (
     get_products_for_user,
     get_products_for_user_library,
+    iter_products_for_user_library,
     get_product_by_slug,
     get_all_product_authors,
     get_all_product_genres,
     get_all_featured_products,
-    get_favorite_products_for_user
+    get_favorite_products_for_user,
+    get_product_authors,
+    get_products_by_authors,
+    get_products_by_cursor,
+    CATALOG_TAG,
+    product_tag,
 )
+from app.services.reviews import get_product_reviews, get_rating_summaries, reviews_cache_key, reviews_tag, REVIEWS_CACHE_TTL
+from app.services.favorites import favorite_service
 from app.api.deps import oauth2_scheme, get_optional_token
 from app.schemas.filters import ProductFilters
-from app.utils.cache import get_cached, set_cached
+from app.utils.cache import get_cached, set_cached, get_or_build_entry
+from app.utils.fields import FIELD_PRESETS, resolve_fields, fields_cache_token
+from app.utils.http_cache import cached_response, is_anonymous
+from app.utils.streaming import ndjson_lines, wants_ndjson, NDJSON_MEDIA_TYPE
+import asyncio
 import json
 import logging
 
@@ -24,6 +37,16 @@ CACHE_TTL_GENRES = 300
 CACHE_TTL_AUTHORS = 300
 CACHE_TTL_FEATURED = 600
 CACHE_TTL_LIBRARY = 180
+CACHE_TTL_PRODUCT_DETAIL = 300
+CACHE_TTL_RELATED = 600
+
+FIELDS_DESCRIPTION = (
+    f"Comma separated product fields, or a preset: {', '.join(FIELD_PRESETS)}"
+)
+CURSOR_DESCRIPTION = (
+    "Cursor pagination: pass an empty value for the first page, then the returned "
+    "next_cursor. The response becomes {data, next_cursor} and `page` is ignored."
+)
 
 def make_cache_key(prefix: str, user_id: Optional[int] = None, filters: dict = None, slug: str = None):
     key_parts = [prefix]
@@ -35,89 +58,212 @@ def make_cache_key(prefix: str, user_id: Optional[int] = None, filters: dict = N
         key_parts.append(str(user_id))
     return ":".join(key_parts)
 
+def with_fields(filters: dict, fields: Optional[str]) -> dict:
+    """Add the normalized ?fields= value to the filters used for the cache key."""
+    token = fields_cache_token(fields)
+    if not token:
+        return filters
+    return {**filters, "fields": token}
+
 def make_cache_key_with_token(base: str, user_id: Optional[int], slug: str, token: Optional[str]) -> str:
     token_part = f":{hash(token)}" if token else ""
     return make_cache_key(base, user_id, slug=slug) + token_part
 
 @router.get("/")
-async def list_products(filters: ProductFilters = Depends(), user_id: Optional[int] = Query(None)):
-    cache_key = make_cache_key("products", user_id, filters.dict())
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    products = await get_products_for_user(user_id, filters.dict())
-    await set_cached(cache_key, products, ttl=CACHE_TTL_PRODUCTS)
-    return products
+async def list_products(
+    request: Request,
+    filters: ProductFilters = Depends(),
+    user_id: Optional[int] = Query(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION)
+):
+    if cursor is not None:
+        # Cursor pages don't shift, so each one is cached like any other page
+        key_filters = {**with_fields(filters.dict(), fields), "cursor": cursor}
+        key_filters.pop("page", None)
+        build = lambda: get_products_by_cursor(user_id, filters.dict(), cursor, resolve_fields(fields))
+    else:
+        key_filters = with_fields(filters.dict(), fields)
+        build = lambda: get_products_for_user(user_id, filters.dict(), resolve_fields(fields))
+
+    cache_key = make_cache_key("products", user_id, key_filters)
+    return await cached_response(
+        request,
+        cache_key,
+        CACHE_TTL_PRODUCTS,
+        build,
+        public=is_anonymous(request, user_id),
+        surrogate_keys=["products"],
+        precompress=True,
+        tags=[CATALOG_TAG],
+    )
 
 @router.get("/library")
-async def list_ebook_products(filters: ProductFilters = Depends(), user_id: Optional[int] = Query(None)):
-    cache_key = make_cache_key("library_products", user_id, filters.dict())
+async def list_ebook_products(
+    request: Request,
+    filters: ProductFilters = Depends(),
+    user_id: Optional[int] = Query(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    stream: bool = Query(False, description="Stream products as NDJSON while pages are fetched"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION)
+):
+    # Streaming skips the cache: holding the whole library to store it is
+    # exactly the memory spike streaming avoids
+    if wants_ndjson(request, stream):
+        return StreamingResponse(
+            ndjson_lines(iter_products_for_user_library(user_id, filters.dict(), resolve_fields(fields))),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    # Pages are sliced from a cached per-user library index
+    if cursor is not None:
+        return await get_products_by_cursor(user_id, filters.dict(), cursor, resolve_fields(fields), library=True)
+
+    cache_key = make_cache_key("library_products", user_id, with_fields(filters.dict(), fields))
     cached = await get_cached(cache_key)
     if cached:
         return cached
-    products = await get_products_for_user_library(user_id, filters.dict())
+    products = await get_products_for_user_library(user_id, filters.dict(), resolve_fields(fields))
     await set_cached(cache_key, products, ttl=CACHE_TTL_LIBRARY)
     return products
 
 @router.get("/featured")
-async def list_featured_products(featured: bool = True):
-    cache_key = make_cache_key("featured_products", filters={"featured": featured})
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    products = await get_all_featured_products({"featured": featured})
-    await set_cached(cache_key, products, ttl=CACHE_TTL_FEATURED)
-    return products
+async def list_featured_products(
+    request: Request,
+    featured: bool = True,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    cache_key = make_cache_key("featured_products", filters=with_fields({"featured": featured}, fields))
+    return await cached_response(
+        request,
+        cache_key,
+        CACHE_TTL_FEATURED,
+        lambda: get_all_featured_products({"featured": featured}, resolve_fields(fields)),
+        public=is_anonymous(request),
+        surrogate_keys=["products", "featured"],
+        precompress=True,
+        tags=[CATALOG_TAG],
+    )
 
 @router.get("/genres")
-async def list_product_genres():
+async def list_product_genres(request: Request):
     cache_key = make_cache_key("genres")
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    genres = await get_all_product_genres()
-    await set_cached(cache_key, genres, ttl=CACHE_TTL_GENRES)
-    return genres
+    return await cached_response(
+        request,
+        cache_key,
+        CACHE_TTL_GENRES,
+        get_all_product_genres,
+        public=is_anonymous(request),
+        surrogate_keys=["genres"],
+        precompress=True,
+        tags=[CATALOG_TAG],
+    )
 
 @router.get("/authors")
-async def list_product_authors(search: Optional[str] = Query(None)):
+async def list_product_authors(request: Request, search: Optional[str] = Query(None)):
     cache_key = make_cache_key("authors", filters={"search": search or "all"})
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
-    authors = await get_all_product_authors()
-    if search:
-        search_lower = search.lower()
-        authors = [a for a in authors if search_lower in a.lower()]
-    result = [{"name": a} for a in authors]
-    await set_cached(cache_key, result, ttl=CACHE_TTL_AUTHORS)
-    return result
+
+    async def build():
+        authors = await get_all_product_authors()
+        if search:
+            search_lower = search.lower()
+            authors = [a for a in authors if search_lower in a.lower()]
+        return [{"name": a} for a in authors]
+
+    return await cached_response(
+        request,
+        cache_key,
+        CACHE_TTL_AUTHORS,
+        build,
+        public=is_anonymous(request),
+        surrogate_keys=["authors"],
+        precompress=True,
+        tags=[CATALOG_TAG],
+    )
 
 @router.get("/favorites")
 async def list_favorite_products(token: str = Depends(oauth2_scheme)):
     products = await get_favorite_products_for_user(token)
     return products
 
+@router.get("/{slug}/bundle")
+async def get_product_bundle(
+    slug: str,
+    user_id: Optional[int] = Query(None),
+    token: Optional[str] = Depends(get_optional_token)
+):
+    """
+    Everything a product page needs in one response: product, first review
+    page, rating summary, favorite flag and other books by the same author.
+    Independent lookups run concurrently and each part is cached under the
+    same key as the endpoint that serves it on its own.
+    """
+    async def load_favorite_flag(product_id):
+        if not token:
+            return None
+        flags = await favorite_service.are_favorites(token, [product_id])
+        return flags[product_id]
+
+    # 1. Everything else needs the product
+    product = await get_or_build_entry(
+        make_cache_key("product_detail", user_id, slug=slug),
+        lambda: get_product_by_slug(slug, user_id),
+        ttl=CACHE_TTL_PRODUCT_DETAIL,
+        precompress=True,
+        tags=[product_tag(slug)],
+    )
+    # The favorite flag is per token, it's reported next to the product instead
+    product.pop("favorite", None)
+    product_id = product["id"]
+    authors = get_product_authors(product)
+
+    # 2. Favorite flag, reviews, rating and related books run concurrently
+    favorite, reviews, ratings, related = await asyncio.gather(
+        load_favorite_flag(product_id),
+        get_or_build_entry(
+            reviews_cache_key(product_id, 1),
+            lambda: get_product_reviews(product_id, 1),
+            ttl=REVIEWS_CACHE_TTL,
+            tags=[reviews_tag(product_id)],
+        ),
+        get_rating_summaries([product_id]),
+        get_or_build_entry(
+            make_cache_key("author_products", filters={"authors": sorted(authors), "exclude": product_id}),
+            lambda: get_products_by_authors(authors, exclude_id=product_id),
+            ttl=CACHE_TTL_RELATED,
+            tags=[CATALOG_TAG],
+        ),
+    )
+
+    return {
+        "product": product,
+        "reviews": reviews,
+        "rating": ratings[product_id],
+        "favorite": favorite,
+        "related": related,
+    }
+
 @router.get("/{slug}")
 async def get_product(
+    request: Request,
     slug: str,
     user_id: Optional[int] = Query(None),
-    token: Optional[str] = Depends(get_optional_token)
+    token: Optional[str] = Depends(get_optional_token),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
     # 1. Create a dynamic cache key
     # We include user_id because permissions (Read Now vs Add to Cart) change the JSON
-    cache_key = make_cache_key("product_detail", user_id, slug=slug)
-    
-    # 2. Try to get from Redis
-    cached = await get_cached(cache_key)
-    if cached:
-        return cached
+    cache_key = make_cache_key("product_detail", user_id, with_fields({}, fields), slug=slug)
 
-    # 3. If not in Redis, fetch from WooCommerce
-    product = await get_product_by_slug(slug, user_id, token)
-    
-    # 4. Store in Redis for 5 minutes (300 seconds)
-    # Don't cache for too long since purchase status changes
-    await set_cached(cache_key, product, ttl=300)
-    
-    return product
+    # 2. Serve from Redis (or answer 304), otherwise fetch from WooCommerce
+    # Store for 5 minutes (300 seconds) - don't cache for too long since purchase status changes
+    return await cached_response(
+        request,
+        cache_key,
+        CACHE_TTL_PRODUCT_DETAIL,
+        lambda: get_product_by_slug(slug, user_id, token, resolve_fields(fields)),
+        public=is_anonymous(request, user_id),
+        surrogate_keys=["products", f"product-{slug}"],
+        precompress=True,
+        tags=[product_tag(slug)],
+    )
@@ -1,9 +1,50 @@
 # app/api/v1/endpoints/products.py
-from fastapi import APIRouter
-from app.services.reviews import get_product_reviews
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List
+from app.services.reviews import (
+    get_product_reviews,
+    get_rating_summaries,
+    stream_product_reviews,
+    reviews_cache_key,
+    reviews_tag,
+    REVIEWS_CACHE_TTL,
+)
+from app.utils.http_cache import cached_response, is_anonymous
+from app.utils.streaming import ndjson_lines, NDJSON_MEDIA_TYPE
 
 router = APIRouter()
 
+@router.get("/summary")
+async def get_review_summaries(product: List[int] = Query(..., max_length=100)):
+    """Rating count, average and histogram for many products (?product=1&product=2...)."""
+    summaries = await get_rating_summaries(product)
+    return list(summaries.values())
+
 @router.get("/")
-async def get_reviews(product: int, page: int = 1):
-    return await get_product_reviews(product, page)
+async def get_reviews(
+    request: Request,
+    product: List[int] = Query(..., max_length=50),
+    page: int = 1,
+    all_pages: bool = False,
+):
+    """
+    Reviews for one product page (JSON array), or, with several products or
+    `all_pages`, every matching review streamed as NDJSON in completion order.
+    """
+    if len(product) > 1 or all_pages:
+        return StreamingResponse(
+            ndjson_lines(stream_product_reviews(product, page=page, all_pages=all_pages)),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    product = product[0]
+    return await cached_response(
+        request,
+        reviews_cache_key(product, page),
+        REVIEWS_CACHE_TTL,
+        lambda: get_product_reviews(product, page),
+        public=is_anonymous(request),
+        surrogate_keys=["reviews", f"reviews-{product}"],
+        tags=[reviews_tag(product)],
+    )
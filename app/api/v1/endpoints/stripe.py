@@ -3,12 +3,8 @@ from fastapi.security import OAuth2PasswordBearer
 from app.core.config import settings
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-import os
-from dotenv import load_dotenv
-import stripe
-
-load_dotenv()
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+from app.services.stripe import get_stripe, stripe_response_size
+from app.utils.instrumentation import track
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -33,13 +29,16 @@ def decode_token(token: str):
 async def get_login_link(token: str = Depends(oauth2_scheme)):
     user = decode_token(token)
     stripe_account_id = user.get("stripe_account_id")
+    stripe = get_stripe()
 
     if not stripe_account_id:
         raise HTTPException(status_code=400, detail="No connected Stripe account.")
 
     try:
         # Get Stripe account information
-        account = stripe.Account.retrieve(stripe_account_id)
+        with track("stripe", "accounts/{id}") as call:
+            account = stripe.Account.retrieve(stripe_account_id)
+            call.bytes = stripe_response_size(account)
         
         # Check if onboarding is completed
         charges_enabled = account.get("charges_enabled", False)
@@ -48,12 +47,14 @@ async def get_login_link(token: str = Depends(oauth2_scheme)):
         # If onboarding is not completed
         if not charges_enabled or not details_submitted:
             # Create account link to complete onboarding
-            account_link = stripe.AccountLink.create(
-                account=stripe_account_id,
-                refresh_url=f"{os.getenv('REDIRECT_URL')}/profile",  # URL when refresh
-                return_url=f"{os.getenv('REDIRECT_URL')}/profile",    # URL after onboarding
-                type="account_onboarding",
-            )
+            with track("stripe", "account_links") as call:
+                account_link = stripe.AccountLink.create(
+                    account=stripe_account_id,
+                    refresh_url=f"{settings.REDIRECT_URL}/profile",  # URL when refresh
+                    return_url=f"{settings.REDIRECT_URL}/profile",    # URL after onboarding
+                    type="account_onboarding",
+                )
+                call.bytes = stripe_response_size(account_link)
             
             return {
                 "url": account_link.url,
@@ -62,7 +63,9 @@ async def get_login_link(token: str = Depends(oauth2_scheme)):
             }
         
         # If onboarding is completed, create login link
-        login_link = stripe.Account.create_login_link(stripe_account_id)
+        with track("stripe", "accounts/{id}/login_links") as call:
+            login_link = stripe.Account.create_login_link(stripe_account_id)
+            call.bytes = stripe_response_size(login_link)
         return {
             "url": login_link.url,
             "onboarding_completed": True,
@@ -1,7 +1,7 @@
 # app/api/v1/routers.py
 from fastapi import APIRouter, Depends
-from app.api.v1.endpoints import auth, products, reviews, users, orders, favorites, stripe
-from app.api.deps import get_current_user
+from app.api.v1.endpoints import auth, products, reviews, users, orders, favorites, stripe, batch, admin
+from app.api.deps import get_current_user, get_admin_user
 
 api_router = APIRouter()
 
@@ -12,3 +12,5 @@ api_router.include_router(users.router, prefix="/users", tags=["users"], depende
 api_router.include_router(orders.router, prefix="/orders", tags=["orders"], dependencies=[Depends(get_current_user)])
 api_router.include_router(favorites.router, prefix="/favorites", tags=["favorites"], dependencies=[Depends(get_current_user)])
 api_router.include_router(stripe.router, prefix="/stripe", tags=["stripe"], dependencies=[Depends(get_current_user)])
+api_router.include_router(batch.router, prefix="/batch", tags=["batch"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"], dependencies=[Depends(get_admin_user)])
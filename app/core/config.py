@@ -1,12 +1,15 @@
 # app/core/config.py
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # WooCommerce Settings
     WC_API_URL: str
     WC_CONSUMER_KEY: str
     WC_CONSUMER_SECRET: str
+    WC_WEBHOOK_SECRET: str = ""
+    WC_MAX_CONCURRENCY: int = 32  # Ceiling for the adaptive limit on concurrent WooCommerce calls per worker
+    UPSTREAM_HEDGING: bool = True  # Hedge slow catalog reads (per-endpoint policies in app/utils/retry.py)
     
     # WordPress/JWT Settings
     WP_URL: str
@@ -16,12 +19,26 @@ class Settings(BaseSettings):
     WP_ADMIN_USER: str
     WP_ADMIN_PASS: str
     REDIRECT_URL: str
+    WP_MAX_CONCURRENCY: int = 16  # Ceiling for the adaptive limit on concurrent WordPress calls per worker
 
     # Redis Settings
     REDIS_HOST: str
     REDIS_PORT: int
+    REDIS_PASSWORD: Optional[str] = None
     REDIS_USE_SSL: bool = False
     ENVIRONMENT: str = "production" 
+
+    # Instrumentation
+    SERVER_TIMING: bool = True  # Per-dependency timings in a Server-Timing header
+
+    # Request deadlines (seconds; some routes get longer, clients can ask for less)
+    REQUEST_TIMEOUT: float = 15.0
+
+    # Admission control (per worker; low priority catalog reads are shed first)
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_MAX_LAG_MS: int = 200  # Event loop lag past which catalog reads get a 503
+    ADMISSION_MAX_IN_FLIGHT: int = 200  # In-flight requests past which catalog reads get a 503
+    ADMISSION_RETRY_AFTER: int = 2  # Seconds, sent as Retry-After on shed requests
    
     # Stripe Settings
     STRIPE_SECRET_KEY: str
@@ -1,10 +1,30 @@
 # app/core/security.py
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Optional
+from jose import JWTError, jwt
+from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def pwd_context():
+    """Passwords are checked by WordPress, so passlib is only loaded if these are called."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context().hash(password)
+
+def get_token_user_id(token: str) -> Optional[int]:
+    """User ID from a WordPress JWT (jwt-auth puts it under data.user.id), or None if invalid."""
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    user_id = payload.get("data", {}).get("user", {}).get("id")
+    try:
+        return int(user_id) if user_id else None
+    except (TypeError, ValueError):
+        return None
@@ -1,16 +1,41 @@
 # app/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.api.v1.routers import api_router
-from app.utils.cache import redis
+from app.utils.cache import redis, pool, binary_pool, close_redis, get_negative_cache_stats
+from app.utils.metrics import sample_runtime, render_metrics, mark_worker_dead
+from app.middleware.admission import AdmissionMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.deadline import DeadlineMiddleware
+from app.middleware.instrumentation import InstrumentationMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.utils.profiler import poll_window
+from app.utils.admission import monitor_loop_lag
+from app.utils.recaptcha import get_client as get_recaptcha_client
+from app.services.stripe import get_stripe
+import asyncio
 import logging
 
 from app.webhooks import stripe as stripe_webhook
+from app.webhooks import woocommerce as woocommerce_webhook
 
 logger = logging.getLogger(__name__)
 
+async def warm_up_sdks():
+    """
+    Load the SDKs kept out of the cold start in a thread once the app is
+    up. Loaded by the first payment or login instead, they'd block the
+    event loop for up to a second and trip the lag monitor.
+    """
+    for load in (get_stripe, get_recaptcha_client):
+        try:
+            await asyncio.to_thread(load)
+        except Exception as e:
+            # Imported all the same; the first real call retries the rest
+            logger.warning(f"Warming up {load.__module__} failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -20,21 +45,39 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Redis connection failed: {e}")
         # Don't raise - let app start without Redis
+
+    sampler = asyncio.create_task(sample_runtime({"default": pool, "binary": binary_pool}))
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    profiling_poller = asyncio.create_task(poll_window())
+    warm_up = asyncio.create_task(warm_up_sdks())
     
     yield
     
     # Shutdown
-    try:
-        await redis.close()
-        logger.info("Redis connection closed")
-    except Exception as e:
-        logger.error(f"Error closing Redis: {e}")
+    warm_up.cancel()
+    sampler.cancel()
+    lag_monitor.cancel()
+    profiling_poller.cancel()
+    mark_worker_dead()
+    await close_redis()
 
 app = FastAPI(
     title="Left Koast Productions API",
     lifespan=lifespan
 )
 
+# Request deadlines (innermost, so a 504 still gets CORS headers)
+app.add_middleware(DeadlineMiddleware)
+
+# Admission control (inside CORS, so shed 503s still get CORS headers)
+app.add_middleware(
+    AdmissionMiddleware,
+    max_lag_ms=settings.ADMISSION_MAX_LAG_MS,
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+    enabled=settings.ADMISSION_CONTROL,
+)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -44,13 +87,28 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
+# Compression (added last so it wraps CORS and sees the final response)
+app.add_middleware(CompressionMiddleware)
+
+# On-demand profiling (admin header or global window; a pass-through otherwise)
+app.add_middleware(ProfilingMiddleware)
+
+# Dependency accounting (outermost, so its timings cover the whole request)
+app.add_middleware(InstrumentationMiddleware, server_timing=settings.SERVER_TIMING)
+
 app.include_router(api_router, prefix="/api/v1")
 app.include_router(stripe_webhook.router)
+app.include_router(woocommerce_webhook.router)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Left Koast Productions API"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
     redis_status = "disconnected"
@@ -64,5 +122,6 @@ async def health_check():
     return {
         "status": "healthy",
         "redis": redis_status,
+        "negative_cache": await get_negative_cache_stats(),
         "version": "2.0.0"
     }
\ No newline at end of file
@@ -0,0 +1,60 @@
+# app/middleware/admission.py
+import json
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.utils import admission
+from app.utils.metrics import REQUESTS_SHED
+
+
+class AdmissionMiddleware:
+    """
+    Shed low priority requests (catalog browsing) with a 503 and Retry-After
+    while this worker's event loop lags or too many requests are in flight.
+    Checkout, auth, webhook and per-user routes are always admitted, so a
+    browse spike can't starve them.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_lag_ms: int = 200,
+        max_in_flight: int = 200,
+        retry_after: int = 2,
+        enabled: bool = True,
+    ) -> None:
+        self.app = app
+        self.max_lag = max_lag_ms / 1000
+        self.max_in_flight = max_in_flight
+        self.retry_after = str(retry_after).encode()
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.enabled and admission.is_low_priority(scope["method"], scope["path"]):
+            reason = admission.overload_reason(self.max_lag, self.max_in_flight)
+            if reason:
+                REQUESTS_SHED.labels(reason).inc()
+                await self.reject(send)
+                return
+
+        admission.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.request_finished()
+
+    async def reject(self, send: Send) -> None:
+        body = json.dumps({"detail": "Server busy, retry shortly"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self.retry_after),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
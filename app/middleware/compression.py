@@ -0,0 +1,76 @@
+# app/middleware/compression.py
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.compression import brotli, encoded_etag, negotiate_encoding, MINIMUM_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+
+class EncodedETagMixin:
+    """Give bodies this responder compresses the ETag of their encoded variant."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def send_tagged(message: Message) -> None:
+            # Bodies that arrived encoded (precompressed entries) are tagged already
+            if message["type"] == "http.response.start" and not self.content_encoding_set:
+                headers = MutableHeaders(raw=message["headers"])
+                if headers.get("content-encoding") == self.content_encoding and "etag" in headers:
+                    headers["etag"] = encoded_etag(headers["etag"], self.content_encoding)
+            await send(message)
+
+        await super().__call__(scope, receive, send_tagged)
+
+
+class FlushingGZipResponder(EncodedETagMixin, GZipResponder):
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # Starlette only flushes at the end, which holds a streamed response
+        # back until it's complete; sync-flush every chunk like brotli does
+        if more_body:
+            self.gzip_file.write(body)
+            self.gzip_file.flush(zlib.Z_SYNC_FLUSH)
+            body = self.gzip_buffer.getvalue()
+            self.gzip_buffer.seek(0)
+            self.gzip_buffer.truncate()
+            return body
+        return super().apply_compression(body, more_body=more_body)
+
+
+class BrotliResponder(EncodedETagMixin, IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = BROTLI_QUALITY) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.process(body)
+        # Flush every chunk so streamed responses reach the client as they're produced
+        return data + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli response compression negotiated from Accept-Encoding.
+
+    Responses that already carry a Content-Encoding (precompressed cache
+    entries) are passed through untouched, as are bodies under `minimum_size`.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size)
+        elif encoding == "gzip":
+            responder = FlushingGZipResponder(self.app, self.minimum_size, compresslevel=GZIP_LEVEL)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+
+        await responder(scope, receive, send)
@@ -0,0 +1,95 @@
+# app/middleware/deadline.py
+import asyncio
+import json
+import logging
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.deadline import DeadlineExceeded, TIMEOUT_HEADER, cancellable, deadline_scope, request_timeout
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineMiddleware:
+    """
+    Give each request a time budget (route default, or a shorter
+    `X-Request-Timeout`) and stop working on it when it runs out or the
+    client disconnects, so abandoned requests stop using upstream capacity.
+
+    The budget covers the time to the response headers: a streamed response
+    that has started keeps going for as long as the client reads it, but is
+    still cancelled if the client goes away. A request out of time before it
+    answered gets a 504.
+
+    Multi-step writes (checkout, webhooks) are never cancelled: they only
+    get a 504 if they run out of time before their first upstream write.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = request_timeout(scope["path"], Headers(scope=scope).get(TIMEOUT_HEADER))
+        cancel = cancellable(scope["method"], scope["path"])
+        loop = asyncio.get_running_loop()
+        messages: asyncio.Queue = asyncio.Queue()
+        started = finished = disconnected = False
+
+        with deadline_scope(seconds):
+            timer = asyncio.timeout(seconds if cancel else None)
+
+            # Read the client's messages ahead of the app so a disconnect is
+            # seen even while the app is busy waiting on upstreams
+            async def watch_client():
+                nonlocal disconnected
+                while True:
+                    message = await receive()
+                    messages.put_nowait(message)
+                    if message["type"] == "http.disconnect":
+                        if not finished:
+                            disconnected = True
+                            timer.reschedule(loop.time())
+                        return
+
+            async def send_tracking(message: Message) -> None:
+                nonlocal started, finished
+                if message["type"] == "http.response.start":
+                    started = True
+                    if not disconnected:
+                        timer.reschedule(None)
+                elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                    finished = True
+                await send(message)
+
+            watcher = asyncio.create_task(watch_client()) if cancel else None
+            try:
+                async with timer:
+                    await self.app(scope, messages.get if cancel else receive, send_tracking)
+            except (TimeoutError, DeadlineExceeded) as e:
+                if isinstance(e, TimeoutError) and not timer.expired():
+                    raise  # Some inner timeout, not ours
+                if disconnected:
+                    logger.info(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+                    return
+                logger.warning(f"Deadline of {seconds}s exceeded for {scope['method']} {scope['path']}")
+                if not started:
+                    await self.timed_out(send)
+            finally:
+                if watcher:
+                    watcher.cancel()
+
+    async def timed_out(self, send: Send) -> None:
+        body = json.dumps({"detail": "Request timed out"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,57 @@
+# app/middleware/instrumentation.py
+import json
+import logging
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.instrumentation import request_scope
+from app.utils.metrics import REQUESTS_IN_FLIGHT, observe_request
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware:
+    """
+    Collect calls, bytes and time per dependency (WooCommerce, WordPress,
+    Stripe, reCAPTCHA, Redis) for every request. They are sent as a
+    Server-Timing header and logged as one JSON line when the response ends,
+    and the request's latency goes into the per-route histogram.
+
+    Streamed responses keep working after the headers are sent, so their
+    header only covers the work done up to then; the log line covers it all.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = True) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        REQUESTS_IN_FLIGHT.inc()
+        with request_scope() as metrics:
+            async def send_with_timing(message: Message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if self.server_timing:
+                        MutableHeaders(scope=message).append("Server-Timing", metrics.server_timing())
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                REQUESTS_IN_FLIGHT.dec()
+                route = getattr(scope.get("route"), "path", None)
+                observe_request(scope["method"], route, status, metrics.elapsed())
+                logger.info(json.dumps({
+                    "event": "request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round(metrics.elapsed() * 1000, 1),
+                    "deps": metrics.summary(),
+                }))
@@ -0,0 +1,76 @@
+# app/middleware/profiling.py
+import time
+import uuid
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.security import get_token_user_id
+from app.services.permissions import is_admin_cached
+from app.utils import profiler
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request when an admin sends `X-Profile: 1` (the response then
+    carries `X-Profile-Id`), or every request while an admin has opened a
+    global profiling window. Otherwise requests pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profiler.available():
+            await self.app(scope, receive, send)
+            return
+
+        requested = self.requested(scope)
+        if not requested and not profiler.window_open():
+            await self.app(scope, receive, send)
+            return
+        if requested and not await self.is_admin(scope):
+            requested = False
+            if not profiler.window_open():
+                await self.app(scope, receive, send)
+                return
+
+        profile_id = uuid.uuid4().hex[:16]
+        status = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if requested:
+                    MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        started = time.time()
+        running = profiler.start_profiler()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            await profiler.save_profile(profile_id, running, {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "started": started,
+                "wall_ms": round((time.time() - started) * 1000, 1),
+                "trigger": "header" if requested else "window",
+            })
+
+    @staticmethod
+    def requested(scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == profiler.PROFILE_HEADER:
+                return value not in (b"", b"0", b"false")
+        return False
+
+    @staticmethod
+    async def is_admin(scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                user_id = get_token_user_id(token) if scheme.lower() == "bearer" else None
+                return bool(user_id) and await is_admin_cached(int(user_id))
+        return False
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.utils.profiler import MAX_PROFILING_SECONDS
+
+class ProfilingWindowRequest(BaseModel):
+    seconds: int = Field(..., ge=1, le=MAX_PROFILING_SECONDS, description="How long to profile every request")
+
+class ProfilingWindowResponse(BaseModel):
+    enabled: bool
+    until: Optional[float] = None
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    query: str = ""
+    status: int
+    started: float
+    wall_ms: float
+    cpu_ms: float
+    trigger: str
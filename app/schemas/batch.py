@@ -0,0 +1,24 @@
+# app/schemas/batch.py
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+MAX_BATCH_SIZE = 20
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = Field(None, description="Client reference echoed back in the response")
+    method: Literal["GET"] = "GET"
+    path: str = Field(..., description="Path with optional query string", example="/products/featured")
+    headers: Dict[str, str] = {}
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class BatchItemResponse(BaseModel):
+    id: Optional[str] = None
+    path: str
+    status: int
+    headers: Dict[str, str] = {}
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResponse]
@@ -0,0 +1,9 @@
+# app/schemas/favorite.py
+from pydantic import BaseModel, Field
+from typing import List
+
+MAX_FAVORITES_BATCH = 200
+
+class FavoritesBatchUpdate(BaseModel):
+    add: List[int] = Field(default_factory=list, max_length=MAX_FAVORITES_BATCH)
+    remove: List[int] = Field(default_factory=list, max_length=MAX_FAVORITES_BATCH)
@@ -30,6 +30,32 @@ class OrderCreate(BaseModel):
     line_items: List[LineItem]
     coupon_lines: Optional[List[CouponLineCreate]] = []
 
+class OrderQuoteRequest(BaseModel):
+    line_items: List[LineItem]
+    coupon_lines: Optional[List[CouponLineCreate]] = []
+    email: Optional[EmailStr] = None  # For coupons restricted to certain emails
+
+class QuoteLineItem(BaseModel):
+    product_id: int
+    name: Optional[str] = None
+    quantity: int
+    price: str
+    subtotal: str
+    total: str
+
+class QuoteCoupon(BaseModel):
+    code: str
+    discount: str
+
+class OrderQuoteResponse(BaseModel):
+    valid: bool
+    errors: List[str]
+    line_items: List[QuoteLineItem]
+    coupons: List[QuoteCoupon]
+    subtotal: str
+    discount: str
+    total: str
+
 class OrderResponse(BaseModel):
     id: int
     status: str
@@ -62,4 +88,9 @@ class PaginatedOrderResponse(BaseModel):
     total: int
     total_pages: int
     current_page: int
-    per_page: int
\ No newline at end of file
+    per_page: int
+
+class CursorOrderResponse(BaseModel):
+    data: List[OrderListResponse]
+    total: int
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -4,6 +4,7 @@ import httpx
 from fastapi import HTTPException, status
 from app.core.config import settings
 from app.utils.recaptcha import create_assessment  # Add this import
+from app.utils.instrumentation import instrumented_client, track
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,12 +19,13 @@ class AuthService:
     async def authenticate_user(self, username: str, password: str, recaptchaToken: str):
         # VERIFY RECAPTCHA FIRST - before any authentication attempt
         try:
-            assessment = create_assessment(
-                project_id=settings.RECAPTCHA_PROJECT_ID,
-                recaptcha_key=settings.RECAPTCHA_SITE_KEY,
-                token=recaptchaToken,
-                recaptcha_action="login_form"
-            )
+            with track("recaptcha", "assessments"):
+                assessment = create_assessment(
+                    project_id=settings.RECAPTCHA_PROJECT_ID,
+                    recaptcha_key=settings.RECAPTCHA_SITE_KEY,
+                    token=recaptchaToken,
+                    recaptcha_action="login_form"
+                )
             
             # Check if token is valid
             if not assessment or not assessment.token_properties.valid:
@@ -58,7 +60,7 @@ class AuthService:
 
         # NOW proceed with WordPress authentication
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with instrumented_client("wordpress", timeout=self.timeout) as client:
                 auth_response = await client.post(
                     self.jwt_endpoint,
                     data={"username": username, "password": password}
@@ -120,12 +122,13 @@ class AuthService:
 
         # VERIFY RECAPTCHA FIRST - before any authentication attempt
         try:
-            assessment = create_assessment(
-                project_id=settings.RECAPTCHA_PROJECT_ID,
-                recaptcha_key=settings.RECAPTCHA_SITE_KEY,
-                token=recaptchaToken,
-                recaptcha_action="register_form"
-            )
+            with track("recaptcha", "assessments"):
+                assessment = create_assessment(
+                    project_id=settings.RECAPTCHA_PROJECT_ID,
+                    recaptcha_key=settings.RECAPTCHA_SITE_KEY,
+                    token=recaptchaToken,
+                    recaptcha_action="register_form"
+                )
             
             # Check if token is valid
             if not assessment or not assessment.token_properties.valid:
@@ -179,7 +182,7 @@ class AuthService:
             }
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with instrumented_client("wordpress", timeout=self.timeout) as client:
                 payload = {
                     "username": username,
                     "email": email,
@@ -239,7 +242,7 @@ class AuthService:
                 "redirect_url": settings.REDIRECT_URL
             }
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with instrumented_client("wordpress", timeout=self.timeout) as client:
                 response = await client.post(
                     self.lost_password_endpoint,
                     json=payload,
@@ -289,7 +292,7 @@ class AuthService:
         reset_password_endpoint = f"{settings.WP_URL}/wp-json/custom/v1/reset-password"
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with instrumented_client("wordpress", timeout=self.timeout) as client:
                 payload = {
                     "key": key,
                     "login": login,
@@ -1,10 +1,34 @@
+import asyncio
 import httpx
+from typing import Dict, List, Optional
 from app.core.config import settings
+from app.core.security import get_token_user_id
+from app.utils.cache import (
+    get_cached_set,
+    set_cached_set,
+    add_to_cached_set,
+    remove_from_cached_set,
+    update_cached_set,
+    cached_set_contains,
+)
+from app.utils.instrumentation import instrumented_client
+
+# Favorites only change through add/remove below, which write through to the
+# cached set, so it can live long
+FAVORITES_CACHE_TTL = 3600
+
+# How many add/remove calls a bulk update sends to WordPress at once
+FAVORITES_BATCH_CONCURRENCY = 5
 
 class FavoriteService:
     def __init__(self):
         self.base_url = f"{settings.WP_URL}/wp-json/custom/v1/favorites"
 
+    def _cache_key(self, token: str) -> Optional[str]:
+        # Keyed by user rather than token so every session of a user shares it
+        user_id = get_token_user_id(token)
+        return f"favorites:{user_id}" if user_id else None
+
     async def _handle_response(self, resp: httpx.Response, action: str):
         try:
             resp.raise_for_status()
@@ -20,8 +44,8 @@ class FavoriteService:
                 "data": None,
             }
 
-    async def get_favorites(self, token: str):
-        async with httpx.AsyncClient() as client:
+    async def _fetch_favorites(self, token: str):
+        async with instrumented_client("wordpress") as client:
             resp = await client.get(
                 self.base_url,
                 headers={"Authorization": f"Bearer {token}"}
@@ -29,22 +53,122 @@ class FavoriteService:
             
             return await self._handle_response(resp, "Get favorites")
 
+    async def get_favorites(self, token: str):
+        cache_key = self._cache_key(token)
+        if cache_key:
+            members = await get_cached_set(cache_key)
+            if members is not None:
+                return {
+                    "success": True,
+                    "message": "Get favorites successful",
+                    "data": sorted(int(m) for m in members),
+                }
+
+        result = await self._fetch_favorites(token)
+        if cache_key and result["success"] and isinstance(result["data"], list):
+            result["data"] = [int(pid) for pid in result["data"]]
+            await set_cached_set(cache_key, result["data"], ttl=FAVORITES_CACHE_TTL)
+        return result
+
+    async def are_favorites(self, token: str, product_ids: List[int]) -> Dict[int, bool]:
+        """Favorite flag for every product in one membership call."""
+        if not product_ids:
+            return {}
+
+        cache_key = self._cache_key(token)
+        if cache_key:
+            flags = await cached_set_contains(cache_key, product_ids)
+            if flags is not None:
+                return dict(zip(product_ids, flags))
+
+        # Not loaded yet: load it (this also fills the cache)
+        result = await self.get_favorites(token)
+        favorite_ids = set(result["data"]) if result["success"] and isinstance(result["data"], list) else set()
+        return {pid: pid in favorite_ids for pid in product_ids}
+
     async def add_favorite(self, token: str, product_id: int):
-        async with httpx.AsyncClient() as client:
+        async with instrumented_client("wordpress") as client:
             resp = await client.post(
                 f"{self.base_url}/add",
                 headers={"Authorization": f"Bearer {token}"},
                 json={"product_id": product_id}
             )
-            return await self._handle_response(resp, "Add favorite")
+            result = await self._handle_response(resp, "Add favorite")
+
+        cache_key = self._cache_key(token)
+        if cache_key and result["success"]:
+            await add_to_cached_set(cache_key, [product_id], ttl=FAVORITES_CACHE_TTL)
+        return result
 
     async def remove_favorite(self, token: str, product_id: int):
-        async with httpx.AsyncClient() as client:
+        async with instrumented_client("wordpress") as client:
             resp = await client.post(
                 f"{self.base_url}/remove",
                 headers={"Authorization": f"Bearer {token}"},
                 json={"product_id": product_id}
             )
-            return await self._handle_response(resp, "Remove favorite")
+            result = await self._handle_response(resp, "Remove favorite")
+
+        cache_key = self._cache_key(token)
+        if cache_key and result["success"]:
+            await remove_from_cached_set(cache_key, [product_id])
+        return result
+
+    async def update_favorites(self, token: str, add: List[int], remove: List[int]):
+        """
+        Apply many adds/removes at once. Changes that are already in effect
+        are skipped, the rest go to WordPress over one client with bounded
+        concurrency, and the successful ones are written to the cached set
+        in one round trip.
+        """
+        current = await self.get_favorites(token)
+        if not current["success"]:
+            return current
+        favorite_ids = set(current["data"] or [])
+
+        # Adds are applied before removes, then only the difference is sent
+        wanted = (favorite_ids | set(add)) - set(remove)
+        to_add = sorted(wanted - favorite_ids)
+        to_remove = sorted(favorite_ids - wanted)
+
+        semaphore = asyncio.Semaphore(FAVORITES_BATCH_CONCURRENCY)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async with instrumented_client("wordpress") as client:
+            async def send(action: str, product_id: int) -> bool:
+                async with semaphore:
+                    try:
+                        resp = await client.post(
+                            f"{self.base_url}/{action}",
+                            headers=headers,
+                            json={"product_id": product_id}
+                        )
+                        resp.raise_for_status()
+                        return True
+                    except httpx.HTTPError:
+                        return False
+
+            results = await asyncio.gather(
+                *(send("add", pid) for pid in to_add),
+                *(send("remove", pid) for pid in to_remove),
+            )
+
+        add_results, remove_results = results[:len(to_add)], results[len(to_add):]
+        added = [pid for pid, ok in zip(to_add, add_results) if ok]
+        removed = [pid for pid, ok in zip(to_remove, remove_results) if ok]
+        failed = [pid for pid, ok in zip(to_add + to_remove, results) if not ok]
+
+        cache_key = self._cache_key(token)
+        if cache_key:
+            await update_cached_set(cache_key, added, removed, ttl=FAVORITES_CACHE_TTL)
+
+        favorite_ids.update(added)
+        favorite_ids.difference_update(removed)
+        return {
+            "success": not failed,
+            "message": "Update favorites successful" if not failed else f"Update favorites failed for {len(failed)} products",
+            "data": sorted(favorite_ids),
+            "failed": failed,
+        }
 
 favorite_service = FavoriteService()
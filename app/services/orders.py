@@ -1,19 +1,49 @@
 from app.schemas.order import OrderCreate, OrderResponse, OrderListResponse
 from app.schemas.token import TokenData
+from app.services.pricing import quote_order
 from app.services.stripe import create_stripe_payment_intent
 from app.utils.wc_api import wc_api
-from app.utils.cache import invalidate_cache
+from app.utils.cache import invalidate_cache, invalidate_cache_keys, get_cached, set_cached
+from app.utils.deadline import lift_deadline
+from app.utils.idempotency import mark_committed
+from app.utils.cursor import decode_cursor, encode_cursor, normalize_sort_key, query_fingerprint, seek
 from fastapi import HTTPException
+from typing import Dict, List
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
+# Order history only changes when the user places an order or a payment
+# completes, and both paths invalidate it, so it can live long
+ORDER_HISTORY_TTL = 3600
+
+ORDER_LINE_ITEM_FIELDS = ("id", "name", "quantity", "total", "product_id", "sku")
+
+def order_history_key(user_id: int) -> str:
+    return f"order_history:{user_id}"
+
+async def invalidate_order_history(user_id: int):
+    await invalidate_cache_keys([order_history_key(user_id)])
+
 async def create_user_order(order_data: OrderCreate, current_user: TokenData) -> OrderResponse:
     user_id = int(current_user["id"])
+
+    # Reject carts WooCommerce would price differently or refuse before
+    # writing anything upstream, so failed checkouts leave no orders behind
+    quote = await quote_order(order_data.line_items, order_data.coupon_lines, order_data.billing.email)
+    if not quote["valid"]:
+        raise HTTPException(status_code=400, detail=" ".join(quote["errors"]))
+
     line_items_payload = []
     
     for item in order_data.line_items:
         line_item_dict = item.dict() if hasattr(item, 'dict') else item
+        # The client's `total` is a unit price, checked by the quote above;
+        # WooCommerce would take it as the line total, so let it price the
+        # line from the product as the quote did
+        line_item_dict.pop("total", None)
+        line_item_dict.pop("subtotal", None)
         line_item_dict["meta_data"] = line_item_dict.get("meta_data", [])
         author_stripe_id = getattr(item, 'authorStripeID', None) or line_item_dict.get('authorStripeID')
         
@@ -40,6 +70,11 @@ async def create_user_order(order_data: OrderCreate, current_user: TokenData) ->
         # Create WooCommerce order
         created_order = await wc_api.create_order(payload)
         order_id = created_order["id"]
+        # The order exists: see the checkout through even past the deadline,
+        # and don't let a retry with the same Idempotency-Key create another
+        lift_deadline()
+        mark_committed()
+        await invalidate_order_history(user_id)
         billing = created_order.get("billing", {})
         total_amount = float(created_order["total"])
         amount_in_cents = int(total_amount * 100)
@@ -48,6 +83,7 @@ async def create_user_order(order_data: OrderCreate, current_user: TokenData) ->
         if amount_in_cents == 0:
             # Mark order as complete in WC
             await wc_api.update_order(order_id, status="completed")
+            await invalidate_order_history(user_id)
             
             # Clear the library list
             await invalidate_cache(f"library_products:*:{user_id}")
@@ -100,9 +136,76 @@ async def create_user_order(order_data: OrderCreate, current_user: TokenData) ->
             raise e
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
-async def list_user_orders(current_user: TokenData, page, per_page):
+def compact_order(order: Dict) -> Dict:
+    """The fields order history shows (OrderListResponse), nothing else."""
+    return {
+        "id": order["id"],
+        "status": order["status"],
+        "total": order["total"],
+        "date_created": order["date_created"],
+        "line_items": [
+            {k: item.get(k) for k in ORDER_LINE_ITEM_FIELDS}
+            for item in order.get("line_items", [])
+        ],
+    }
+
+async def get_order_history(user_id: int) -> List[Dict]:
+    """Every order of a user as compact projections, oldest first."""
+    cached = await get_cached(order_history_key(user_id))
+    if cached is not None:
+        return cached
+
+    orders = []
+    page = 1
+    while True:
+        result = await wc_api.list_orders(
+            customer_id=user_id,
+            page=page,
+            per_page=100,
+            fields="id,status,total,date_created,line_items"
+        )
+        orders.extend(compact_order(order) for order in result["data"])
+        if page >= result["total_pages"]:
+            break
+        page += 1
+
+    orders.sort(key=lambda o: (normalize_sort_key(o["date_created"]), o["id"]))
+    await set_cached(order_history_key(user_id), orders, ttl=ORDER_HISTORY_TTL)
+    return orders
+
+async def load_order_history(current_user: TokenData) -> List[Dict]:
     try:
-        return await wc_api.list_orders(customer_id=current_user["id"], page=page, per_page=per_page)
+        return await get_order_history(int(current_user["id"]))
     except Exception as e:
         logger.error(f"Error listing orders: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to list orders: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to list orders: {str(e)}")
+
+async def list_user_orders_by_cursor(current_user: TokenData, cursor: str, per_page: int):
+    """Newest first; the page after `cursor` is found by binary search in the cached history."""
+    fingerprint = query_fingerprint({"customer": int(current_user["id"])})
+    position = decode_cursor(cursor, fingerprint)
+
+    orders = await load_order_history(current_user)
+    index = [(normalize_sort_key(o["date_created"]), o["id"]) for o in orders]
+    entries, has_more = seek(index, position, per_page, descending=True)
+    by_id = {o["id"]: o for o in orders}
+
+    return {
+        "data": [by_id[order_id] for _, order_id in entries],
+        "total": len(orders),
+        "next_cursor": encode_cursor(*entries[-1], fingerprint) if has_more and entries else None,
+    }
+
+async def list_user_orders(current_user: TokenData, page, per_page):
+    """Newest first, sliced from the cached history."""
+    orders = await load_order_history(current_user)
+    newest_first = orders[::-1]
+    start = (page - 1) * per_page
+
+    return {
+        "data": newest_first[start:start + per_page],
+        "total": len(orders),
+        "total_pages": math.ceil(len(orders) / per_page),
+        "current_page": page,
+        "per_page": per_page
+    }
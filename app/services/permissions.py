@@ -7,6 +7,8 @@ from requests.auth import HTTPBasicAuth
 
 from app.core.config import settings
 from app.utils.wc_api import wc_api
+from app.utils.cache import get_cached, set_cached
+from app.utils.instrumentation import instrumented_client
 import logging  # ← Add this
 
 logger = logging.getLogger(__name__)  # ← Add this
@@ -41,7 +43,7 @@ async def has_purchased(user_id: int, product_id: int) -> bool:
 # --- Permission Check Helpers ---
 async def is_admin(user_id: int) -> bool:
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with instrumented_client("woocommerce", timeout=10) as client:
             response = await client.get(
                 f"{WC_API_BASE}/customers/{user_id}",
                 auth=auth,
@@ -58,3 +60,14 @@ async def is_admin(user_id: int) -> bool:
     except httpx.RequestError as e:
         print(f"Error checking admin status: {e}")
     return False
+
+ADMIN_CACHE_TTL = 300
+
+async def is_admin_cached(user_id: int) -> bool:
+    """is_admin(), cached for 5 minutes per user."""
+    cache_key = f"user_is_admin:{user_id}"
+    is_user_admin = await get_cached(cache_key)
+    if is_user_admin is None:
+        is_user_admin = await is_admin(user_id)
+        await set_cached(cache_key, is_user_admin, ttl=ADMIN_CACHE_TTL)
+    return is_user_admin
@@ -0,0 +1,246 @@
+# app/services/pricing.py
+from app.schemas.order import CouponLineCreate, LineItem
+from app.services.products import get_products_by_ids
+from app.utils.cache import get_cached, set_cached, invalidate_cache_keys, is_known_missing, mark_missing
+from app.utils.wc_api import wc_api
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from fnmatch import fnmatch
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Coupons change rarely and the coupon webhooks drop the table, so the TTL
+# only bounds how long a missed webhook goes unnoticed
+COUPON_TABLE_KEY = "coupons"
+COUPON_TABLE_TTL = 600
+
+COUPON_FIELDS = (
+    "id,code,amount,discount_type,date_expires_gmt,usage_count,usage_limit,"
+    "individual_use,product_ids,excluded_product_ids,exclude_sale_items,"
+    "minimum_amount,maximum_amount,email_restrictions"
+)
+
+# Stripe refuses charges below $0.50
+MINIMUM_CHARGE_CENTS = 50
+
+
+def to_cents(value) -> Optional[int]:
+    try:
+        return int((Decimal(str(value)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def format_cents(cents: int) -> str:
+    return f"{Decimal(cents) / 100:.2f}"
+
+
+def compact_coupon(coupon: Dict) -> Dict:
+    return {
+        "code": coupon["code"].lower(),
+        "amount": to_cents(coupon.get("amount")) or 0,
+        "discount_type": coupon.get("discount_type", "fixed_cart"),
+        "date_expires_gmt": coupon.get("date_expires_gmt"),
+        "usage_count": coupon.get("usage_count") or 0,
+        "usage_limit": coupon.get("usage_limit"),
+        "individual_use": bool(coupon.get("individual_use")),
+        "product_ids": coupon.get("product_ids") or [],
+        "excluded_product_ids": coupon.get("excluded_product_ids") or [],
+        "exclude_sale_items": bool(coupon.get("exclude_sale_items")),
+        "minimum_amount": to_cents(coupon.get("minimum_amount")) or 0,
+        "maximum_amount": to_cents(coupon.get("maximum_amount")) or 0,
+        "email_restrictions": [e.lower() for e in coupon.get("email_restrictions") or []],
+    }
+
+
+async def get_coupon_table(refresh: bool = False) -> Dict[str, Dict]:
+    """Every coupon by lowercase code, as the fields pricing needs."""
+    if not refresh:
+        cached = await get_cached(COUPON_TABLE_KEY)
+        if cached is not None:
+            return cached
+
+    table = {}
+    page = 1
+    while True:
+        result = await wc_api.list_coupons(page=page, per_page=100, fields=COUPON_FIELDS)
+        for coupon in result["data"]:
+            table[coupon["code"].lower()] = compact_coupon(coupon)
+        if page >= result["total_pages"]:
+            break
+        page += 1
+
+    await set_cached(COUPON_TABLE_KEY, table, ttl=COUPON_TABLE_TTL)
+    logger.info(f"🎟️ Coupon table refreshed ({len(table)} coupons)")
+    return table
+
+
+async def invalidate_coupon_table():
+    await invalidate_cache_keys([COUPON_TABLE_KEY])
+
+
+async def find_coupons(codes: List[str]) -> Dict[str, Dict]:
+    """
+    Coupons by code. An unknown code reloads the table once, in case the
+    coupon was created after it was cached; codes still unknown after that
+    are negatively cached so typos don't reload it on every request.
+    """
+    table = await get_coupon_table()
+    unknown = [code for code in codes if code not in table]
+    if not unknown:
+        return table
+
+    for code in unknown:
+        if not await is_known_missing("coupon", code):
+            table = await get_coupon_table(refresh=True)
+            break
+
+    for code in unknown:
+        if code not in table:
+            await mark_missing("coupon", code)
+    return table
+
+
+def coupon_errors(coupon: Dict, subtotal: int, email: Optional[str], coupon_count: int) -> List[str]:
+    """Why WooCommerce would reject this coupon for the cart, if it would."""
+    code = coupon["code"]
+    errors = []
+
+    expires = coupon["date_expires_gmt"]
+    if expires and datetime.fromisoformat(expires).replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+        errors.append(f"Coupon '{code}' has expired.")
+    if coupon["usage_limit"] and coupon["usage_count"] >= coupon["usage_limit"]:
+        errors.append(f"Coupon '{code}' has reached its usage limit.")
+    if coupon["individual_use"] and coupon_count > 1:
+        errors.append(f"Coupon '{code}' cannot be used with other coupons.")
+    if coupon["minimum_amount"] and subtotal < coupon["minimum_amount"]:
+        errors.append(f"The minimum spend for coupon '{code}' is {format_cents(coupon['minimum_amount'])}.")
+    if coupon["maximum_amount"] and subtotal > coupon["maximum_amount"]:
+        errors.append(f"The maximum spend for coupon '{code}' is {format_cents(coupon['maximum_amount'])}.")
+    if coupon["email_restrictions"]:
+        email = (email or "").lower()
+        if not any(fnmatch(email, allowed) for allowed in coupon["email_restrictions"]):
+            errors.append(f"Coupon '{code}' is not valid for your email address.")
+    return errors
+
+
+def is_eligible(coupon: Dict, line: Dict) -> bool:
+    if coupon["product_ids"] and line["product_id"] not in coupon["product_ids"]:
+        return False
+    if line["product_id"] in coupon["excluded_product_ids"]:
+        return False
+    return not (coupon["exclude_sale_items"] and line["on_sale"])
+
+
+def apply_coupon(coupon: Dict, lines: List[Dict]) -> int:
+    """
+    Discount line totals in place, the way WooCommerce applies coupons in
+    sequence, and return the discount in cents.
+    """
+    eligible = [line for line in lines if is_eligible(coupon, line) and line["total"] > 0]
+    kind = coupon["discount_type"]
+    discounts = []
+
+    if kind == "percent":
+        for line in eligible:
+            discounts.append(int((Decimal(line["total"]) * coupon["amount"] / 10000).quantize(Decimal("1"), rounding=ROUND_HALF_UP)))
+    elif kind == "fixed_product":
+        discounts = [min(coupon["amount"] * line["quantity"], line["total"]) for line in eligible]
+    else:
+        # fixed_cart: spread over the eligible lines by their share of the total
+        remaining = sum(line["total"] for line in eligible)
+        amount = min(coupon["amount"], remaining)
+        for i, line in enumerate(eligible):
+            if i == len(eligible) - 1:
+                discounts.append(amount - sum(discounts))
+            else:
+                discounts.append(amount * line["total"] // remaining)
+
+    for line, discount in zip(eligible, discounts):
+        line["total"] -= discount
+    return sum(discounts)
+
+
+async def quote_order(
+    line_items: List[LineItem],
+    coupon_lines: Optional[List[CouponLineCreate]] = None,
+    email: Optional[str] = None,
+) -> Dict:
+    """
+    Price a cart from cached product prices and the cached coupon table.
+
+    Everything WooCommerce would reject after writing an order (unknown or
+    unpurchasable products, prices that changed since the client saw them,
+    invalid coupons, a total under the minimum charge) is reported in
+    `errors` instead, so checkout can fail before any upstream write.
+    """
+    errors = []
+    products = {p["id"]: p for p in await get_products_by_ids(list({item.product_id for item in line_items}))}
+
+    lines = []
+    for item in line_items:
+        product = products.get(item.product_id)
+        price = to_cents(product.get("price")) if product else None
+        if product is None or price is None or product.get("purchasable") is False:
+            errors.append(f"Product {item.product_id} is not available.")
+            continue
+        if item.quantity < 1:
+            errors.append(f"Invalid quantity for '{product.get('name')}'.")
+            continue
+        if item.total is not None and to_cents(item.total) != price:
+            errors.append(
+                f"The price of '{product.get('name')}' changed from {item.total} to {format_cents(price)}."
+            )
+        lines.append({
+            "product_id": item.product_id,
+            "name": product.get("name"),
+            "quantity": item.quantity,
+            "price": price,
+            "on_sale": bool(product.get("on_sale")),
+            "subtotal": price * item.quantity,
+            "total": price * item.quantity,
+        })
+
+    subtotal = sum(line["subtotal"] for line in lines)
+    codes = list(dict.fromkeys(c.code.strip().lower() for c in coupon_lines or [] if c.code.strip()))
+    coupons = []
+    if codes:
+        table = await find_coupons(codes)
+        for code in codes:
+            coupon = table.get(code)
+            if coupon is None:
+                errors.append(f"Coupon '{code}' does not exist.")
+                continue
+            problems = coupon_errors(coupon, subtotal, email, len(codes))
+            if not problems and not any(is_eligible(coupon, line) for line in lines):
+                problems = [f"Coupon '{code}' is not valid for the items in your cart."]
+            if problems:
+                errors.extend(problems)
+                continue
+            coupons.append({"code": code, "discount": format_cents(apply_coupon(coupon, lines))})
+
+    total = sum(line["total"] for line in lines)
+    if 0 < total < MINIMUM_CHARGE_CENTS:
+        errors.append("Order total after discounts is less than the $0.50 minimum charge.")
+
+    return {
+        "valid": not errors,
+        "errors": errors,
+        "line_items": [
+            {
+                "product_id": line["product_id"],
+                "name": line["name"],
+                "quantity": line["quantity"],
+                "price": format_cents(line["price"]),
+                "subtotal": format_cents(line["subtotal"]),
+                "total": format_cents(line["total"]),
+            }
+            for line in lines
+        ],
+        "coupons": coupons,
+        "subtotal": format_cents(subtotal),
+        "discount": format_cents(subtotal - total),
+        "total": format_cents(total),
+    }
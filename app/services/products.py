@@ -1,36 +1,78 @@
 # app/services/products.py
-import httpx
-from typing import List, Dict, Optional, Set
+from typing import AsyncIterator, List, Dict, Optional, Set
 from app.utils.wc_api import wc_api
-from app.services.permissions import has_purchased, is_admin
-from app.utils.cache import get_cached, set_cached
+from app.services.permissions import has_purchased, is_admin_cached
+from fastapi import HTTPException
+from app.utils.cache import get_cached, set_cached, get_many_cached, set_many_cached, is_known_missing, mark_missing, invalidate_cache_keys, invalidate_tags, negative_cache_key
+from app.utils.fields import FIELD_PRESETS, upstream_fields, project_many
+from app.utils.cursor import build_index, decode_cursor, encode_cursor, query_fingerprint, seek
 import asyncio
 import re
 import logging  # ← Add this
 from app.services.favorites import favorite_service
-from app.core.config import settings
+from app.services.reviews import reviews_tag
 
 logger = logging.getLogger(__name__)  # ← Add this
 
 CATEGORY_CACHE_TTL = 3600  # 1 hour
+PRODUCT_CACHE_TTL = 600
+CATALOG_INDEX_TTL = 300
+LIBRARY_INDEX_TTL = 180
+
+# Cache tags (see invalidate_tags): every shared catalog response (lists,
+# featured, genres, authors, related books, cursor indexes) is tagged
+# CATALOG_TAG, and a product's detail entries are tagged with product_tag()
+CATALOG_TAG = "catalog"
+
+def product_tag(slug: str) -> str:
+    return f"product-{slug}"
+
+# WooCommerce orderby values we can paginate by cursor -> (product field, numeric)
+CURSOR_SORT_FIELDS = {
+    "date": ("date_created_gmt", False),
+    "modified": ("date_modified_gmt", False),
+    "id": ("id", True),
+    "title": ("name", False),
+    "slug": ("slug", False),
+    "price": ("price", True),
+    "popularity": ("total_sales", True),
+    "rating": ("average_rating", True),
+}
 
 split_pattern = re.compile(r'\s*[,&]\s*')
 
 # -----------------------------
 # Product Authors
 # -----------------------------
+def get_product_authors(product: Dict) -> List[str]:
+    author_value = next((meta.get('value') for meta in product.get('meta_data', []) if meta.get('key') == 'author'), None)
+    if not author_value:
+        return []
+    return [name.strip().title() for name in split_pattern.split(author_value) if name.strip()]
+
 async def get_all_product_authors() -> List[str]:
     raw_products = await wc_api.get_products(params={'per_page': 100})
     authors: Set[str] = set()
     
     for product in raw_products:
-        author_value = next((meta.get('value') for meta in product.get('meta_data', []) if meta.get('key') == 'author'), None)
-        if author_value:
-            for name in split_pattern.split(author_value):
-                if name.strip():
-                    authors.add(name.strip().title())
+        authors.update(get_product_authors(product))
     return sorted(authors)
 
+async def get_products_by_authors(authors: List[str], exclude_id: Optional[int] = None, limit: int = 8) -> List[Dict]:
+    """Other books by any of the given authors, as card fields."""
+    if not authors:
+        return []
+    wanted = set(authors)
+    raw_products = await wc_api.get_products(params={
+        'per_page': 100,
+        '_fields': upstream_fields(FIELD_PRESETS["card"], extra=["meta_data"]),
+    })
+    related = [
+        p for p in raw_products
+        if p.get("id") != exclude_id and wanted.intersection(get_product_authors(p))
+    ]
+    return project_many(related[:limit], FIELD_PRESETS["card"])
+
 # -----------------------------
 # Product Genres
 # -----------------------------
@@ -50,11 +92,14 @@ async def enrich_product_categories(product: Dict) -> Dict:
         cached = await get_cached(cache_key)
         if cached:
             return cached
+        if await is_known_missing("category", cat["id"]):
+            return None
         category = await wc_api.get_category(cat["id"])
         if category:
             enriched = {"id": category["id"], "name": category["name"], "image": category.get("image").get("src") if category.get("image") else None}
             await set_cached(cache_key, enriched, ttl=CATEGORY_CACHE_TTL)
             return enriched
+        await mark_missing("category", cat["id"])
         return None
 
     enriched_categories = await asyncio.gather(*(fetch_category(cat) for cat in product["categories"]))
@@ -74,15 +119,8 @@ async def sanitize_products_bulk(products: List[Dict], user_id: Optional[int]) -
         return products
 
     # Cache user permissions for 5 minutes
-    admin_cache_key = f"user_is_admin:{user_id}"
-
-    is_user_admin = await get_cached(admin_cache_key)
-    if is_user_admin is None:
-        is_user_admin = await is_admin(user_id)
-        logger.info(f"User {user_id} admin status: {is_user_admin}")
-        await set_cached(admin_cache_key, is_user_admin, ttl=300)
-    else:
-        logger.info(f"User {user_id} admin status (cached): {is_user_admin}")
+    is_user_admin = await is_admin_cached(user_id)
+    logger.info(f"User {user_id} admin status: {is_user_admin}")
 
     # Bulk process permissions
     async def process_product(product):
@@ -116,54 +154,227 @@ async def sanitize_products_bulk(products: List[Dict], user_id: Optional[int]) -
 # -----------------------------
 # Get products for user (library or general)
 # -----------------------------
-async def get_products_for_user(user_id: Optional[int], filters: Dict) -> List[Dict]:
-    raw_products = await wc_api.get_products(params=filters)
+async def get_products_for_user(user_id: Optional[int], filters: Dict, fields: Optional[List[str]] = None) -> List[Dict]:
+    params = dict(filters)
+    if fields:
+        # Ask WooCommerce for the requested fields only
+        params["_fields"] = upstream_fields(fields)
+    raw_products = await wc_api.get_products(params=params)
     # Enrich categories in parallel
     enriched_products = await asyncio.gather(*(enrich_product_categories(p) for p in raw_products))
     # Apply permission filtering
-    return await sanitize_products_bulk(enriched_products, user_id)
+    sanitized = await sanitize_products_bulk(enriched_products, user_id)
+    return project_many(sanitized, fields)
 
-async def get_products_for_user_library(user_id: Optional[int], base_filters: Dict) -> List[Dict]:
-    page = 1
+async def iter_products_for_user_library(user_id: Optional[int], base_filters: Dict, fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+    """
+    Yield the user's ebooks page by page. While one page is being consumed
+    the next one is already being fetched, and at most two pages are held
+    in memory regardless of library size.
+    """
     per_page = 50
-    all_products = []
+    # meta_data is needed to find ebooks, even if the client didn't ask for it
+    page_fields = [*fields, "meta_data"] if fields and "meta_data" not in fields else fields
 
-    while True:
+    def fetch(page: int) -> asyncio.Task:
         filters = {**base_filters, "page": page, "per_page": per_page}
-        products = await get_products_for_user(user_id, filters)
-        matching = [p for p in products if any(meta.get("key") == "_ebook_stream_url" for meta in p.get("meta_data", []))]
-        all_products.extend(matching)
+        return asyncio.ensure_future(get_products_for_user(user_id, filters, page_fields))
 
-        if len(products) < per_page:
-            break  # No more products
-        page += 1
+    page = 1
+    next_page = fetch(page)
+    try:
+        while next_page:
+            products = await next_page
+            # A full page means there may be more: start on it right away
+            next_page = fetch(page + 1) if len(products) == per_page else None
+            page += 1
+
+            for product in products:
+                if any(meta.get("key") == "_ebook_stream_url" for meta in product.get("meta_data", [])):
+                    yield project_many([product], fields)[0]
+    finally:
+        if next_page:
+            next_page.cancel()
 
-    return all_products
+async def get_products_for_user_library(user_id: Optional[int], base_filters: Dict, fields: Optional[List[str]] = None) -> List[Dict]:
+    return [p async for p in iter_products_for_user_library(user_id, base_filters, fields)]
 
 # -----------------------------
 # Single product
 # -----------------------------
-async def get_product_by_slug(slug: str, user_id: Optional[int], token: Optional[str] = None) -> Dict:
-    product = await wc_api.get_product(slug)
+async def get_product_by_slug(slug: str, user_id: Optional[int], token: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+    if await is_known_missing("product", slug):
+        raise HTTPException(status_code=404, detail=f"Product with slug '{slug}' not found")
+    try:
+        product = await wc_api.get_product(slug, fields=upstream_fields(fields) if fields else None)
+    except HTTPException as e:
+        if e.status_code == 404:
+            await mark_missing("product", slug)
+        raise
     enriched = await enrich_product_categories(product)
     sanitized_list = await sanitize_products_bulk([enriched], user_id)
-    product_data = sanitized_list[0]
+    # Read before projecting: ?fields= may leave the id out
+    product_id = sanitized_list[0].get("id")
+    product_data = project_many(sanitized_list, fields)[0]
 
     # If token is provided, check favorites
     if token:
-        favorites_result = await favorite_service.get_favorites(token)
-        if favorites_result.get("success") and isinstance(favorites_result.get("data"), list):
-            product_data["favorite"] = product_data.get("id") in favorites_result["data"]
-        else:
-            product_data["favorite"] = False
+        flags = await favorite_service.are_favorites(token, [product_id])
+        product_data["favorite"] = flags.get(product_id, False)
 
     return product_data
 
+# -----------------------------
+# Products by ID
+# -----------------------------
+def product_cache_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+async def get_products_by_ids(product_ids: List[int]) -> List[Dict]:
+    """
+    Raw product bodies by ID, in the given order. Cached per product; all
+    misses are fetched from WooCommerce together.
+    """
+    if not product_ids:
+        return []
+
+    cached = await get_many_cached([product_cache_key(pid) for pid in product_ids])
+    found = {pid: cached[product_cache_key(pid)] for pid in product_ids if product_cache_key(pid) in cached}
+    missing = [pid for pid in product_ids if pid not in found]
+
+    for start in range(0, len(missing), 100):
+        chunk = missing[start:start + 100]
+        fetched = await wc_api.get_products(params={"include": ",".join(map(str, chunk)), "per_page": len(chunk)})
+        found.update({p["id"]: p for p in fetched})
+        await set_many_cached({product_cache_key(p["id"]): p for p in fetched}, ttl=PRODUCT_CACHE_TTL)
+
+    return [found[pid] for pid in product_ids if pid in found]
+
+# -----------------------------
+# Cursor pagination
+# -----------------------------
+def cursor_query(filters: Dict):
+    """Sort field, direction and the filters that define the result set."""
+    orderby = filters.get("orderby") or "date"
+    if orderby not in CURSOR_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cursor pagination supports orderby: {', '.join(CURSOR_SORT_FIELDS)}"
+        )
+    base = {k: v for k, v in filters.items() if k not in ("page", "per_page", "orderby", "order")}
+    descending = (filters.get("order") or "desc").lower() == "desc"
+    return orderby, descending, base
+
+async def get_catalog_index(base_filters: Dict, orderby: str) -> List:
+    """
+    (sort key, id) pairs of every product matching the filters, sorted.
+    Built from id + sort field only and shared by all cursor pages.
+    """
+    field, numeric = CURSOR_SORT_FIELDS[orderby]
+    cache_key = f"catalog_index:{query_fingerprint({**base_filters, 'orderby': orderby})}"
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return [tuple(entry) for entry in cached]
+
+    items = []
+    page = 1
+    while True:
+        batch = await wc_api.get_products(params={**base_filters, "page": page, "per_page": 100, "_fields": f"id,{field}"})
+        items.extend(batch)
+        if len(batch) < 100:
+            break
+        page += 1
+
+    index = build_index(items, field, numeric)
+    await set_cached(cache_key, index, ttl=CATALOG_INDEX_TTL, tags=[CATALOG_TAG])
+    return index
+
+async def get_library_index(user_id: Optional[int], base_filters: Dict, orderby: str) -> List:
+    field, numeric = CURSOR_SORT_FIELDS[orderby]
+    # Ends in the user ID so purchase invalidation (library_products:*:<user>) drops it
+    cache_key = f"library_products:index:{query_fingerprint({**base_filters, 'orderby': orderby})}:{user_id}"
+    cached = await get_cached(cache_key)
+    if cached is not None:
+        return [tuple(entry) for entry in cached]
+
+    items = [p async for p in iter_products_for_user_library(user_id, base_filters, fields=["id", field])]
+    index = build_index(items, field, numeric)
+    await set_cached(cache_key, index, ttl=LIBRARY_INDEX_TTL)
+    return index
+
+async def get_products_page_by_ids(user_id: Optional[int], product_ids: List[int], fields: Optional[List[str]] = None) -> List[Dict]:
+    products = await get_products_by_ids(product_ids)
+    enriched = await asyncio.gather(*(enrich_product_categories(p) for p in products))
+    sanitized = await sanitize_products_bulk(list(enriched), user_id)
+    return project_many(sanitized, fields)
+
+async def get_products_by_cursor(
+    user_id: Optional[int],
+    filters: Dict,
+    cursor: str,
+    fields: Optional[List[str]] = None,
+    library: bool = False,
+) -> Dict:
+    """
+    One page after `cursor` (empty for the first page). The page is found by
+    binary search in a cached sort index, so deep pages cost the same as the
+    first and don't shift when products are added.
+    """
+    orderby, descending, base = cursor_query(filters)
+    fingerprint = query_fingerprint({**base, "orderby": orderby, "descending": descending, "library": library})
+    position = decode_cursor(cursor, fingerprint)
+
+    if library:
+        index = await get_library_index(user_id, base, orderby)
+    else:
+        index = await get_catalog_index(base, orderby)
+
+    entries, has_more = seek(index, position, filters.get("per_page") or 10, descending)
+    products = await get_products_page_by_ids(user_id, [item_id for _, item_id in entries], fields)
+
+    return {
+        "data": products,
+        "next_cursor": encode_cursor(*entries[-1], fingerprint) if has_more and entries else None,
+    }
+
+# -----------------------------
+# Negative cache invalidation
+# -----------------------------
+async def invalidate_missing_product(product: Dict) -> None:
+    """
+    Drop negative cache entries a newly created/updated product may answer:
+    its slug, its categories and its reviews.
+    """
+    keys = []
+    if product.get("slug"):
+        keys.append(negative_cache_key("product", product["slug"]))
+    for cat in product.get("categories", []):
+        keys.append(negative_cache_key("category", cat["id"]))
+    await invalidate_cache_keys(keys)
+    if product.get("id"):
+        await invalidate_tags([reviews_tag(product["id"])])
+
+async def invalidate_product_caches(product: Dict) -> None:
+    """
+    Drop the shared catalog responses a product change affects, so their
+    ETags change and CDN copies tagged with the same surrogate keys go stale.
+    """
+    tags = [CATALOG_TAG]
+    if product.get("slug"):
+        tags.append(product_tag(product["slug"]))
+    await invalidate_tags(tags)
+    if product.get("id"):
+        await invalidate_cache_keys([product_cache_key(product["id"])])
+
 # -----------------------------
 # Featured products
 # -----------------------------
-async def get_all_featured_products(filters: Dict) -> List[Dict]:
-    return await wc_api.get_products(params=filters)
+async def get_all_featured_products(filters: Dict, fields: Optional[List[str]] = None) -> List[Dict]:
+    params = dict(filters)
+    if fields:
+        params["_fields"] = upstream_fields(fields)
+    products = await wc_api.get_products(params=params)
+    return project_many(products, fields)
 
 
 # -----------------------------
@@ -178,11 +389,4 @@ async def get_favorite_products_for_user(token: str):
     if not product_ids:
         return []
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            f"{settings.WP_URL}/wp-json/wc/v3/products",
-            params={"include": ",".join(map(str, product_ids))},
-            headers={"Authorization": f"Bearer {token}"}
-        )
-        resp.raise_for_status()
-        return resp.json()
+    return await get_products_by_ids(product_ids)
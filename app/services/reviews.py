@@ -1,25 +1,203 @@
 # app/services/reviews.py
-from typing import List, Dict
+import asyncio
+import logging
+from typing import AsyncIterator, List, Dict, Optional
 from fastapi import HTTPException
 from app.schemas.review import ReviewCreate, ReviewResponse
 from app.utils.wc_api import wc_api
+from app.utils.cache import (
+    is_known_missing,
+    mark_missing,
+    invalidate_cache_keys,
+    invalidate_tags,
+    get_many_cached_hashes,
+    set_cached_hash,
+    increment_cached_hash,
+    claim_once,
+    get_or_build_entry,
+)
+
+logger = logging.getLogger(__name__)
+
+REVIEWS_CACHE_TTL = 120
+# Summaries are kept up to date incrementally, the TTL only bounds drift from
+# reviews moderated directly in WordPress
+RATING_SUMMARY_TTL = 86400
+RATING_SUMMARY_CONCURRENCY = 5
+RATING_STARS = ("1", "2", "3", "4", "5")
+REVIEWS_FETCH_CONCURRENCY = 5
+REVIEWS_STREAM_PER_PAGE = 100
+
+
+def reviews_cache_key(product_id: int, page) -> str:
+    return f"reviews:{product_id}:{page}"
+
+
+def reviews_tag(product_id: int) -> str:
+    """Cache tag of a product's review pages, positive and negative (see invalidate_tags)."""
+    return f"reviews-{product_id}"
+
+
+def rating_summary_key(product_id: int) -> str:
+    return f"rating:{product_id}"
+
+
+def summarize_histogram(product_id: int, histogram: Dict[str, int]) -> Dict:
+    count = sum(histogram.values())
+    total = sum(int(star) * n for star, n in histogram.items())
+    return {
+        "product_id": product_id,
+        "count": count,
+        "average": round(total / count, 2) if count else 0.0,
+        "histogram": histogram,
+    }
+
+
+async def build_rating_histogram(product_id: int) -> Dict[str, int]:
+    """Count approved ratings over every review page of a product."""
+    histogram = {star: 0 for star in RATING_STARS}
+    page = 1
+    per_page = 100
+    while True:
+        reviews = await wc_api.get_reviews(product_id, page=page, params={"per_page": per_page, "_fields": "rating"})
+        for r in reviews:
+            star = str(r.get("rating") or 0)
+            if star in histogram:
+                histogram[star] += 1
+        if len(reviews) < per_page:
+            break
+        page += 1
+    return histogram
+
+
+async def get_rating_summaries(product_ids: List[int]) -> Dict[int, Dict]:
+    """
+    Rating summaries (count, average, 1-5 star histogram) for many products.
+    Cached summaries are read in one round trip; missing ones are built from
+    WooCommerce reviews with bounded concurrency.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    cached = await get_many_cached_hashes([rating_summary_key(pid) for pid in product_ids])
+
+    summaries = {}
+    missing = []
+    for pid, histogram in zip(product_ids, cached):
+        if histogram:
+            summaries[pid] = summarize_histogram(pid, {star: int(histogram.get(star, 0)) for star in RATING_STARS})
+        else:
+            missing.append(pid)
+
+    semaphore = asyncio.Semaphore(RATING_SUMMARY_CONCURRENCY)
+
+    async def load(pid: int):
+        async with semaphore:
+            histogram = await build_rating_histogram(pid)
+        await set_cached_hash(rating_summary_key(pid), histogram, ttl=RATING_SUMMARY_TTL)
+        summaries[pid] = summarize_histogram(pid, histogram)
+
+    await asyncio.gather(*(load(pid) for pid in missing))
+    return {pid: summaries[pid] for pid in product_ids}
+
+
+async def record_rating(product_id: int, rating: int, review_id: Optional[int] = None) -> None:
+    """
+    Count a new approved review in the product's cached summary, if there is
+    one. With `review_id`, a review is counted once even if both the API and
+    the review webhook report it.
+    """
+    if str(rating) not in RATING_STARS:
+        return
+    if review_id and not await claim_once(f"rating_counted:{review_id}", ttl=RATING_SUMMARY_TTL):
+        return
+    await increment_cached_hash(rating_summary_key(product_id), str(rating), 1)
+
+
+async def invalidate_product_reviews(product_id: int, drop_summary: bool = False) -> None:
+    """Drop cached review pages (and optionally the rating summary) of a product."""
+    await invalidate_tags([reviews_tag(product_id)])
+    if drop_summary:
+        await invalidate_cache_keys([rating_summary_key(product_id)])
+
+
+def format_review(r: Dict) -> Dict:
+    return {
+        "id": r["id"],
+        "product_id": r["product_id"],
+        "status": r["status"],
+        "reviewer": r["reviewer"],
+        "reviewer_email": r["reviewer_email"],
+        "review": r["review"],
+        "rating": r["rating"],
+        "date_created": r["date_created"]
+    }
+
 
 async def get_product_reviews(product_id: int, page: int = 1) -> List[Dict]:
     """Get all reviews for a product with pagination"""
+    if await is_known_missing("reviews", product_id, page):
+        return []
     reviews = await wc_api.get_reviews(product_id, page=page)  # Handle page in the API request
-    return [
-        {
-            "id": r["id"],
-            "product_id": r["product_id"],
-            "status": r["status"],
-            "reviewer": r["reviewer"],
-            "reviewer_email": r["reviewer_email"],
-            "review": r["review"],
-            "rating": r["rating"],
-            "date_created": r["date_created"]
-        }
-        for r in reviews
-    ]
+    if not reviews:
+        await mark_missing("reviews", product_id, page, tags=[reviews_tag(product_id)])
+        return []
+    return [format_review(r) for r in reviews]
+
+
+async def get_reviews_page(product_id: int, page: int, per_page: int) -> Dict:
+    """A page of formatted reviews plus the product's page count, cached per page."""
+    async def build():
+        result = await wc_api.list_reviews(product_id, page=page, per_page=per_page)
+        return {"reviews": [format_review(r) for r in result["data"]], "total_pages": result["total_pages"]}
+
+    return await get_or_build_entry(
+        reviews_cache_key(product_id, f"{per_page}:{page}"),
+        build,
+        ttl=REVIEWS_CACHE_TTL,
+        tags=[reviews_tag(product_id)],
+    )
+
+
+async def stream_product_reviews(product_ids: List[int], page: int = 1, all_pages: bool = False) -> AsyncIterator[Dict]:
+    """
+    Reviews of several products, yielded as soon as each page arrives.
+
+    Pages are fetched concurrently (at most REVIEWS_FETCH_CONCURRENCY at a
+    time), so output follows completion order, not product or page order.
+    With `all_pages`, the first page of each product tells how many more to
+    fetch. A failed page yields an error item instead of ending the stream.
+    """
+    per_page = REVIEWS_STREAM_PER_PAGE if all_pages else 10
+    semaphore = asyncio.Semaphore(REVIEWS_FETCH_CONCURRENCY)
+
+    async def fetch(product_id: int, page_number: int):
+        async with semaphore:
+            try:
+                return product_id, page_number, await get_reviews_page(product_id, page_number, per_page), None
+            except HTTPException as e:
+                return product_id, page_number, None, e
+
+    pending = {asyncio.ensure_future(fetch(pid, 1 if all_pages else page)) for pid in dict.fromkeys(product_ids)}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                product_id, page_number, result, error = task.result()
+                if error:
+                    logger.warning(f"Review page {page_number} of product {product_id} failed: {error.detail}")
+                    yield {"product_id": product_id, "page": page_number, "error": error.detail, "status": error.status_code}
+                    continue
+
+                if all_pages and page_number == 1:
+                    pending |= {
+                        asyncio.ensure_future(fetch(product_id, n))
+                        for n in range(2, result["total_pages"] + 1)
+                    }
+                for review in result["reviews"]:
+                    yield review
+    finally:
+        # Client went away or the stream ended early: stop fetching
+        for task in pending:
+            task.cancel()
 
 
 async def create_product_review(review_data: ReviewCreate) -> ReviewResponse:
@@ -34,4 +212,6 @@ async def create_product_review(review_data: ReviewCreate) -> ReviewResponse:
     }
     
     created_review = await wc_api.create_review(payload)
+    await invalidate_product_reviews(review_data.product_id)
+    await record_rating(review_data.product_id, review_data.rating, created_review.get("id"))
     return ReviewResponse(**created_review)
\ No newline at end of file
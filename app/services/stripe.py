@@ -1,14 +1,26 @@
-import stripe
-import os
 import asyncio
-from dotenv import load_dotenv
+from functools import lru_cache
 from typing import Dict, Optional, List
 
+from app.core.config import settings
 from app.utils.cache import invalidate_cache
+from app.utils.instrumentation import track
 
-# Load Stripe secret key from environment
-load_dotenv()
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+@lru_cache(maxsize=None)
+def get_stripe():
+    """
+    The stripe SDK, configured. Imported on first use: it takes about a
+    second to import, which every cold start would otherwise pay.
+    """
+    import stripe
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe
+
+def stripe_response_size(obj) -> int:
+    """Size of the API response behind a Stripe object, for request metrics."""
+    last_response = getattr(obj, "last_response", None)
+    return len(last_response.body or "") if last_response is not None else 0
 
 # ---------------------------
 #  Create Standard PaymentIntent
@@ -26,6 +38,7 @@ async def create_stripe_payment_intent(
     """
 
     print(f"Creating PaymentIntent: amount={amount}, order_id={order_id}, user_id={user_id}")
+    stripe = get_stripe()
 
     try:
         # Metadata is crucial for the Webhook to know which user/order to update
@@ -44,15 +57,17 @@ async def create_stripe_payment_intent(
 
         # Stripe library is synchronous — wrap in a thread for async compatibility
         loop = asyncio.get_event_loop()
-        payment_intent = await loop.run_in_executor(
-            None,
-            lambda: stripe.PaymentIntent.create(
-                amount=amount,
-                currency=currency,
-                metadata=metadata,
-                automatic_payment_methods={"enabled": True},
+        with track("stripe", "payment_intents") as call:
+            payment_intent = await loop.run_in_executor(
+                None,
+                lambda: stripe.PaymentIntent.create(
+                    amount=amount,
+                    currency=currency,
+                    metadata=metadata,
+                    automatic_payment_methods={"enabled": True},
+                )
             )
-        )
+            call.bytes = stripe_response_size(payment_intent)
 
         print(f"✅ PaymentIntent created successfully: {payment_intent.id}")
         return payment_intent
@@ -84,6 +99,11 @@ async def handle_successful_payment(payment_intent_id: str, order_id: int, user_
 
         # Clear the cached product detail page for this user
         await invalidate_cache(f"product_detail:*:{user_id}")
+
+        # Clear the order history so the completed order shows its new status
+        # (imported here: app.services.orders imports this module)
+        from app.services.orders import invalidate_order_history
+        await invalidate_order_history(user_id)
         
         print(f"🧹 Cache invalidated successfully for user {user_id}")
         
@@ -109,6 +129,7 @@ async def create_stripe_connect_payout_intent(
     if not author_stripe_ids:
         raise ValueError("No connected account IDs provided for payout")
 
+    stripe = get_stripe()
     loop = asyncio.get_event_loop()
     transfers = []
 
@@ -118,16 +139,18 @@ async def create_stripe_connect_payout_intent(
 
     for destination in author_stripe_ids:
         try:
-            transfer = await loop.run_in_executor(
-                None,
-                lambda: stripe.Transfer.create(
-                    amount=author_payout,
-                    currency=currency,
-                    destination=destination,
-                    metadata={"wc_order_id": str(order_id) if order_id else "unknown"},
-                    description=f"Author payout for order {order_id or 'N/A'}"
+            with track("stripe", "transfers") as call:
+                transfer = await loop.run_in_executor(
+                    None,
+                    lambda: stripe.Transfer.create(
+                        amount=author_payout,
+                        currency=currency,
+                        destination=destination,
+                        metadata={"wc_order_id": str(order_id) if order_id else "unknown"},
+                        description=f"Author payout for order {order_id or 'N/A'}"
+                    )
                 )
-            )
+                call.bytes = stripe_response_size(transfer)
             transfers.append(transfer)
             print(f"💸 Created transfer to {destination} for {author_payout} cents")
         except stripe.error.StripeError as e:
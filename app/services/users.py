@@ -4,6 +4,7 @@ import httpx
 from fastapi import HTTPException, status
 from app.core.config import settings
 from app.schemas.user import UserProfileUpdate, PasswordChangeRequest
+from app.utils.instrumentation import instrumented_client
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +24,7 @@ class UserService:
     ) -> Dict[str, Any]:
         """Update user profile information in WordPress"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with instrumented_client("wordpress", timeout=self.timeout) as client:
                 # Prepare update payload
                 payload = {}
                 if profile_data.first_name:
@@ -107,7 +108,7 @@ class UserService:
     ) -> Dict[str, Any]:
         """Change user password in WordPress"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with instrumented_client("wordpress", timeout=self.timeout) as client:
                 # Verify current password by attempting login
                 auth_response = await client.post(
                     self.jwt_endpoint,
@@ -0,0 +1,71 @@
+# app/utils/admission.py
+"""
+Load signals for admission control: event loop lag and in-flight requests.
+
+Lag is how much later than scheduled a short sleep wakes up, i.e. how long
+the loop was busy running something else (a sync SDK call, a big
+json.dumps). The smoothed value rises to a new peak at once and decays
+slowly, so one stall keeps shedding on for a moment instead of flapping.
+Both signals are per worker: each worker sheds based on its own loop.
+"""
+import asyncio
+from app.utils.metrics import EVENT_LOOP_LAG
+
+LAG_INTERVAL = 0.05  # seconds between lag probes
+LAG_DECAY = 0.8  # share of the previous lag kept at each probe
+
+# Catalog reads: cheap to retry and cached on the client side, so they are
+# the first to go when the worker is overloaded
+LOW_PRIORITY_PREFIXES = ("/api/v1/products", "/api/v1/reviews")
+# Per-user reads under the catalog prefix that keep flowing
+PRIORITY_EXCEPTIONS = ("/api/v1/products/library", "/api/v1/products/favorites")
+
+_lag = 0.0
+_in_flight = 0
+
+
+def loop_lag() -> float:
+    return _lag
+
+
+def in_flight() -> int:
+    return _in_flight
+
+
+def request_started():
+    global _in_flight
+    _in_flight += 1
+
+
+def request_finished():
+    global _in_flight
+    _in_flight -= 1
+
+
+def is_low_priority(method: str, path: str) -> bool:
+    if method not in ("GET", "HEAD"):
+        return False
+    if path.startswith(PRIORITY_EXCEPTIONS):
+        return False
+    return path.startswith(LOW_PRIORITY_PREFIXES)
+
+
+def overload_reason(max_lag: float, max_in_flight: int):
+    """"lag" or "in_flight" if the worker is past a threshold, else None."""
+    if _lag > max_lag:
+        return "lag"
+    if _in_flight > max_in_flight:
+        return "in_flight"
+    return None
+
+
+async def monitor_loop_lag():
+    """Probe event loop lag for this worker until cancelled."""
+    global _lag
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        sample = max(0.0, loop.time() - scheduled)
+        _lag = max(sample, _lag * LAG_DECAY)
+        EVENT_LOOP_LAG.set(_lag)
@@ -1,24 +1,79 @@
 # app/utils/cache.py
-import os
 import json
+import time
+import asyncio
+import hashlib
 import logging
-from typing import Any, Optional, List
-from dotenv import load_dotenv
-from redis.asyncio import Redis, ConnectionPool
+from typing import Any, Awaitable, Callable, Iterable, Optional, List
+from redis.asyncio import Redis, ConnectionPool, Connection, SSLConnection
 from redis.exceptions import RedisError, ConnectionError as RedisConnectionError
+from app.core.config import settings
+from app.utils.compression import compress_variants
+from app.utils.instrumentation import record
+from app.utils.deadline import remaining
+from app.utils.metrics import count_cache, count_cache_many
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
-REDIS_HOST = os.getenv("REDIS_HOST", "127.0.0.1")  # keeping your var name for compatibility
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
-REDIS_USE_SSL = os.getenv("REDIS_USE_SSL", "false").lower() == "true"
+MIN_READ_TIMEOUT = 0.05  # seconds a reply read gets even when the request is out of time
 
-# Create connection pool for better performance
+def _response_size(response: Any) -> int:
+    if isinstance(response, (bytes, str)):
+        return len(response)
+    if isinstance(response, (list, tuple)):
+        return sum(_response_size(item) for item in response)
+    if isinstance(response, dict):
+        return sum(_response_size(k) + _response_size(v) for k, v in response.items())
+    return 8
+
+
+class InstrumentedConnectionMixin:
+    """
+    Report Redis round trips into the request metrics. A pipeline sends
+    once and reads one reply per command, so sends are counted as calls and
+    reads only add time and bytes.
+    """
+
+    async def send_packed_command(self, command, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            await super().send_packed_command(command, *args, **kwargs)
+        finally:
+            size = len(command) if isinstance(command, (bytes, str)) else sum(len(chunk) for chunk in command)
+            record("redis", time.perf_counter() - started, size)
+
+    async def read_response(self, *args, **kwargs):
+        # Wait no longer than the request has left. The read is cancelled
+        # rather than given timeout=, which returns None and keeps the
+        # connection: the late reply would then answer its next command.
+        # Cancelled, redis-py disconnects and the TimeoutError reaches the caller
+        left = remaining()
+        started = time.perf_counter()
+        response = None
+        try:
+            if left is None:
+                response = await super().read_response(*args, **kwargs)
+            else:
+                async with asyncio.timeout(max(MIN_READ_TIMEOUT, left)):
+                    response = await super().read_response(*args, **kwargs)
+            return response
+        finally:
+            record("redis", time.perf_counter() - started, _response_size(response), calls=0)
+
+
+class InstrumentedConnection(InstrumentedConnectionMixin, Connection):
+    pass
+
+
+class InstrumentedSSLConnection(InstrumentedConnectionMixin, SSLConnection):
+    pass
+
+
+# Create connection pool for better performance. Pools connect on first
+# command, so building them here costs nothing at import
 pool_config = {
-    "host": REDIS_HOST,
-    "port": REDIS_PORT,
+    "host": settings.REDIS_HOST,
+    "port": settings.REDIS_PORT,
     "db": 0,
     "decode_responses": True,
     "socket_connect_timeout": 5,
@@ -27,21 +82,26 @@ pool_config = {
     "health_check_interval": 30,
     "retry_on_timeout": True,
     "max_connections": 50,
+    "connection_class": InstrumentedConnection,
 }
 
-if REDIS_PASSWORD:
-    pool_config["password"] = REDIS_PASSWORD
+if settings.REDIS_PASSWORD:
+    pool_config["password"] = settings.REDIS_PASSWORD
 
-if REDIS_USE_SSL:
+if settings.REDIS_USE_SSL:
     # This tells the pool to use the SSL Connection class
-    from redis.asyncio import SSLConnection
-    pool_config["connection_class"] = SSLConnection
-    if os.getenv("ENVIRONMENT") == "development":
+    pool_config["connection_class"] = InstrumentedSSLConnection
+    if settings.ENVIRONMENT == "development":
         pool_config["ssl_cert_reqs"] = None
     
 pool = ConnectionPool(**pool_config)
 redis = Redis(connection_pool=pool)
 
+# Precompressed bodies are binary, so they're read through a client that
+# doesn't decode responses. Kept small: it only serves compressed cache hits.
+binary_pool = ConnectionPool(**{**pool_config, "decode_responses": False, "max_connections": 20})
+binary_redis = Redis(connection_pool=binary_pool)
+
 
 async def invalidate_cache(pattern: str):
     """
@@ -69,6 +129,48 @@ async def invalidate_cache(pattern: str):
         logging.error(f"❌ Failed to invalidate cache for pattern '{pattern}': {e}")
 
 
+# -----------------------------
+# Cache tags
+# -----------------------------
+# An entry written with `tags` is recorded in one Redis set per tag, so
+# everything a change affects is dropped with two round trips (read and
+# clear the sets, delete their keys) however large the keyspace is, instead
+# of a SCAN per key pattern.
+TAG_PREFIX = "tag"
+TAG_TTL = 3600  # outlives every tagged entry, so a tag never forgets a live key
+
+
+def tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}:{tag}"
+
+
+def _add_to_tags(pipe, key: str, tags: Iterable[str]):
+    for tag in tags:
+        pipe.sadd(tag_key(tag), key)
+        pipe.expire(tag_key(tag), TAG_TTL)
+
+
+async def invalidate_tags(tags: List[str]) -> int:
+    """Delete every entry written under any of `tags`. Returns the number of keys deleted."""
+    if not tags:
+        return 0
+    try:
+        # Read and clear the sets atomically, so a key tagged in between is
+        # either deleted now or still recorded for the next invalidation
+        pipe = redis.pipeline(transaction=True)
+        for tag in tags:
+            pipe.smembers(tag_key(tag))
+        pipe.delete(*(tag_key(tag) for tag in tags))
+        *members, _ = await pipe.execute()
+        keys = set().union(*members)
+        deleted = await redis.delete(*keys) if keys else 0
+        logger.info(f"Invalidated {deleted} cache keys tagged {', '.join(tags)}")
+        return deleted
+    except Exception as e:
+        logger.error(f"Failed to invalidate cache tags {tags}: {e}")
+        return 0
+
+
 async def invalidate_cache_keys(keys: List[str]) -> int:
     """
     Delete specific cache keys.
@@ -104,6 +206,7 @@ async def get_cached(key: str) -> Optional[Any]:
     """
     try:
         data = await redis.get(key)
+        count_cache(key, "hit" if data else "miss")
         if data:
             return json.loads(data)
         return None
@@ -123,7 +226,7 @@ async def get_cached(key: str) -> Optional[Any]:
         return None
 
 
-async def set_cached(key: str, value: Any, ttl: int = 60) -> bool:
+async def set_cached(key: str, value: Any, ttl: int = 60, tags: Iterable[str] = ()) -> bool:
     """
     Store data in cache with TTL.
     
@@ -131,13 +234,20 @@ async def set_cached(key: str, value: Any, ttl: int = 60) -> bool:
         key: Cache key
         value: Data to cache (must be JSON serializable)
         ttl: Time to live in seconds (default: 60)
+        tags: Cache tags to record the key under (see invalidate_tags)
         
     Returns:
         True if successful, False otherwise
     """
     try:
         serialized = json.dumps(value, default=str)
-        await redis.set(key, serialized, ex=ttl)
+        if tags:
+            pipe = redis.pipeline()
+            pipe.set(key, serialized, ex=ttl)
+            _add_to_tags(pipe, key, tags)
+            await pipe.execute()
+        else:
+            await redis.set(key, serialized, ex=ttl)
         return True
         
     except (TypeError, ValueError) as e:
@@ -212,7 +322,8 @@ async def get_many_cached(keys: List[str]) -> dict:
                     result[key] = json.loads(value)
                 except json.JSONDecodeError:
                     logger.warning(f"Invalid JSON for key '{key}'")
-                    
+
+        count_cache_many(keys, result)
         return result
         
     except Exception as e:
@@ -254,6 +365,386 @@ async def set_many_cached(items: dict, ttl: int = 60) -> int:
         return 0
 
 
+# -----------------------------
+# Response entries (body + validators)
+# -----------------------------
+# Entries are Redis hashes so the validators can be read without pulling the
+# body: {"etag": ..., "modified": <unix ts>, "body": <json>}. Entries stored
+# with precompress=True also hold "body:gzip" / "body:br" variants.
+
+
+def make_etag(body: str) -> str:
+    """Strong ETag from the serialized body."""
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+
+async def get_entry_meta(key: str) -> Optional[dict]:
+    """Fetch only the validators (etag, modified) of a response entry."""
+    try:
+        etag, modified = await redis.hmget(key, "etag", "modified")
+        if etag is None:
+            return None
+        return {"etag": etag, "modified": int(modified or 0)}
+    except Exception as e:
+        logger.warning(f"Cache entry meta get failed for key '{key}': {e}")
+        return None
+
+
+async def get_cached_entry(key: str, encoding: Optional[str] = None) -> Optional[dict]:
+    """
+    Fetch a response entry.
+
+    Args:
+        key: Cache key
+        encoding: If set ("gzip"/"br"), also fetch the precompressed variant
+
+    Returns:
+        {"etag", "modified", "body"} with `body` still serialized, or None.
+        With `encoding`, the entry also has "encoded" (bytes) when the
+        variant exists.
+    """
+    try:
+        if encoding:
+            etag, modified, encoded = await binary_redis.hmget(key, "etag", "modified", f"body:{encoding}")
+            if etag is not None and encoded is not None:
+                count_cache(key, "hit")
+                return {"etag": etag.decode(), "modified": int(modified or 0), "encoded": encoded, "encoding": encoding}
+
+        etag, modified, body = await redis.hmget(key, "etag", "modified", "body")
+        if etag is None or body is None:
+            count_cache(key, "miss")
+            return None
+        count_cache(key, "hit")
+        return {"etag": etag, "modified": int(modified or 0), "body": body}
+    except Exception as e:
+        logger.warning(f"Cache entry get failed for key '{key}': {e}")
+        return None
+
+
+async def set_cached_entry(
+    key: str,
+    value: Any,
+    ttl: int = 60,
+    precompress: bool = False,
+    tags: Iterable[str] = (),
+) -> Optional[dict]:
+    """
+    Serialize `value` once and store it together with its ETag.
+
+    Args:
+        key: Cache key
+        value: Data to cache (must be JSON serializable)
+        ttl: Time to live in seconds
+        precompress: Also store gzip/brotli variants of large bodies
+        tags: Cache tags to record the key under (see invalidate_tags)
+
+    Returns:
+        The stored entry (body serialized, variants under "variants"), or
+        None if it couldn't be serialized. The entry is returned even when
+        Redis is unavailable.
+    """
+    try:
+        body = json.dumps(value, default=str)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Failed to serialize value for key '{key}': {e}")
+        return None
+
+    entry = {"etag": make_etag(body), "modified": int(time.time()), "body": body}
+    variants = compress_variants(body.encode()) if precompress else {}
+    try:
+        pipe = redis.pipeline()
+        # Replace any plain string value left under the same key
+        pipe.delete(key)
+        pipe.hset(key, mapping={**entry, **{f"body:{enc}": data for enc, data in variants.items()}})
+        pipe.expire(key, ttl)
+        _add_to_tags(pipe, key, tags)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Cache entry set failed for key '{key}': {e}")
+    return {**entry, "variants": variants}
+
+
+async def get_or_build_entry(
+    key: str,
+    build: Callable[[], Awaitable[Any]],
+    ttl: int = 60,
+    precompress: bool = False,
+    tags: Iterable[str] = (),
+) -> Any:
+    """
+    Return the decoded value of a response entry, building and storing it on a
+    miss. Lets composite responses share entries with the endpoints that
+    serve each part on its own.
+    """
+    entry = await get_cached_entry(key)
+    if entry is not None:
+        try:
+            return json.loads(entry["body"])
+        except json.JSONDecodeError as e:
+            logger.warning(f"Invalid JSON in cache entry '{key}': {e}")
+
+    value = await build()
+    await set_cached_entry(key, value, ttl=ttl, precompress=precompress, tags=tags)
+    return value
+
+
+# -----------------------------
+# Cached sets
+# -----------------------------
+# A Redis set can't be empty, so loaded sets carry a marker member. A set
+# without the marker (missing, expired, or only holding write-through adds)
+# counts as not loaded and is reloaded from upstream.
+SET_LOADED_MARKER = "__loaded__"
+
+
+async def get_cached_set(key: str) -> Optional[set]:
+    """Members of a loaded set, or None if it has to be (re)loaded."""
+    try:
+        members = await redis.smembers(key)
+        if SET_LOADED_MARKER not in members:
+            count_cache(key, "miss")
+            return None
+        count_cache(key, "hit")
+        members.discard(SET_LOADED_MARKER)
+        return members
+    except Exception as e:
+        logger.warning(f"Cache set get failed for key '{key}': {e}")
+        return None
+
+
+async def set_cached_set(key: str, members: List[Any], ttl: int = 60) -> bool:
+    """Replace a set with `members` and mark it loaded."""
+    try:
+        pipe = redis.pipeline()
+        pipe.delete(key)
+        pipe.sadd(key, SET_LOADED_MARKER, *(str(m) for m in members))
+        pipe.expire(key, ttl)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache set store failed for key '{key}': {e}")
+        return False
+
+
+async def add_to_cached_set(key: str, members: List[Any], ttl: int = 60) -> bool:
+    try:
+        if not members:
+            return True
+        pipe = redis.pipeline()
+        pipe.sadd(key, *(str(m) for m in members))
+        pipe.expire(key, ttl)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache set add failed for key '{key}': {e}")
+        return False
+
+
+async def remove_from_cached_set(key: str, members: List[Any]) -> bool:
+    try:
+        if members:
+            await redis.srem(key, *(str(m) for m in members))
+        return True
+    except Exception as e:
+        logger.warning(f"Cache set remove failed for key '{key}': {e}")
+        return False
+
+
+async def update_cached_set(key: str, add: List[Any], remove: List[Any], ttl: int = 60) -> bool:
+    """Apply adds and removes to a set in one round trip."""
+    try:
+        if not add and not remove:
+            return True
+        pipe = redis.pipeline()
+        if add:
+            pipe.sadd(key, *(str(m) for m in add))
+        if remove:
+            pipe.srem(key, *(str(m) for m in remove))
+        pipe.expire(key, ttl)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache set update failed for key '{key}': {e}")
+        return False
+
+
+async def cached_set_contains(key: str, members: List[Any]) -> Optional[List[bool]]:
+    """
+    Membership of every value in one round trip.
+
+    Returns:
+        One bool per member, or None if the set isn't loaded
+    """
+    try:
+        flags = await redis.smismember(key, [SET_LOADED_MARKER, *(str(m) for m in members)])
+        count_cache(key, "hit" if flags[0] else "miss")
+        if not flags[0]:
+            return None
+        return [bool(f) for f in flags[1:]]
+    except Exception as e:
+        logger.warning(f"Cache set membership failed for key '{key}': {e}")
+        return None
+
+
+async def claim_once(key: str, ttl: int = 60) -> bool:
+    """
+    SET NX a marker key. True the first time for a key, False while it lives.
+    Fails open (True) when Redis is unavailable.
+    """
+    try:
+        return bool(await redis.set(key, "1", ex=ttl, nx=True))
+    except Exception as e:
+        logger.warning(f"Cache claim failed for key '{key}': {e}")
+        return True
+
+
+# -----------------------------
+# Cached hashes (counters)
+# -----------------------------
+# Only bump counters of hashes that are already loaded; a partial hash would
+# otherwise look complete
+_HINCRBY_IF_EXISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('hincrby', KEYS[1], ARGV[1], ARGV[2])
+end
+return nil
+"""
+
+
+async def get_many_cached_hashes(keys: List[str]) -> List[Optional[dict]]:
+    """HGETALL for many keys in one round trip; None for missing keys."""
+    try:
+        if not keys:
+            return []
+        pipe = redis.pipeline()
+        for key in keys:
+            pipe.hgetall(key)
+        results = await pipe.execute()
+        count_cache_many(keys, {key for key, r in zip(keys, results) if r})
+        return [r or None for r in results]
+    except Exception as e:
+        logger.warning(f"Cache hash mget failed: {e}")
+        return [None] * len(keys)
+
+
+async def set_cached_hash(key: str, mapping: dict, ttl: int = 60) -> bool:
+    try:
+        pipe = redis.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache hash set failed for key '{key}': {e}")
+        return False
+
+
+async def push_recent(key: str, value: str, limit: int, ttl: int = 60) -> bool:
+    """Prepend to a capped list (newest first)."""
+    try:
+        pipe = redis.pipeline()
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, limit - 1)
+        pipe.expire(key, ttl)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Cache list push failed for key '{key}': {e}")
+        return False
+
+
+async def get_recent(key: str, limit: int) -> List[str]:
+    try:
+        return await redis.lrange(key, 0, limit - 1)
+    except Exception as e:
+        logger.warning(f"Cache list get failed for key '{key}': {e}")
+        return []
+
+
+async def increment_cached_hash(key: str, field: str, amount: int = 1) -> bool:
+    """Atomically increment a field of an existing hash; no-op if the hash isn't cached."""
+    try:
+        return await redis.eval(_HINCRBY_IF_EXISTS, 1, key, field, amount) is not None
+    except Exception as e:
+        logger.warning(f"Cache hash increment failed for key '{key}': {e}")
+        return False
+
+
+# -----------------------------
+# Negative caching
+# -----------------------------
+NEGATIVE_CACHE_TTL = 60  # short, so a product published without a webhook shows up quickly
+NEGATIVE_CACHE_PREFIX = "missing"
+CACHE_STATS_KEY = "cache_stats"
+
+
+def negative_cache_key(kind: str, *parts: Any) -> str:
+    """Build a negative cache key, e.g. missing:product:<slug>."""
+    return ":".join([NEGATIVE_CACHE_PREFIX, kind, *(str(p) for p in parts)])
+
+
+async def is_known_missing(kind: str, *parts: Any) -> bool:
+    """
+    Check whether a lookup is known to return nothing upstream.
+    Lookups and hits are counted per kind so the miss hit rate can be reported.
+    """
+    key = negative_cache_key(kind, *parts)
+    try:
+        pipe = redis.pipeline()
+        pipe.exists(key)
+        pipe.hincrby(CACHE_STATS_KEY, f"negative:{kind}:lookups", 1)
+        exists, _ = await pipe.execute()
+        if exists:
+            await redis.hincrby(CACHE_STATS_KEY, f"negative:{kind}:hits", 1)
+            return True
+        return False
+    except Exception as e:
+        logger.warning(f"Negative cache check failed for key '{key}': {e}")
+        return False
+
+
+async def mark_missing(kind: str, *parts: Any, ttl: int = NEGATIVE_CACHE_TTL, tags: Iterable[str] = ()) -> bool:
+    """Remember that a lookup returned nothing upstream."""
+    key = negative_cache_key(kind, *parts)
+    try:
+        pipe = redis.pipeline()
+        pipe.set(key, "1", ex=ttl)
+        _add_to_tags(pipe, key, tags)
+        await pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Negative cache set failed for key '{key}': {e}")
+        return False
+
+
+async def get_negative_cache_stats() -> dict:
+    """
+    Negative cache hit rates per kind.
+
+    Returns:
+        {"product": {"lookups": 10, "hits": 7, "hit_rate": 0.7}, ...}
+    """
+    try:
+        raw = await redis.hgetall(CACHE_STATS_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to read cache stats: {e}")
+        return {}
+
+    stats = {}
+    for field, value in raw.items():
+        scope, _, rest = field.partition(":")
+        if scope != "negative":
+            continue
+        kind, _, counter = rest.rpartition(":")
+        stats.setdefault(kind, {"lookups": 0, "hits": 0})[counter] = int(value)
+
+    for kind_stats in stats.values():
+        lookups = kind_stats["lookups"]
+        kind_stats["hit_rate"] = round(kind_stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
 async def ping_redis() -> bool:
     """Health check for Redis connection."""
     try:
@@ -269,6 +760,8 @@ async def close_redis():
     try:
         await redis.close()
         await pool.disconnect()
+        await binary_redis.close()
+        await binary_pool.disconnect()
         logger.info("Redis connection closed")
     except Exception as e:
         logger.error(f"Error closing Redis connection: {e}")
@@ -0,0 +1,79 @@
+# app/utils/compression.py
+import gzip
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, we fall back to gzip only
+    brotli = None
+
+MINIMUM_SIZE = 1024  # bytes; smaller bodies aren't worth the CPU or the header
+
+# Per-request compression runs on the hot path, keep it cheap
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Stored variants are compressed once per cache fill, so we can afford more
+STORED_GZIP_LEVEL = 9
+STORED_BROTLI_QUALITY = 9
+
+
+def supported_encodings() -> list:
+    """Encodings we can produce, in order of preference."""
+    return ["br", "gzip"] if brotli else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the best encoding from an Accept-Encoding header.
+    Honours q-values (q=0 means "not acceptable"); on ties brotli wins.
+    """
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    The ETag of a body's `encoding` variant. Each content-coding is its own
+    representation and needs its own strong validator ("<hash>-gzip");
+    weak ones may be shared.
+    """
+    if not encoding or etag.startswith("W/"):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def compress(body: bytes, encoding: str, stored: bool = False) -> bytes:
+    if encoding == "br" and brotli:
+        return brotli.compress(body, quality=STORED_BROTLI_QUALITY if stored else BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=STORED_GZIP_LEVEL if stored else GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """Precompressed copies of a body for every supported encoding."""
+    if len(body) < MINIMUM_SIZE:
+        return {}
+    return {encoding: compress(body, encoding, stored=True) for encoding in supported_encodings()}
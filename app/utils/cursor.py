@@ -0,0 +1,73 @@
+# app/utils/cursor.py
+import base64
+import hashlib
+import json
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+# An index is a list of (sort key, id) pairs sorted ascending. A cursor holds
+# the last pair a client has seen, so the next page starts right after it no
+# matter what was added or removed in between.
+IndexEntry = Tuple[Any, int]
+
+
+def encode_cursor(sort_key: Any, item_id: int, fingerprint: str) -> str:
+    payload = json.dumps({"k": sort_key, "i": item_id, "f": fingerprint}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> Optional[IndexEntry]:
+    """
+    Position encoded in a cursor, or None for an empty cursor (first page).
+    Raises 400 for garbage or a cursor issued for a different query.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = (payload["k"], int(payload["i"]))
+        issued_for = payload["f"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if issued_for != fingerprint:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested filters or sort order")
+    return position
+
+
+def query_fingerprint(params: Dict) -> str:
+    """Short hash of the query a cursor belongs to (filters and sort, not page size)."""
+    stable = {k: v for k, v in params.items() if k not in ("page", "per_page")}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def normalize_sort_key(value: Any, numeric: bool = False) -> Any:
+    """Make sort keys comparable: numbers for numeric fields, lowercase strings otherwise."""
+    if numeric:
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    return str(value or "").lower()
+
+
+def build_index(items: List[Dict], field: str, numeric: bool = False) -> List[IndexEntry]:
+    return sorted((normalize_sort_key(item.get(field), numeric), item["id"]) for item in items)
+
+
+def seek(index: List[IndexEntry], position: Optional[IndexEntry], limit: int, descending: bool = False) -> Tuple[List[IndexEntry], bool]:
+    """
+    The `limit` entries after `position` in sort order, found by binary search.
+
+    Returns:
+        (entries, has_more)
+    """
+    if descending:
+        end = len(index) if position is None else bisect_left(index, tuple(position))
+        start = max(0, end - limit)
+        return index[start:end][::-1], start > 0
+
+    start = 0 if position is None else bisect_right(index, tuple(position))
+    end = start + limit
+    return index[start:end], end < len(index)
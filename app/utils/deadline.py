@@ -0,0 +1,115 @@
+# app/utils/deadline.py
+"""
+Per-request time budgets.
+
+Every request gets a deadline when it arrives (see DeadlineMiddleware) and
+upstream and Redis calls made for it are given whatever is left of it
+rather than their own fixed timeout, so a chain of calls can't run past
+what the client will wait for.
+
+Requests that write upstream in several steps (creating an order and then
+its PaymentIntent, completing an order and then paying its authors) must
+not stop halfway. They are never cancelled, and their deadline only holds
+until the first write, after which the handler calls `lift_deadline`.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from app.core.config import settings
+
+TIMEOUT_HEADER = "x-request-timeout"
+MIN_TIMEOUT = 0.1
+
+# Routes allowed longer than REQUEST_TIMEOUT, by path prefix (first match wins)
+ROUTE_TIMEOUTS = (
+    ("/webhook/", 60.0),  # WooCommerce and Stripe retry slowly; finish the work
+    ("/api/v1/admin/", 60.0),
+    ("/api/v1/orders", 30.0),
+    ("/api/v1/products/library", 30.0),
+)
+
+# Multi-step writes, by method (None for any) and path
+UNCANCELLABLE_ROUTES = (
+    ("POST", "/api/v1/orders"),
+    (None, "/webhook/"),
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the call could start."""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def route_timeout(path: str) -> float:
+    for prefix, seconds in ROUTE_TIMEOUTS:
+        if path.startswith(prefix):
+            return seconds
+    return settings.REQUEST_TIMEOUT
+
+
+def cancellable(method: str, path: str) -> bool:
+    for route_method, route_path in UNCANCELLABLE_ROUTES:
+        if route_method is None and path.startswith(route_path):
+            return False
+        if method == route_method and path.rstrip("/") == route_path:
+            return False
+    return True
+
+
+def request_timeout(path: str, header: Optional[str] = None) -> float:
+    """
+    The route's budget, or less if the client says it won't wait that long
+    (`X-Request-Timeout: <seconds>`). Clients can shorten it, not extend it.
+    """
+    seconds = route_timeout(path)
+    if header:
+        try:
+            seconds = min(seconds, max(MIN_TIMEOUT, float(header)))
+        except ValueError:
+            pass
+    return seconds
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[float]:
+    """Give everything run inside the block (tasks it starts included) `seconds`."""
+    deadline = time.monotonic() + seconds
+    # A nested scope can shorten the budget but never extend it
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def lift_deadline():
+    """
+    Drop the deadline for the rest of the request, once its first upstream
+    write has happened and the steps after it have to finish. Lasts until
+    the enclosing deadline_scope exits.
+    """
+    _deadline.set(None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, None outside a request."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget(timeout: Optional[float]) -> Optional[float]:
+    """`timeout` cut down to the time left, raising if none is."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if timeout is None else min(timeout, left)
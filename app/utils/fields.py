@@ -0,0 +1,88 @@
+# app/utils/fields.py
+import re
+from typing import Dict, Iterable, List, Optional
+from fastapi import HTTPException
+
+# Named field presets. Clients send ?fields=card instead of a long list and
+# cache keys use the preset name, so every client asking for "card" shares
+# one cache entry.
+FIELD_PRESETS: Dict[str, List[str]] = {
+    "card": [
+        "id", "name", "slug", "type", "price", "regular_price", "sale_price",
+        "on_sale", "images", "categories", "average_rating", "rating_count",
+    ],
+    "detail": [
+        "id", "name", "slug", "type", "permalink", "price", "regular_price",
+        "sale_price", "on_sale", "purchasable", "downloadable", "stock_status",
+        "description", "short_description", "images", "categories", "tags",
+        "attributes", "meta_data", "average_rating", "rating_count", "date_created",
+    ],
+    "library": [
+        "id", "name", "slug", "images", "categories", "meta_data",
+    ],
+}
+
+# Fields our own post-processing (category enrichment, permission sanitizing)
+# relies on. They are always requested upstream and stripped again afterwards
+# if the client didn't ask for them.
+REQUIRED_FIELDS = ["id"]
+
+field_pattern = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def resolve_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Turn a ?fields= value into a list of product fields.
+    Accepts a preset name ("card") or a comma separated list ("id,name,price").
+    """
+    if not fields:
+        return None
+
+    fields = fields.strip()
+    if fields in FIELD_PRESETS:
+        return list(FIELD_PRESETS[fields])
+
+    names = []
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if not field_pattern.match(name):
+            raise HTTPException(status_code=400, detail=f"Invalid field name '{name}'")
+        if name not in names:
+            names.append(name)
+    return names or None
+
+
+def fields_cache_token(fields: Optional[str]) -> Optional[str]:
+    """Stable cache key fragment for a ?fields= value (preset name or sorted list)."""
+    if not fields:
+        return None
+    fields = fields.strip()
+    if fields in FIELD_PRESETS:
+        return fields
+    resolved = resolve_fields(fields)
+    return ",".join(sorted(resolved)) if resolved else None
+
+
+def upstream_fields(fields: List[str], extra: Iterable[str] = ()) -> str:
+    """Build the WooCommerce `_fields` parameter, adding the fields we need internally."""
+    names = list(fields)
+    for name in [*REQUIRED_FIELDS, *extra]:
+        if name not in names:
+            names.append(name)
+    return ",".join(names)
+
+
+def project(item: Dict, fields: Optional[List[str]], keep: Iterable[str] = ()) -> Dict:
+    """Drop every key from `item` that wasn't requested."""
+    if not fields:
+        return item
+    allowed = set(fields) | set(keep)
+    return {k: v for k, v in item.items() if k in allowed}
+
+
+def project_many(items: List[Dict], fields: Optional[List[str]], keep: Iterable[str] = ()) -> List[Dict]:
+    if not fields:
+        return items
+    return [project(item, fields, keep) for item in items]
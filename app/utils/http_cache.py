@@ -0,0 +1,153 @@
+# app/utils/http_cache.py
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.utils.cache import get_entry_meta, get_cached_entry, set_cached_entry
+from app.utils.compression import encoded_etag, negotiate_encoding, supported_encodings
+from app.utils.metrics import count_cache
+
+BROWSER_MAX_AGE = 60  # browsers revalidate quickly, the CDN keeps the full TTL
+
+
+def is_anonymous(request: Request, user_id: Optional[int] = None) -> bool:
+    """A response can be shared by the CDN only if nothing user specific went into it."""
+    return user_id is None and "authorization" not in request.headers
+
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    The validator in If-None-Match that matches the entry's `etag`, in any
+    of its encoded variants, or None. Weak comparison: W/"x" matches "x".
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    variants = {etag, *(encoded_etag(etag, encoding) for encoding in supported_encodings())}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.removeprefix("W/") in variants:
+            return tag.removeprefix("W/")
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return matching_etag(if_none_match, etag) is not None
+
+
+def not_modified_since(if_modified_since: Optional[str], modified: int) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        return modified <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def caching_headers(
+    entry: dict,
+    ttl: int,
+    public: bool,
+    surrogate_keys: Iterable[str] = (),
+) -> dict:
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": formatdate(entry["modified"], usegmt=True),
+        "Vary": "Authorization",
+    }
+    if public:
+        headers["Cache-Control"] = (
+            f"public, max-age={min(ttl, BROWSER_MAX_AGE)}, s-maxage={ttl}, "
+            f"stale-while-revalidate={ttl}"
+        )
+        keys = " ".join(surrogate_keys)
+        if keys:
+            headers["Surrogate-Key"] = keys
+    else:
+        headers["Cache-Control"] = "private, no-cache"
+    return headers
+
+
+def not_modified(request: Request, entry: dict, headers: dict) -> Response:
+    """A 304 carrying the validator of the representation the client holds."""
+    matched = matching_etag(request.headers.get("if-none-match"), entry["etag"])
+    return Response(status_code=304, headers={**headers, "ETag": matched or entry["etag"]})
+
+
+def is_fresh(request: Request, entry: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, entry["etag"])
+    return not_modified_since(request.headers.get("if-modified-since"), entry["modified"])
+
+
+async def cached_response(
+    request: Request,
+    key: str,
+    ttl: int,
+    build: Callable[[], Awaitable[Any]],
+    public: bool = True,
+    surrogate_keys: Iterable[str] = (),
+    precompress: bool = False,
+    tags: Iterable[str] = (),
+) -> Response:
+    """
+    Serve a cached JSON body with ETag/Last-Modified validators.
+
+    Conditional requests are answered from the entry's validators alone, so a
+    304 never loads or builds the body. On a miss `build()` runs once and the
+    serialized body is stored with its ETag.
+
+    With `precompress`, gzip/brotli variants are stored next to the body and
+    sent as-is to clients that accept them; the compression middleware skips
+    responses that already carry a Content-Encoding. `tags` are the cache
+    tags the entry is recorded under (see invalidate_tags).
+    """
+    surrogate_keys = list(surrogate_keys)
+    conditional = "if-none-match" in request.headers or "if-modified-since" in request.headers
+    encoding = negotiate_encoding(request.headers.get("accept-encoding")) if precompress else None
+
+    def headers_for(entry: dict) -> dict:
+        return caching_headers(entry, ttl, public, surrogate_keys)
+
+    if conditional:
+        meta = await get_entry_meta(key)
+        if meta and is_fresh(request, meta):
+            count_cache(key, "hit")
+            return not_modified(request, meta, headers_for(meta))
+        if meta:
+            # The client revalidated a copy that has since changed
+            count_cache(key, "stale")
+
+    entry = await get_cached_entry(key, encoding)
+    if entry is None:
+        value = await build()
+        entry = await set_cached_entry(key, value, ttl=ttl, precompress=precompress, tags=tags)
+        if entry is None:
+            return JSONResponse(jsonable_encoder(value), headers={"Cache-Control": "no-store"})
+        if conditional and is_fresh(request, entry):
+            return not_modified(request, entry, headers_for(entry))
+        if encoding in entry["variants"]:
+            entry = {**entry, "encoded": entry["variants"][encoding], "encoding": encoding}
+
+    if "encoded" in entry:
+        # The middleware adds Vary: Accept-Encoding for bodies it compresses
+        # itself; precompressed ones bypass it, so add it here
+        return Response(
+            content=entry["encoded"],
+            media_type="application/json",
+            headers={
+                **headers_for(entry),
+                "ETag": encoded_etag(entry["etag"], entry["encoding"]),
+                "Content-Encoding": entry["encoding"],
+                "Vary": "Authorization, Accept-Encoding",
+            },
+        )
+
+    return Response(
+        content=entry["body"],
+        media_type="application/json",
+        headers=headers_for(entry),
+    )
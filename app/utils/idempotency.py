@@ -0,0 +1,123 @@
+# app/utils/idempotency.py
+import asyncio
+import hashlib
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import HTTPException
+from app.utils.cache import redis
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = 86400  # completed responses are replayed for a day
+IDEMPOTENCY_LOCK_TTL = 60  # an in-flight claim expires if its worker dies
+WAIT_TIMEOUT = 30.0
+POLL_INTERVAL = 0.1
+
+# Set by run_idempotent while its function runs (see mark_committed)
+_run_state: ContextVar[Optional[dict]] = ContextVar("idempotent_run", default=None)
+
+
+def request_fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def _load(key: str) -> Optional[dict]:
+    data = await redis.get(key)
+    return json.loads(data) if data else None
+
+
+def mark_committed():
+    """
+    Tell the surrounding run_idempotent() that the request has now changed
+    something upstream. If it fails after this point the key is kept and
+    the failure replayed, since a retry would repeat the change.
+    """
+    state = _run_state.get()
+    if state is not None:
+        state["committed"] = True
+
+
+def _failure(error: BaseException) -> dict:
+    if isinstance(error, HTTPException):
+        return {"status": error.status_code, "detail": error.detail}
+    return {"status": 500, "detail": "Request failed after it was partly applied"}
+
+
+async def run_idempotent(
+    scope: str,
+    idempotency_key: str,
+    fingerprint: str,
+    func: Callable[[], Awaitable[dict]],
+) -> Tuple[dict, bool]:
+    """
+    Run `func` at most once per idempotency key.
+
+    The first request claims the key and runs; its result is stored. A
+    duplicate arriving while it runs waits for that result, and one arriving
+    later gets the stored result replayed. Reusing a key with a different
+    request body is rejected. If `func` fails the claim is released so the
+    client can retry with the same key, unless it had already committed
+    (see mark_committed): then the failure is stored and replayed instead.
+    Without Redis, requests just run.
+
+    Returns:
+        (result, replayed)
+    """
+    key = f"idempotency:{scope}:{idempotency_key}"
+    pending = json.dumps({"state": "pending", "fingerprint": fingerprint})
+
+    deadline = asyncio.get_running_loop().time() + WAIT_TIMEOUT
+    while True:
+        try:
+            claimed = await redis.set(key, pending, ex=IDEMPOTENCY_LOCK_TTL, nx=True)
+            record = None if claimed else await _load(key)
+        except Exception as e:
+            logger.warning(f"Idempotency store unavailable for key '{key}': {e}")
+            return await func(), False
+
+        if claimed:
+            break
+        if record is None:
+            # The other request failed or expired between our two calls: retry the claim
+            continue
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        if record["state"] == "done":
+            return record["response"], True
+        if record["state"] == "failed":
+            raise HTTPException(status_code=record["status"], detail=record["detail"])
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        await asyncio.sleep(POLL_INTERVAL)
+
+    state = {"committed": False}
+    token = _run_state.set(state)
+    try:
+        result = await func()
+    except BaseException as error:
+        try:
+            if state["committed"]:
+                failed = {"state": "failed", "fingerprint": fingerprint, **_failure(error)}
+                await redis.set(key, json.dumps(failed, default=str), ex=IDEMPOTENCY_TTL)
+            else:
+                await redis.delete(key)
+        except Exception as e:
+            logger.warning(f"Failed to release idempotency key '{key}': {e}")
+        raise
+    finally:
+        _run_state.reset(token)
+
+    try:
+        done = {"state": "done", "fingerprint": fingerprint, "response": result}
+        await redis.set(key, json.dumps(done, default=str), ex=IDEMPOTENCY_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to store idempotent response for key '{key}': {e}")
+    return result, False
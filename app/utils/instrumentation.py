@@ -0,0 +1,131 @@
+# app/utils/instrumentation.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+import httpx
+from app.utils.metrics import endpoint_template, observe_upstream
+from app.utils.scheduler import ScheduledTransport
+
+# Dependencies reported in Server-Timing, in this order
+DEPENDENCIES = ("woocommerce", "wordpress", "stripe", "recaptcha", "redis")
+
+
+class DependencyCall:
+    """One call in flight; callers that know the payload size set `bytes`."""
+
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class RequestMetrics:
+    """Calls, bytes and time per dependency for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.deps: Dict[str, Dict[str, float]] = {}
+
+    def record(self, dependency: str, seconds: float, size: int = 0, calls: int = 1):
+        dep = self.deps.get(dependency)
+        if dep is None:
+            dep = self.deps[dependency] = {"calls": 0, "bytes": 0, "seconds": 0.0}
+        dep["calls"] += calls
+        dep["bytes"] += size
+        dep["seconds"] += seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value. Durations are summed per dependency, so
+        with parallel calls they can add up to more than the request took.
+        """
+        names = [d for d in DEPENDENCIES if d in self.deps] + [d for d in self.deps if d not in DEPENDENCIES]
+        parts = [
+            f'{name};dur={self.deps[name]["seconds"] * 1000:.1f};desc="{int(self.deps[name]["calls"])} calls, {int(self.deps[name]["bytes"])} B"'
+            for name in names
+        ]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            name: {"calls": int(dep["calls"]), "bytes": int(dep["bytes"]), "ms": round(dep["seconds"] * 1000, 1)}
+            for name, dep in self.deps.items()
+        }
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def request_scope() -> Iterator[RequestMetrics]:
+    """
+    Collect metrics for everything run inside the block. Tasks started from
+    it copy the context and report into the same object.
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def record(dependency: str, seconds: float, size: int = 0, calls: int = 1, endpoint: Optional[str] = None):
+    """
+    Report a finished call. Calls naming an endpoint also feed the upstream
+    latency histogram, inside a request or not.
+    """
+    if endpoint is not None:
+        observe_upstream(dependency, endpoint, seconds)
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record(dependency, seconds, size, calls)
+
+
+@contextmanager
+def track(dependency: str, endpoint: Optional[str] = None) -> Iterator[DependencyCall]:
+    """Time a block as one call to `dependency`, failed calls included."""
+    call = DependencyCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        record(dependency, time.perf_counter() - started, call.bytes, endpoint=endpoint)
+
+
+def instrumented_client(dependency: str, **kwargs) -> httpx.AsyncClient:
+    """
+    An httpx client whose requests report into the current request's
+    metrics. The response body is read in the hook so its size and transfer
+    time are included; every caller reads it anyway. Requests go through
+    the dependency's scheduler, which limits how many run at once and cuts
+    their timeouts down to what is left of the request's deadline.
+    """
+    async def on_request(request: httpx.Request):
+        request.extensions["started"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response):
+        await response.aread()
+        request = response.request
+        size = len(request.content) + len(response.content)
+        record(
+            dependency,
+            time.perf_counter() - request.extensions["started"],
+            size,
+            endpoint=endpoint_template(request.url.path),
+        )
+
+    return httpx.AsyncClient(
+        transport=ScheduledTransport(dependency),
+        event_hooks={"request": [on_request], "response": [on_response]},
+        **kwargs,
+    )
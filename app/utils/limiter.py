@@ -0,0 +1,92 @@
+# app/utils/limiter.py
+"""
+Adaptive concurrency limit, after the gradient algorithm in Netflix's
+concurrency-limits.
+
+Finished calls are collected into windows of about one round trip (as many
+calls as the limit) and the limit is updated once per window. It follows
+the ratio between a slow-moving baseline latency and the window's average
+latency: while the upstream answers about as fast as usual the gradient is
+1 and the limit grows by a few calls (room to probe for more); once
+latency climbs past `TOLERANCE` times the baseline the gradient drops below
+1 and the limit shrinks toward what the upstream can serve without
+queueing. A window with overload answers (429/5xx gateway errors,
+connection errors) backs the limit off multiplicatively instead.
+
+Until the first sign of overload the limit starts slow, like TCP: it
+doubles every window, so a cold worker facing a burst of fan-out reaches
+a useful limit in a few round trips rather than a few hundred.
+"""
+from typing import Optional
+
+MIN_LIMIT = 2
+INITIAL_LIMIT = 8
+
+MIN_WINDOW = 5  # fewest calls per update
+SMOOTHING = 0.2  # share of each new estimate blended into the limit
+TOLERANCE = 1.5  # latency may grow this much over baseline before the limit shrinks
+BASELINE_WINDOWS = 100  # windows averaged into the baseline latency
+HEADROOM = 4  # calls allowed past the estimate, to keep probing for a higher limit
+BACKOFF = 0.9
+
+
+class AdaptiveLimit:
+    def __init__(self, maximum: int, initial: int = INITIAL_LIMIT, minimum: int = MIN_LIMIT):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(initial, maximum))
+        self.baseline: Optional[float] = None
+        self.slow_start = True
+        self._reset_window()
+
+    def _reset_window(self):
+        self.calls = 0
+        self.samples = 0
+        self.total_rtt = 0.0
+        self.max_in_flight = 0
+        self.dropped = False
+
+    def current(self) -> int:
+        return int(self.limit)
+
+    def update(self, rtt: float, in_flight: int, dropped: bool = False):
+        """Feed one finished call: its latency and the calls in flight when it ended."""
+        self.calls += 1
+        self.max_in_flight = max(self.max_in_flight, in_flight)
+        if dropped:
+            self.dropped = True
+        else:
+            self.samples += 1
+            self.total_rtt += rtt
+        if self.calls < max(MIN_WINDOW, self.current()):
+            return
+
+        if self.dropped:
+            self.slow_start = False
+            self.limit = max(self.minimum, self.limit * BACKOFF)
+        elif self.samples:
+            self._follow_latency(self.total_rtt / self.samples)
+        self._reset_window()
+
+    def _follow_latency(self, recent: float):
+        if self.baseline is None:
+            self.baseline = recent
+        self.baseline += (recent - self.baseline) / BASELINE_WINDOWS
+        # Latency got much better (a cold upstream warmed up): let the
+        # baseline catch up instead of holding the limit back
+        if self.baseline > 2 * recent:
+            self.baseline *= 0.95
+
+        # Too few calls in flight to say anything about the limit
+        if self.max_in_flight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, TOLERANCE * self.baseline / recent))
+        if self.slow_start:
+            if gradient == 1.0:
+                self.limit = min(self.maximum, self.limit * 2)
+                return
+            self.slow_start = False
+        estimate = self.limit * gradient + HEADROOM
+        self.limit = self.limit * (1 - SMOOTHING) + estimate * SMOOTHING
+        self.limit = max(self.minimum, min(self.maximum, self.limit))
@@ -0,0 +1,176 @@
+# app/utils/metrics.py
+"""
+Prometheus metrics.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers (and wipe it on deploy). Every worker then
+writes its samples there and /metrics aggregates all of them, whichever
+worker serves the scrape. Without it, metrics cover the serving process only.
+"""
+import asyncio
+import os
+import re
+from typing import Optional
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Request latency buckets: cache hits sit in the low milliseconds, anything
+# fanning out to WooCommerce in the hundreds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+POOL_SAMPLE_INTERVAL = 0.5  # seconds between connection pool samples
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being handled",
+    multiprocess_mode="livesum",
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Upstream call latency by dependency and endpoint",
+    ["dependency", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by key prefix and result (hit, miss, or stale: a client revalidated an outdated copy)",
+    ["prefix", "result"],
+)
+REDIS_CONNECTIONS_IN_USE = Gauge(
+    "redis_pool_connections_in_use",
+    "Redis connections checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds",
+    "Event loop lag, smoothed: peaks at once, decays over a few probes",
+    multiprocess_mode="livemax",
+)
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "upstream_queue_depth",
+    "Upstream calls waiting for a slot, by priority class",
+    ["upstream", "priority"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "upstream_queue_wait_seconds",
+    "Time upstream calls spent waiting for a slot, by priority class",
+    ["upstream", "priority"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_QUEUE_TIMEOUTS = Counter(
+    "upstream_queue_timeouts_total",
+    "Upstream calls that gave up waiting for a slot",
+    ["upstream", "priority"],
+)
+UPSTREAM_ACTIVE = Gauge(
+    "upstream_active_calls",
+    "Upstream calls holding a slot",
+    ["upstream"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "upstream_concurrency_limit",
+    "Current adaptive concurrency limit per upstream",
+    ["upstream"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Upstream reads retried, by what went wrong (exception or status)",
+    ["dependency", "endpoint", "reason"],
+)
+UPSTREAM_RETRY_BUDGET_EXHAUSTED = Counter(
+    "upstream_retry_budget_exhausted_total",
+    "Retries skipped because the upstream's retry budget was spent",
+    ["dependency"],
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedges_total",
+    "Hedged reads sent, by whether the hedge answered first (won) or not (lost)",
+    ["dependency", "endpoint", "result"],
+)
+UPSTREAM_HEDGE_SAVED = Histogram(
+    "upstream_hedge_saved_seconds",
+    "For hedges that won: how much later the first copy answered",
+    ["dependency", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total",
+    "Low priority requests turned away with a 503 by admission control",
+    ["reason"],
+)
+
+id_segment = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_template(path: str) -> str:
+    """Low cardinality endpoint label: numeric path segments become {id}."""
+    path = path.split("/wp-json/", 1)[-1]
+    return id_segment.sub("/{id}", path).strip("/")
+
+
+def key_prefix(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def observe_request(method: str, route: Optional[str], status: int, seconds: float):
+    # Unmatched paths share one label so scanners can't blow up cardinality
+    REQUEST_LATENCY.labels(method, route or "unmatched", str(status)).observe(seconds)
+
+
+def observe_upstream(dependency: str, endpoint: str, seconds: float):
+    UPSTREAM_LATENCY.labels(dependency, endpoint).observe(seconds)
+
+
+def count_cache(key: str, result: str, n: int = 1):
+    if n:
+        CACHE_REQUESTS.labels(key_prefix(key), result).inc(n)
+
+
+def count_cache_many(keys, found) -> None:
+    """Count a multi-key lookup: one hit or miss per key, grouped by prefix."""
+    totals = {}
+    for key in keys:
+        label = (key_prefix(key), "hit" if key in found else "miss")
+        totals[label] = totals.get(label, 0) + 1
+    for (prefix, result), n in totals.items():
+        CACHE_REQUESTS.labels(prefix, result).inc(n)
+
+
+def pool_in_use(pool) -> int:
+    return len(getattr(pool, "_in_use_connections", ()))
+
+
+async def sample_runtime(pools: dict):
+    """Sample Redis pool usage for this worker until cancelled."""
+    while True:
+        await asyncio.sleep(POOL_SAMPLE_INTERVAL)
+        for name, pool in pools.items():
+            REDIS_CONNECTIONS_IN_USE.labels(name).set(pool_in_use(pool))
+
+
+def render_metrics() -> tuple:
+    """(body, content type) for a scrape, aggregated across workers if configured."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauges from the aggregate on shutdown."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,144 @@
+# app/utils/profiler.py
+"""
+On-demand request profiling with pyinstrument.
+
+Profiles are asyncio aware: time a request spends awaiting upstreams or
+Redis shows up under the awaiting coroutine as [await] frames instead of
+vanishing into the event loop. The raw session is stored in Redis and
+rendered on download, either as wall time (everything, awaits included)
+or CPU time (await frames dropped, so only the work done on the loop
+remains), in speedscope's flamegraph format or pyinstrument's HTML view.
+
+pyinstrument is optional and only imported once a profile is taken, so
+workers that never profile don't load it.
+"""
+import asyncio
+import importlib.util
+import json
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple
+from app.utils.cache import get_cached, set_cached, invalidate_cache_keys, set_cached_hash, get_many_cached_hashes, push_recent, get_recent
+
+if TYPE_CHECKING:
+    from pyinstrument import Profiler
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_INTERVAL = 0.001  # seconds between samples
+PROFILE_TTL = 86400
+PROFILE_INDEX_KEY = "profiles:recent"
+PROFILE_INDEX_SIZE = 100
+
+# The global window lives in Redis so it reaches every worker; each worker
+# polls it into a local timestamp, so requests only compare two floats
+PROFILING_WINDOW_KEY = "profiling:until"
+MAX_PROFILING_SECONDS = 300
+WINDOW_POLL_INTERVAL = 1.0
+
+VIEWS = ("wall", "cpu")
+FORMATS = ("speedscope", "html")
+
+_window_until = 0.0
+
+
+@lru_cache(maxsize=None)
+def available() -> bool:
+    return importlib.util.find_spec("pyinstrument") is not None
+
+
+def profile_key(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+
+# -----------------------------
+# Global profiling window
+# -----------------------------
+def window_open() -> bool:
+    return time.time() < _window_until
+
+
+async def open_window(seconds: int) -> float:
+    global _window_until
+    until = time.time() + seconds
+    await set_cached(PROFILING_WINDOW_KEY, until, ttl=seconds)
+    _window_until = until
+    return until
+
+
+async def close_window():
+    global _window_until
+    await invalidate_cache_keys([PROFILING_WINDOW_KEY])
+    _window_until = 0.0
+
+
+async def refresh_window():
+    """Pick up a window opened or closed through another worker."""
+    global _window_until
+    _window_until = float(await get_cached(PROFILING_WINDOW_KEY) or 0.0)
+
+
+async def poll_window():
+    while True:
+        await refresh_window()
+        await asyncio.sleep(WINDOW_POLL_INTERVAL)
+
+
+# -----------------------------
+# Capture and storage
+# -----------------------------
+def start_profiler() -> "Profiler":
+    from pyinstrument import Profiler
+
+    profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+async def save_profile(profile_id: str, profiler: "Profiler", meta: dict) -> bool:
+    session = profiler.stop()
+    meta = {**meta, "id": profile_id, "cpu_ms": round(session.cpu_time * 1000, 1)}
+    stored = await set_cached_hash(
+        profile_key(profile_id),
+        {"meta": json.dumps(meta), "session": json.dumps(session.to_json())},
+        ttl=PROFILE_TTL,
+    )
+    if stored:
+        await push_recent(PROFILE_INDEX_KEY, profile_id, PROFILE_INDEX_SIZE, ttl=PROFILE_TTL)
+    return stored
+
+
+async def list_profiles(limit: int = PROFILE_INDEX_SIZE) -> list:
+    ids = await get_recent(PROFILE_INDEX_KEY, limit)
+    entries = await get_many_cached_hashes([profile_key(i) for i in ids])
+    return [json.loads(entry["meta"]) for entry in entries if entry]
+
+
+def remove_waiting_frames(frame, options=None):
+    """Drop await and out-of-context time, leaving what ran on the CPU."""
+    from pyinstrument.frame import AWAIT_FRAME_IDENTIFIER, OUT_OF_CONTEXT_FRAME_IDENTIFIER
+
+    if frame is None:
+        return None
+    for child in list(frame.children):
+        if child.identifier in (AWAIT_FRAME_IDENTIFIER, OUT_OF_CONTEXT_FRAME_IDENTIFIER):
+            child.remove_from_parent()
+        else:
+            remove_waiting_frames(child, options)
+    return frame
+
+
+async def render_profile(profile_id: str, view: str = "wall", fmt: str = "speedscope") -> Optional[Tuple[str, str]]:
+    """(body, media type) of a stored profile, or None if it expired."""
+    from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+    from pyinstrument.session import Session
+
+    entry = (await get_many_cached_hashes([profile_key(profile_id)]))[0]
+    if not entry:
+        return None
+
+    session = Session.from_json(json.loads(entry["session"]))
+    renderer = HTMLRenderer() if fmt == "html" else SpeedscopeRenderer()
+    if view == "cpu":
+        renderer.processors.insert(0, remove_waiting_frames)
+    media_type = "text/html" if fmt == "html" else "application/json"
+    return renderer.render(session), media_type
@@ -1,10 +1,29 @@
 # app/utils/recaptcha.py
-from google.cloud import recaptchaenterprise_v1
-from google.cloud.recaptchaenterprise_v1 import Assessment
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from app.core.config import settings
+
+# The client library pulls in grpc and protobuf (~0.3s), so it is imported
+# on the first login or registration rather than on every cold start
+if TYPE_CHECKING:
+    from google.cloud.recaptchaenterprise_v1 import Assessment
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """One client per process: building it loads credentials and opens a gRPC channel."""
+    from google.cloud import recaptchaenterprise_v1
+
+    # Settings reads .env without exporting it; the client looks in os.environ
+    if settings.GOOGLE_APPLICATION_CREDENTIALS:
+        os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", settings.GOOGLE_APPLICATION_CREDENTIALS)
+    return recaptchaenterprise_v1.RecaptchaEnterpriseServiceClient()
+
 
 def create_assessment(
     project_id: str, recaptcha_key: str, token: str, recaptcha_action: str
-) -> Assessment:
+) -> "Assessment":
     """Create an assessment to analyze the risk of a UI action.
     Args:
         project_id: Your Google Cloud Project ID.
@@ -13,7 +32,9 @@ def create_assessment(
         recaptcha_action: Action name corresponding to the token.
     """
 
-    client = recaptchaenterprise_v1.RecaptchaEnterpriseServiceClient()
+    from google.cloud import recaptchaenterprise_v1
+
+    client = get_client()
 
     # Set the properties of the event to be tracked.
     event = recaptchaenterprise_v1.Event()
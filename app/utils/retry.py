@@ -0,0 +1,253 @@
+# app/utils/retry.py
+"""
+Retries and hedging for idempotent upstream reads.
+
+A read that fails with a transport error or an overload answer (429,
+502-504) is retried after an exponential backoff with full jitter, as
+long as the request's deadline leaves time for it and the upstream's
+retry budget allows: retries may add at most RETRY_RATIO of the traffic
+(plus a small floor), so an upstream that is down gets a trickle of
+retries rather than three times its load.
+
+A hedged read sends a second copy once the first has taken longer than
+the endpoint's recent p95 and keeps whichever answers first. That cuts
+the tail left by a slow PHP worker at the cost of about 5% extra
+requests, which also come out of the retry budget. When the hedge wins,
+the first copy is left to finish (WooCommerce is doing the work either
+way) and the difference is recorded in upstream_hedge_saved_seconds.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import httpx
+from app.core.config import settings
+from app.utils.deadline import remaining
+from app.utils.metrics import UPSTREAM_RETRIES, UPSTREAM_RETRY_BUDGET_EXHAUSTED, UPSTREAM_HEDGES, UPSTREAM_HEDGE_SAVED
+from app.utils.scheduler import QueueTimeout
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+BACKOFF_BASE = 0.05  # seconds; attempt n sleeps up to BACKOFF_BASE * 2**n
+BACKOFF_CAP = 1.0
+
+# Retries and hedges may add this share of the traffic, plus a floor per second
+RETRY_RATIO = 0.1
+RETRY_FLOOR_PER_SECOND = 2.0
+RETRY_BUDGET_CAP = 20.0
+
+HEDGE_QUANTILE = 0.95
+LATENCY_SAMPLES = 256  # recent latencies kept per endpoint
+MIN_LATENCY_SAMPLES = 32  # no hedging until the p95 means something
+QUANTILE_REFRESH = 16  # recompute the p95 every this many samples
+
+
+class ReadPolicy:
+    """How hard to try for one endpoint's reads."""
+
+    __slots__ = ("retries", "hedge")
+
+    def __init__(self, retries: int = 2, hedge: bool = False):
+        self.retries = retries
+        self.hedge = hedge
+
+
+# WooCommerce endpoint templates (numeric segments as {id}), first prefix
+# match wins. Catalog reads are cheap and shared, so they hedge; order
+# queries are per customer and heavy, so a hedge would only double the load
+READ_POLICIES: Tuple[Tuple[str, ReadPolicy], ...] = (
+    ("products/reviews", ReadPolicy(retries=2, hedge=True)),
+    ("products/categories", ReadPolicy(retries=2, hedge=True)),
+    ("products/tags", ReadPolicy(retries=2, hedge=True)),
+    ("products", ReadPolicy(retries=2, hedge=True)),
+    ("orders", ReadPolicy(retries=2, hedge=False)),
+    ("customers", ReadPolicy(retries=1, hedge=False)),
+    ("coupons", ReadPolicy(retries=2, hedge=False)),
+)
+DEFAULT_POLICY = ReadPolicy(retries=1, hedge=False)
+
+
+def policy_for(endpoint: str) -> ReadPolicy:
+    for prefix, policy in READ_POLICIES:
+        if endpoint.startswith(prefix):
+            return policy
+    return DEFAULT_POLICY
+
+
+class RetryBudget:
+    """
+    Token bucket for extra attempts: every first attempt adds RETRY_RATIO of
+    a token, time adds RETRY_FLOOR_PER_SECOND, and each retry or hedge
+    spends one.
+    """
+
+    def __init__(self):
+        self.tokens = RETRY_BUDGET_CAP
+        self.updated = time.monotonic()
+
+    def deposit(self):
+        now = time.monotonic()
+        self.tokens = min(RETRY_BUDGET_CAP, self.tokens + RETRY_RATIO + (now - self.updated) * RETRY_FLOOR_PER_SECOND)
+        self.updated = now
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Recent latencies for one endpoint and their (periodically refreshed) p95."""
+
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self.added = 0
+        self.cached: Optional[float] = None
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.added += 1
+        if self.added % QUANTILE_REFRESH == 0:
+            self.cached = None
+
+    def quantile(self, q: float = HEDGE_QUANTILE) -> Optional[float]:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        if self.cached is None:
+            ordered = sorted(self.samples)
+            self.cached = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return self.cached
+
+
+_budgets: Dict[str, RetryBudget] = {}
+_latencies: Dict[Tuple[str, str], LatencyTracker] = {}
+
+
+def retry_budget(dependency: str) -> RetryBudget:
+    budget = _budgets.get(dependency)
+    if budget is None:
+        budget = _budgets[dependency] = RetryBudget()
+    return budget
+
+
+def latency_tracker(dependency: str, endpoint: str) -> LatencyTracker:
+    tracker = _latencies.get((dependency, endpoint))
+    if tracker is None:
+        tracker = _latencies[(dependency, endpoint)] = LatencyTracker()
+    return tracker
+
+
+def backoff(attempt: int) -> float:
+    """Full jitter: anywhere between 0 and the exponential step."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def is_retryable(response: Optional[httpx.Response], error: Optional[Exception]) -> bool:
+    if error is not None:
+        # A queue timeout is our own overload, not the upstream's
+        return isinstance(error, httpx.TransportError) and not isinstance(error, QueueTimeout)
+    return response.status_code in RETRY_STATUSES
+
+
+async def idempotent_read(
+    send: Callable[[], Awaitable[httpx.Response]],
+    dependency: str,
+    endpoint: str,
+) -> httpx.Response:
+    """
+    Run `send` (one GET, body read) under the endpoint's policy: hedged if
+    it says so, and retried on transport errors and overload answers.
+    """
+    policy = policy_for(endpoint)
+    budget = retry_budget(dependency)
+    budget.deposit()
+    hedge = policy.hedge and settings.UPSTREAM_HEDGING
+
+    attempt = 0
+    while True:
+        response, error = None, None
+        try:
+            response = await (hedged(send, dependency, endpoint, budget) if hedge else send())
+        except httpx.RequestError as e:
+            error = e
+        if not is_retryable(response, error):
+            return response
+
+        reason = type(error).__name__ if error is not None else str(response.status_code)
+        delay = backoff(attempt)
+        left = remaining()
+        if attempt >= policy.retries or (left is not None and delay >= left):
+            break
+        if not budget.withdraw():
+            UPSTREAM_RETRY_BUDGET_EXHAUSTED.labels(dependency).inc()
+            break
+        UPSTREAM_RETRIES.labels(dependency, endpoint, reason).inc()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    if error is not None:
+        raise error
+    return response
+
+
+async def hedged(
+    send: Callable[[], Awaitable[httpx.Response]],
+    dependency: str,
+    endpoint: str,
+    budget: RetryBudget,
+) -> httpx.Response:
+    tracker = latency_tracker(dependency, endpoint)
+    delay = tracker.quantile()
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(send())
+
+    if delay is not None:
+        try:
+            await asyncio.wait({primary}, timeout=delay)
+        except BaseException:
+            primary.cancel()
+            raise
+    if primary.done() or delay is None or not budget.withdraw():
+        response = await primary
+        tracker.add(time.perf_counter() - started)
+        return response
+
+    backup = asyncio.ensure_future(send())
+    try:
+        done, _ = await asyncio.wait({primary, backup}, return_when=asyncio.FIRST_COMPLETED)
+        winner = primary if primary in done else backup
+        if winner.exception() is not None:
+            # That copy failed fast; the other one may still answer
+            other = backup if winner is primary else primary
+            await asyncio.wait({other})
+            if other.exception() is None:
+                winner = other
+    except BaseException:
+        primary.cancel()
+        backup.cancel()
+        raise
+
+    # The tracker learns the first copy's latency, never the hedged one: fed
+    # the faster of two copies, its p95 (and so the hedge delay) would creep down
+    elapsed = time.perf_counter() - started
+    if winner is primary:
+        backup.cancel()
+        UPSTREAM_HEDGES.labels(dependency, endpoint, "lost").inc()
+        tracker.add(elapsed)
+    else:
+        UPSTREAM_HEDGES.labels(dependency, endpoint, "won").inc()
+        primary.add_done_callback(lambda task: record_saving(task, started, elapsed, tracker, dependency, endpoint))
+    return winner.result()
+
+
+def record_saving(
+    primary: asyncio.Task, started: float, hedged_elapsed: float, tracker: LatencyTracker, dependency: str, endpoint: str
+):
+    """Once the abandoned first copy finishes, record its latency and how much later it would have answered."""
+    if primary.cancelled() or primary.exception():
+        return
+    latency = time.perf_counter() - started
+    tracker.add(latency)
+    UPSTREAM_HEDGE_SAVED.labels(dependency, endpoint).observe(max(0.0, latency - hedged_elapsed))
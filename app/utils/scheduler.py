@@ -0,0 +1,284 @@
+# app/utils/scheduler.py
+"""
+Priority scheduling for upstream calls.
+
+Every call to an upstream takes one of its slots, as many as the adaptive
+limit currently allows (see limiter.py). When they are all busy, callers
+queue by priority class and freed slots go out by weighted fair queuing:
+each class gets a share of the slots in proportion to its weight, so a burst of catalog reads can't starve payment work, but
+browsing still makes progress while payments are queued. A caller that
+waits longer than its class's queue timeout gives up with QueueTimeout.
+
+The class comes from the surrounding context (`upstream_priority`), so a
+service marks its whole call tree at once; calls outside any such block
+fall back to a class chosen from the request (`default_priority`).
+
+Slots are taken in the HTTP transport of instrumented clients, so every
+call to a host goes through its scheduler, fan-outs included: an
+`asyncio.gather` over a hundred products queues behind the limit instead
+of opening a hundred connections.
+"""
+import asyncio
+import re
+import ssl
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+import httpx
+from app.core.config import settings
+from app.utils.limiter import AdaptiveLimit
+from app.utils.deadline import budget
+from app.utils.metrics import (
+    UPSTREAM_QUEUE_DEPTH, UPSTREAM_QUEUE_WAIT, UPSTREAM_QUEUE_TIMEOUTS, UPSTREAM_ACTIVE, UPSTREAM_CONCURRENCY_LIMIT,
+)
+
+# Highest priority first
+PRIORITIES = ("payment", "account", "browse", "background")
+
+WEIGHTS = {"payment": 8, "account": 4, "browse": 2, "background": 1}
+
+# Seconds a call may wait for a slot. Browse gives up first: its clients
+# retry, and an answer after several seconds is worth little anyway
+QUEUE_TIMEOUTS = {"payment": 15.0, "account": 5.0, "browse": 2.0, "background": 10.0}
+
+
+# Most calls the limit may grow to, per upstream and worker
+MAX_CONCURRENCY = {"woocommerce": settings.WC_MAX_CONCURRENCY, "wordpress": settings.WP_MAX_CONCURRENCY}
+
+# Answers that mean the upstream is overloaded rather than the request bad
+OVERLOAD_STATUSES = {429, 502, 503, 504}
+
+# WooCommerce endpoints that serve one customer's own data rather than the catalog
+ACCOUNT_PATHS = re.compile(r"/(orders|customers)(/|$)")
+
+
+class QueueTimeout(httpx.PoolTimeout):
+    """
+    No upstream slot came free within the class's queue timeout. A pool
+    timeout, so callers handling httpx errors already treat it as one.
+    """
+
+
+_priority: ContextVar[Optional[str]] = ContextVar("upstream_priority", default=None)
+
+
+def current_priority() -> Optional[str]:
+    return _priority.get()
+
+
+@contextmanager
+def upstream_priority(priority: str) -> Iterator[None]:
+    """Run the block's upstream calls, and tasks started from it, in `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def with_upstream_priority(priority: str):
+    """upstream_priority() around a whole coroutine function, e.g. a route handler."""
+    def decorate(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with upstream_priority(priority):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class UpstreamScheduler:
+    """
+    A concurrency budget for one upstream with start-time fair queuing.
+
+    A queued call is tagged with a virtual finish time: its class's previous
+    tag (or the scheduler's virtual clock, if the class was idle) plus
+    1/weight. Freed slots go to the lowest tag, so over a busy stretch the
+    classes are served in proportion to their weights.
+    """
+
+    def __init__(self, name: str, limiter: AdaptiveLimit, weights: Dict[str, float] = WEIGHTS, timeouts: Dict[str, float] = QUEUE_TIMEOUTS):
+        self.name = name
+        self.limiter = limiter
+        self.weights = weights
+        self.timeouts = timeouts
+        self.active = 0
+        self.queues = {priority: deque() for priority in weights}
+        self.finish = {priority: 0.0 for priority in weights}
+        self.virtual = 0.0
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def limit(self) -> int:
+        return self.limiter.current()
+
+    async def acquire(self, priority: str):
+        if self.active < self.limit() and not self.queued():
+            self._take()
+            return
+
+        # Before queuing: a request already out of time must not leave an entry behind
+        timeout = budget(self.timeouts[priority])
+        tag = max(self.finish[priority], self.virtual) + 1 / self.weights[priority]
+        self.finish[priority] = tag
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (tag, waiter)
+        self.queues[priority].append(entry)
+        UPSTREAM_QUEUE_DEPTH.labels(self.name, priority).inc()
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # Handed a slot as the timeout fired
+            self._forget(priority, entry)
+            UPSTREAM_QUEUE_TIMEOUTS.labels(self.name, priority).inc()
+            raise QueueTimeout(f"{self.name}: no slot within {timeout:.1f}s ({priority})")
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the caller went away
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._forget(priority, entry)
+            raise
+        finally:
+            UPSTREAM_QUEUE_WAIT.labels(self.name, priority).observe(time.perf_counter() - started)
+
+    def release(self, rtt: Optional[float] = None, dropped: bool = False):
+        """Free a slot, feeding the call's latency to the limit if it got an answer."""
+        if rtt is not None or dropped:
+            self.limiter.update(rtt or 0.0, self.active, dropped)
+            UPSTREAM_CONCURRENCY_LIMIT.labels(self.name).set(self.limit())
+        self.active -= 1
+        UPSTREAM_ACTIVE.labels(self.name).dec()
+        self._dispatch()
+
+    def _take(self):
+        self.active += 1
+        UPSTREAM_ACTIVE.labels(self.name).inc()
+
+    def _forget(self, priority: str, entry):
+        try:
+            self.queues[priority].remove(entry)
+        except ValueError:
+            return  # Already dispatched
+        UPSTREAM_QUEUE_DEPTH.labels(self.name, priority).dec()
+
+    def _dispatch(self):
+        while self.active < self.limit():
+            heads = [(queue[0][0], priority) for priority, queue in self.queues.items() if queue]
+            if not heads:
+                return
+            tag, priority = min(heads)
+            _, waiter = self.queues[priority].popleft()
+            UPSTREAM_QUEUE_DEPTH.labels(self.name, priority).dec()
+            if waiter.done():
+                continue  # Timed out or cancelled while queued
+            self.virtual = tag
+            self._take()
+            waiter.set_result(None)
+
+
+_schedulers: Dict[str, UpstreamScheduler] = {}
+
+
+def get_scheduler(upstream: str) -> UpstreamScheduler:
+    scheduler = _schedulers.get(upstream)
+    if scheduler is None:
+        limiter = AdaptiveLimit(maximum=MAX_CONCURRENCY.get(upstream, settings.WP_MAX_CONCURRENCY))
+        scheduler = _schedulers[upstream] = UpstreamScheduler(upstream, limiter)
+        UPSTREAM_CONCURRENCY_LIMIT.labels(upstream).set(scheduler.limit())
+    return scheduler
+
+
+def default_priority(upstream: str, request: httpx.Request) -> str:
+    """
+    Class for calls made outside upstream_priority(): catalog reads are
+    browse, WooCommerce writes and customer data are account, and so is all
+    of WordPress (logins, profiles, favorites).
+    """
+    if upstream != "woocommerce":
+        return "account"
+    if request.method != "GET" or ACCOUNT_PATHS.search(request.url.path):
+        return "account"
+    return "browse"
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """A response body that frees the call's slot once it has been read or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.release:
+                release, self.release = self.release, None
+                release()
+
+
+@lru_cache(maxsize=None)
+def ssl_context() -> ssl.SSLContext:
+    """One SSL context for all clients: loading the CA bundle takes ~20ms of CPU."""
+    return httpx.create_ssl_context()
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """An httpx transport that takes a slot from the upstream's scheduler per request."""
+
+    def __init__(self, upstream: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.upstream = upstream
+        self.scheduler = get_scheduler(upstream)
+        self.transport = transport or httpx.AsyncHTTPTransport(verify=ssl_context())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scheduler = self.scheduler
+        await scheduler.acquire(current_priority() or default_priority(self.upstream, request))
+        # Cut the timeouts down to what the request has left once it holds a
+        # slot, so the time spent queuing comes out of the budget, not on top
+        timeouts = request.extensions.get("timeout", {})
+        try:
+            budgeted = {phase: budget(seconds) for phase, seconds in timeouts.items()}
+        except BaseException:
+            scheduler.release()
+            raise
+        request.extensions["timeout"] = budgeted
+        # A timeout that fired early because the client allowed little time
+        # says nothing about the upstream, and isn't fed to its limit
+        shortened = budgeted != timeouts
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TimeoutException:
+            scheduler.release(dropped=not shortened)
+            raise
+        except httpx.TransportError:
+            scheduler.release(dropped=True)
+            raise
+        except BaseException:
+            scheduler.release()
+            raise
+
+        rtt = time.perf_counter() - started
+        dropped = response.status_code in OVERLOAD_STATUSES
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=ReleasingStream(response.stream, lambda: scheduler.release(rtt, dropped)),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,17 @@
+# app/utils/streaming.py
+import json
+from typing import Any, AsyncIterator
+from fastapi import Request
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request, stream: bool = False) -> bool:
+    """NDJSON is asked for with ?stream=1 or an Accept: application/x-ndjson header."""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def ndjson_lines(items: AsyncIterator[Any]) -> AsyncIterator[str]:
+    """One JSON document per line, written as soon as each item is produced."""
+    async for item in items:
+        yield json.dumps(item, default=str) + "\n"
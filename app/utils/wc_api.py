@@ -3,6 +3,10 @@ import httpx
 from typing import Optional, Dict, List, Any
 from fastapi import HTTPException
 from app.core.config import settings
+from app.utils.instrumentation import instrumented_client
+from app.utils.metrics import endpoint_template
+from app.utils.retry import idempotent_read
+from app.utils.scheduler import QueueTimeout
 
 class WooCommerceAPI:
     def __init__(self):
@@ -10,43 +14,65 @@ class WooCommerceAPI:
         self.auth = (settings.WC_CONSUMER_KEY, settings.WC_CONSUMER_SECRET)
         self.timeout = 30.0
     
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with instrumented_client("woocommerce") as client:
+            return await client.request(
+                method,
+                url,
+                auth=self.auth,
+                timeout=self.timeout,
+                **kwargs
+            )
+
     async def _request(self, method: str, endpoint: str, return_headers: bool = False, **kwargs) -> Any:
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.request(
-                    method,
-                    url,
-                    auth=self.auth,
-                    timeout=self.timeout,
-                    **kwargs
-                )
-                response.raise_for_status()
-                if return_headers:
-                    return response.json(), response.headers
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise HTTPException(
-                    status_code=e.response.status_code,
-                    detail=f"WooCommerce API error: {e.response.text}"
-                )
-            except httpx.RequestError as e:
-                raise HTTPException(
-                    status_code=503,
-                    detail=f"WooCommerce connection error: {str(e)}"
+        try:
+            if method == "GET":
+                # Reads are idempotent: retried and, for catalog endpoints, hedged
+                response = await idempotent_read(
+                    lambda: self._send(method, url, **kwargs),
+                    "woocommerce",
+                    endpoint_template(f"/{endpoint}"),
                 )
+            else:
+                response = await self._send(method, url, **kwargs)
+            response.raise_for_status()
+            if return_headers:
+                return response.json(), response.headers
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=e.response.status_code,
+                detail=f"WooCommerce API error: {e.response.text}"
+            )
+        except QueueTimeout:
+            raise HTTPException(
+                status_code=503,
+                detail="WooCommerce is busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"WooCommerce connection error: {str(e)}"
+            )
     
     async def get_products(self, params: Optional[Dict] = None) -> List[Dict]:
         return await self._request("GET", "products", params=params)
     
-    async def get_product(self, slug: str) -> Dict:
-        products = await self._request("GET", "products", params={"slug": slug})
+    async def get_product(self, slug: str, fields: Optional[str] = None) -> Dict:
+        params = {"slug": slug}
+        if fields:
+            params["_fields"] = fields
+        products = await self._request("GET", "products", params=params)
         if not products:
             raise HTTPException(status_code=404, detail=f"Product with slug '{slug}' not found")
         return products[0]  # Return the first product from the list
 
-    async def list_orders(self, customer_id: int, page: int, per_page: int) -> Dict:
+    async def list_orders(self, customer_id: int, page: int, per_page: int, fields: Optional[str] = None) -> Dict:
         params = {"customer": customer_id, "page": page, "per_page": per_page}
+        if fields:
+            params["_fields"] = fields
         data, headers = await self._request("GET", "orders", params=params, return_headers=True)
 
         # Extract pagination info from headers
@@ -104,5 +130,31 @@ class WooCommerceAPI:
         params["page"] = page 
         return await self._request("GET", "products/reviews", params=params)
 
+    async def list_reviews(self, product_id: int, page: int, per_page: int) -> Dict:
+        """Page of reviews for a product, with pagination info from the headers"""
+        params = {"product": product_id, "page": page, "per_page": per_page}
+        data, headers = await self._request("GET", "products/reviews", params=params, return_headers=True)
+
+        return {
+            "data": data,
+            "total": int(headers.get("X-WP-Total", 0)),
+            "total_pages": int(headers.get("X-WP-TotalPages", 0)),
+            "current_page": page,
+            "per_page": per_page
+        }
+
+    async def list_coupons(self, page: int, per_page: int, fields: Optional[str] = None) -> Dict:
+        """Page of coupons, with pagination info from the headers"""
+        params = {"page": page, "per_page": per_page}
+        if fields:
+            params["_fields"] = fields
+        data, headers = await self._request("GET", "coupons", params=params, return_headers=True)
+
+        return {
+            "data": data,
+            "total": int(headers.get("X-WP-Total", 0)),
+            "total_pages": int(headers.get("X-WP-TotalPages", 0)),
+        }
+
 # Singleton instance
 wc_api = WooCommerceAPI()
\ No newline at end of file
@@ -1,28 +1,30 @@
 # app/webhook/stripe.py
 from fastapi import APIRouter, Request, HTTPException
-from app.services.stripe import create_stripe_connect_payout_intent, handle_successful_payment
+from app.core.config import settings
+from app.services.stripe import create_stripe_connect_payout_intent, handle_successful_payment, get_stripe
 from app.utils.wc_api import wc_api
-import stripe
-import os
+from app.utils.scheduler import with_upstream_priority
+from app.utils.deadline import lift_deadline
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-endpoint_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
-
+# Order completion and payouts go ahead of catalog traffic to WooCommerce
 @router.post("/webhook/stripe")
+@with_upstream_priority("payment")
 async def stripe_webhook(request: Request):
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
+    stripe = get_stripe()
 
     try:
         # Verify the webhook signature
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
         
         # Only process successful payments
         if event["type"] == "payment_intent.succeeded":
+            lift_deadline()  # Completion, cache clearing and payouts run to the end
             payment_intent = event["data"]["object"]
             
             # Extract metadata we saved during PaymentIntent creation
@@ -0,0 +1,70 @@
+# app/webhooks/woocommerce.py
+from fastapi import APIRouter, Request, HTTPException
+from app.core.config import settings
+from app.services.pricing import invalidate_coupon_table
+from app.services.products import invalidate_missing_product, invalidate_product_caches
+from app.services.reviews import invalidate_product_reviews, record_rating
+import base64
+import hashlib
+import hmac
+import json
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+PRODUCT_TOPICS = {"product.created", "product.updated", "product.deleted", "product.restored"}
+COUPON_TOPICS = {"coupon.created", "coupon.updated", "coupon.deleted", "coupon.restored"}
+# Review webhooks are set up in WordPress with these custom topics and the
+# REST product review object as payload
+REVIEW_CREATED_TOPIC = "product_review.created"
+REVIEW_CHANGED_TOPICS = {"product_review.updated", "product_review.deleted"}
+
+
+def verify_signature(payload: bytes, signature: str) -> bool:
+    """WooCommerce signs the raw body with HMAC-SHA256 and sends it base64 encoded."""
+    if not settings.WC_WEBHOOK_SECRET or not signature:
+        return False
+    digest = hmac.new(settings.WC_WEBHOOK_SECRET.encode(), payload, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature)
+
+
+@router.post("/webhook/woocommerce")
+async def woocommerce_webhook(request: Request):
+    payload = await request.body()
+    topic = request.headers.get("x-wc-webhook-topic")
+
+    # WooCommerce sends an unsigned form-encoded ping when a webhook is saved
+    if not topic:
+        return {"status": "ping"}
+
+    if not verify_signature(payload, request.headers.get("x-wc-webhook-signature")):
+        logger.error("❌ Invalid WooCommerce webhook signature")
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+
+    if topic in PRODUCT_TOPICS:
+        await invalidate_missing_product(data)
+        await invalidate_product_caches(data)
+        logger.info(f"🧹 Product caches cleared for product {data.get('id')} ({topic})")
+
+    elif topic in COUPON_TOPICS:
+        await invalidate_coupon_table()
+        logger.info(f"🧹 Coupon table cleared ({topic})")
+
+    elif topic == REVIEW_CREATED_TOPIC and data.get("product_id"):
+        await invalidate_product_reviews(data["product_id"])
+        if data.get("status", "approved") == "approved":
+            await record_rating(data["product_id"], data.get("rating"), data.get("id"))
+        logger.info(f"⭐ Review {data.get('id')} recorded for product {data['product_id']}")
+
+    elif topic in REVIEW_CHANGED_TOPICS and data.get("product_id"):
+        # The old rating isn't known, so the summary is rebuilt on next read
+        await invalidate_product_reviews(data["product_id"], drop_summary=True)
+        logger.info(f"🧹 Review caches cleared for product {data['product_id']} ({topic})")
+
+    return {"status": "success"}
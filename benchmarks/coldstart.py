@@ -0,0 +1,166 @@
+# benchmarks/coldstart.py
+"""
+Measure cold starts: importing the app and serving a first request.
+
+    python -m benchmarks.coldstart                      # 5 cold starts
+    python -m benchmarks.coldstart -n 10 --budget-ms 1500
+    python -m benchmarks.coldstart --skip-server        # the CI check
+
+Every run is a fresh interpreter, as a serverless cold start is:
+
+- import: a child process imports app.main and reports how long that took
+  and which heavy SDKs it loaded. Those (stripe, reCAPTCHA's gRPC client,
+  passlib, pyinstrument) are imported on first use; any of them loaded at
+  import fails the check.
+- first request: uvicorn is started on app.main:app and GET / is polled;
+  reported is the time from spawning the process to the first response,
+  interpreter startup and lifespan included.
+
+Settings point at the same local stand-ins as benchmarks.run, though
+nothing is called: / touches no upstream, and a missing Redis only logs
+at startup. Medians are reported, and the exit status is 1 when a lazy
+module was loaded at import, so CI catches a new module-level import of an
+SDK whatever machine it runs on. Wall-clock time depends on the machine
+(the median import measured ~900-1000 ms with the SDKs lazy, ~2000 ms
+before), so a time budget is only enforced when given with --budget-ms.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.run import configure_environment
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must not be loaded by importing the app
+LAZY_MODULES = ("stripe", "google.cloud.recaptchaenterprise_v1", "grpc", "passlib", "pyinstrument")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+FIRST_REQUEST_TIMEOUT = 30.0
+POLL_INTERVAL = 0.005
+
+
+def child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # Cold starts run from compiled bytecode
+    return env
+
+
+def measure_import(env: Dict[str, str]) -> Dict:
+    """Seconds to import app.main in a fresh interpreter, and the lazy modules it loaded anyway."""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=env, cwd=ROOT, capture_output=True, text=True, check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing app.main failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(env: Dict[str, str]) -> float:
+    """Seconds from spawning uvicorn to the first answer to GET /."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "error"],
+        env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - started < FIRST_REQUEST_TIMEOUT:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode}:\n{process.stderr.read().decode()}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+                return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(POLL_INTERVAL)
+        raise RuntimeError(f"No answer from {url} within {FIRST_REQUEST_TIMEOUT:.0f}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize(values: List[float]) -> str:
+    ms = sorted(value * 1000 for value in values)
+    return f"median {statistics.median(ms):7.1f} ms   min {ms[0]:7.1f} ms   max {ms[-1]:7.1f} ms"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--budget-ms", type=float, help="Also fail if the median import time exceeds this")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure the import")
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    return parser.parse_args(argv)
+
+
+def main(args) -> int:
+    configure_environment("http://127.0.0.1:9")
+    env = child_env()
+    # One unmeasured import writes the bytecode caches a deployment ships with
+    measure_import(env)
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    import_seconds = [run["seconds"] for run in imports]
+    loaded = sorted({module for run in imports for module in run["loaded"]})
+    print(f"import app.main     {summarize(import_seconds)}")
+
+    first_request = []
+    if not args.skip_server:
+        first_request = [measure_first_request(env) for _ in range(args.runs)]
+        print(f"first request       {summarize(first_request)}")
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "runs": args.runs,
+            "import_seconds": import_seconds,
+            "first_request_seconds": first_request,
+            "eagerly_loaded": loaded,
+        }, indent=2))
+
+    failed = False
+    if loaded:
+        print(f"\nLoaded at import, should be lazy: {', '.join(loaded)}")
+        failed = True
+    else:
+        print("\nNo lazy module loaded at import")
+    median_ms = statistics.median(import_seconds) * 1000
+    if args.budget_ms is not None:
+        if median_ms > args.budget_ms:
+            print(f"Import time {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+            failed = True
+        else:
+            print(f"Import time within the {args.budget_ms:.0f} ms budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
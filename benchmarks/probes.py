@@ -0,0 +1,105 @@
+# benchmarks/probes.py
+"""
+Per-request counters for upstream calls and Redis round trips.
+
+The driver calls the app in-process, so a context variable set before each
+request is visible to everything the app does for it, including tasks it
+spawns. The probes wrap the client libraries at the point where a request
+leaves the process: httpx sends, Redis commands and pipeline executions,
+and the Stripe and reCAPTCHA SDK calls.
+"""
+import time
+from collections import Counter
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Optional
+
+import httpx
+from redis.asyncio.client import Pipeline, Redis
+
+current: ContextVar[Optional[Counter]] = ContextVar("bench_counts", default=None)
+
+
+def count(name: str, n: int = 1):
+    counts = current.get()
+    if counts is not None:
+        counts[name] += n
+
+
+def upstream_name(url: httpx.URL) -> str:
+    path = url.path
+    if path.startswith("/wp-json/wc/"):
+        return "woocommerce"
+    if path.startswith("/wp-json/"):
+        return "wordpress"
+    return "other"
+
+
+def install_http_probe(upstream_url: str):
+    original_send = httpx.AsyncClient.send
+
+    async def send(self, request, *args, **kwargs):
+        if str(request.url).startswith(upstream_url):
+            count("upstream")
+            count(f"upstream:{upstream_name(request.url)}")
+        return await original_send(self, request, *args, **kwargs)
+
+    httpx.AsyncClient.send = send
+
+
+def install_redis_probe():
+    # A pipeline buffers its commands and sends them in one round trip on
+    # execute(), so only direct commands and executes are counted
+    original_execute_command = Redis.execute_command
+    original_pipeline_execute = Pipeline.execute
+
+    async def execute_command(self, *args, **options):
+        count("redis")
+        return await original_execute_command(self, *args, **options)
+
+    async def pipeline_execute(self, *args, **kwargs):
+        count("redis")
+        return await original_pipeline_execute(self, *args, **kwargs)
+
+    Redis.execute_command = execute_command
+    Pipeline.execute = pipeline_execute
+
+
+def install_stripe_probe(stripe_url: str):
+    """
+    Point the Stripe SDK at the fake upstream. Its calls run on executor
+    threads, which don't inherit the request context, so they are counted
+    where the app hands them off.
+    """
+    import stripe
+    import app.services.orders as orders
+
+    stripe.api_base = stripe_url
+    original = orders.create_stripe_payment_intent
+
+    async def create_stripe_payment_intent(*args, **kwargs):
+        count("upstream")
+        count("upstream:stripe")
+        return await original(*args, **kwargs)
+
+    orders.create_stripe_payment_intent = create_stripe_payment_intent
+
+
+def install_recaptcha_stand_in(latency):
+    """
+    reCAPTCHA Enterprise is a gRPC client, so instead of a fake server the
+    assessment call itself is replaced. It blocks for the configured latency,
+    the way the real synchronous client blocks the event loop.
+    """
+    import app.services.auth as auth
+
+    def create_assessment(project_id, recaptcha_key, token, recaptcha_action):
+        count("upstream")
+        count("upstream:recaptcha")
+        time.sleep(latency.sample())
+        return SimpleNamespace(
+            token_properties=SimpleNamespace(valid=True, action=recaptcha_action),
+            risk_analysis=SimpleNamespace(score=0.9, reasons=[]),
+        )
+
+    auth.create_assessment = create_assessment
@@ -0,0 +1,327 @@
+# benchmarks/run.py
+"""
+Benchmark the API against local stand-ins for its upstreams.
+
+    python -m benchmarks.run                              # every scenario
+    python -m benchmarks.run -s anonymous_browse -c 50 -d 30
+    python -m benchmarks.run --compare                     # against baseline.json
+    python -m benchmarks.run --save-baseline
+
+The app is driven in-process through httpx's ASGI transport by a pool of
+closed-loop clients. WooCommerce, WordPress and Stripe are served by
+benchmarks.upstreams on a local port and reCAPTCHA is replaced by a
+blocking stand-in. Redis is the one configured by REDIS_HOST/REDIS_PORT;
+use a scratch instance, since the benchmark writes cache keys into it.
+--redis fake uses fakeredis instead (round trips are still counted, but
+their latency is not representative).
+
+Each scenario gets a warmup, then is measured for --duration seconds. The
+report lists per endpoint: requests, throughput, p50/p95/p99 latency, error
+count, and upstream calls and Redis round trips per request.
+
+Results record the commit they were measured at. --compare refuses a
+baseline run with different settings (Redis, concurrency, latencies...),
+whose numbers aren't comparable; re-record it with --save-baseline.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.upstreams import FIXTURES_DIR, Dataset, FakeUpstreams, Latency, UpstreamServer
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# Environment entries that must match for two runs to be compared
+COMPARABLE_SETTINGS = ("redis", "concurrency", "duration", "products", "description_bytes", "latency_ms")
+
+JWT_SECRET = "bench-jwt-secret"
+WEBHOOK_SECRET = "bench-webhook-secret"
+
+
+def configure_environment(upstream_url: str):
+    """Point every setting at the fake upstreams before the app is imported."""
+    os.environ.update({
+        "WC_API_URL": f"{upstream_url}/wp-json/wc/v3",
+        "WC_CONSUMER_KEY": "ck_bench",
+        "WC_CONSUMER_SECRET": "cs_bench",
+        "WC_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "WP_URL": upstream_url,
+        "JWT_SECRET": JWT_SECRET,
+        "WP_ADMIN_USER": "bench",
+        "WP_ADMIN_PASS": "bench",
+        "REDIRECT_URL": "http://localhost",
+        "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_WEBHOOK_SECRET": "whsec_bench",
+        "GOOGLE_APPLICATION_CREDENTIALS": "",
+        "RECAPTCHA_PROJECT_ID": "bench",
+        "RECAPTCHA_SITE_KEY": "bench",
+        "CORS_ORIGINS": '["http://localhost"]',
+    })
+    os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+    os.environ.setdefault("REDIS_PORT", "6379")
+
+
+def use_fake_redis():
+    """Swap the app's Redis clients for fakeredis ones sharing one server."""
+    import fakeredis
+    import app.utils.cache as cache
+
+    server = fakeredis.FakeServer()
+    replacements = {
+        id(cache.redis): fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+        id(cache.binary_redis): fakeredis.FakeAsyncRedis(server=server),
+    }
+    # Modules that imported the clients by name hold their own reference
+    for module in list(sys.modules.values()):
+        if not getattr(module, "__name__", "").startswith("app."):
+            continue
+        for name in ("redis", "binary_redis"):
+            if id(getattr(module, name, None)) in replacements:
+                setattr(module, name, replacements[id(getattr(module, name))])
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """Latencies and counters per endpoint label."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.counts: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+
+    def add(self, label: str, seconds: float, status: int, counts: Counter):
+        self.latencies[label].append(seconds)
+        self.counts[label].update(counts)
+        if status >= 400:
+            self.errors[label] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        result = {}
+        for label, values in sorted(self.latencies.items()):
+            n = len(values)
+            counts = self.counts[label]
+            result[label] = {
+                "requests": n,
+                "rps": round(n / elapsed, 1),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "errors": self.errors[label],
+                "upstream_per_request": round(counts["upstream"] / n, 2),
+                "redis_per_request": round(counts["redis"] / n, 2),
+                "upstream_breakdown": {
+                    name.split(":", 1)[1]: round(value / n, 2)
+                    for name, value in sorted(counts.items()) if name.startswith("upstream:")
+                },
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        result["_total"] = {"requests": total, "rps": round(total / elapsed, 1)}
+        return result
+
+
+async def run_scenario(app, ctx, actions, concurrency: int, warmup: float, duration: float) -> Dict:
+    import httpx
+    from benchmarks import probes
+    from benchmarks.scenarios import pick
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    stop_at = measure_from + duration
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def worker():
+            while loop.time() < stop_at:
+                for spec in pick(ctx, actions):
+                    spec = dict(spec)
+                    label = spec.pop("label")
+                    counts = Counter()
+                    token = probes.current.set(counts)
+                    started = time.perf_counter()
+                    try:
+                        response = await client.request(spec.pop("method"), spec.pop("url"), **spec)
+                        await response.aread()
+                        status = response.status_code
+                    except Exception:
+                        status = 599
+                    finally:
+                        probes.current.reset(token)
+                    if loop.time() >= measure_from:
+                        recorder.add(label, time.perf_counter() - started, status, counts)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return recorder.summary(duration)
+
+
+def current_commit() -> str:
+    """The checked-out commit, or "unknown" outside a git checkout."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASELINE_PATH.parent, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return result.stdout.strip()
+
+
+def setting_mismatches(environment: Dict, baseline: Dict) -> List[str]:
+    """Settings the baseline was measured with that differ from this run's."""
+    recorded = baseline.get("environment", {})
+    return [
+        f"{name}: baseline {recorded.get(name)!r}, now {environment[name]!r}"
+        for name in COMPARABLE_SETTINGS
+        if recorded.get(name) != environment[name]
+    ]
+
+
+def print_report(results: Dict[str, Dict], baseline: Dict = None, threshold: float = 0.2) -> List[str]:
+    """Print a table per scenario; return the regressions found against the baseline."""
+    regressions = []
+    header = f"{'endpoint':34} {'reqs':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>4} {'up/req':>7} {'redis/req':>9}"
+    for scenario, endpoints in results["scenarios"].items():
+        print(f"\n== {scenario} ({endpoints['_total']['requests']} requests, {endpoints['_total']['rps']} req/s)")
+        print(header)
+        base = (baseline or {}).get("scenarios", {}).get(scenario, {})
+        for label, row in endpoints.items():
+            if label == "_total":
+                continue
+            line = (
+                f"{label:34} {row['requests']:>6} {row['rps']:>7} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                f"{row['p99_ms']:>8} {row['errors']:>4} {row['upstream_per_request']:>7} {row['redis_per_request']:>9}"
+            )
+            old = base.get(label)
+            if old:
+                p95_change = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0
+                line += f"  p95 {p95_change:+.0%}"
+                if p95_change > threshold:
+                    regressions.append(f"{scenario} {label}: p95 {old['p95_ms']}ms -> {row['p95_ms']}ms")
+                for metric in ("upstream_per_request", "redis_per_request"):
+                    if row[metric] > old[metric] * (1 + threshold) + 0.05:
+                        regressions.append(f"{scenario} {label}: {metric} {old[metric]} -> {row[metric]}")
+            print(line)
+    return regressions
+
+
+def parse_args(argv=None):
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("-c", "--concurrency", type=int, default=20, help="Concurrent simulated clients")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="Measured seconds per scenario")
+    parser.add_argument("-w", "--warmup", type=float, default=3.0, help="Unmeasured seconds per scenario")
+    parser.add_argument("--products", type=int, default=200, help="Catalog size")
+    parser.add_argument("--users", type=int, default=50, help="Number of distinct logged-in users")
+    parser.add_argument("--description-bytes", type=int, default=2000, help="Product description size")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR, help="Directory of recorded payloads")
+    parser.add_argument("--wc-latency", type=Latency.parse, default=Latency(40, 10), help="WooCommerce latency, mean[:jitter] ms")
+    parser.add_argument("--wp-latency", type=Latency.parse, default=Latency(30, 5), help="WordPress latency, mean[:jitter] ms")
+    parser.add_argument("--stripe-latency", type=Latency.parse, default=Latency(150, 30), help="Stripe latency, mean[:jitter] ms")
+    parser.add_argument("--recaptcha-latency", type=Latency.parse, default=Latency(80, 10), help="reCAPTCHA latency, mean[:jitter] ms")
+    parser.add_argument("--redis", choices=["real", "fake"], default="real", help="Redis from REDIS_HOST, or fakeredis")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the fake upstreams")
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, type=Path, help="Store the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, type=Path, help="Compare against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change that counts as a regression")
+    return parser.parse_args(argv)
+
+
+async def main(args) -> int:
+    dataset = Dataset(
+        products=args.products,
+        users=args.users,
+        description_bytes=args.description_bytes,
+        fixtures_dir=args.fixtures,
+    )
+    latency = {"woocommerce": args.wc_latency, "wordpress": args.wp_latency, "stripe": args.stripe_latency}
+    upstreams = FakeUpstreams(dataset, latency, JWT_SECRET)
+
+    with UpstreamServer(upstreams, port=args.port) as server:
+        configure_environment(server.url)
+        logging.disable(logging.WARNING)
+
+        from app.main import app
+        from benchmarks import probes
+        from benchmarks.scenarios import SCENARIOS, Context
+
+        if args.redis == "fake":
+            use_fake_redis()
+        probes.install_http_probe(server.url)
+        probes.install_redis_probe()
+        probes.install_stripe_probe(server.url)
+        probes.install_recaptcha_stand_in(args.recaptcha_latency)
+
+        results = {
+            "environment": {
+                "commit": current_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "redis": args.redis,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "products": args.products,
+                "description_bytes": args.description_bytes,
+                "latency_ms": {
+                    name: [value.mean_ms, value.jitter_ms]
+                    for name, value in {**latency, "recaptcha": args.recaptcha_latency}.items()
+                },
+            },
+            "scenarios": {},
+        }
+        for name in args.scenario or list(SCENARIOS):
+            ctx = Context(dataset, JWT_SECRET, WEBHOOK_SECRET)
+            # The app prints from a few code paths; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                results["scenarios"][name] = await run_scenario(
+                    app, ctx, SCENARIOS[name], args.concurrency, args.warmup, args.duration
+                )
+            print(f"finished {name}", file=sys.stderr)
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    # Round-tripped through JSON, as the baseline was, so latencies compare as lists
+    mismatches = setting_mismatches(json.loads(json.dumps(results["environment"])), baseline) if baseline else []
+    regressions = print_report(results, None if mismatches else baseline, args.threshold)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nBaseline written to {args.save_baseline}")
+    if baseline is not None:
+        if mismatches:
+            print(f"\nBaseline {args.compare} (commit {baseline['environment'].get('commit', 'unknown')}) was run with other settings:")
+            for line in mismatches:
+                print(f"  {line}")
+            print("Re-record it with --save-baseline")
+            return 1
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,181 @@
+# benchmarks/scenarios.py
+"""
+Traffic mixes. A scenario is a weighted list of actions; an action returns
+the requests one simulated client sends for it, in order (a checkout is a
+quote followed by the order). Every request carries a label, the route
+template, so results group by endpoint rather than by URL.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import random
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+from jose import jwt
+
+from benchmarks.upstreams import Dataset
+
+API = "/api/v1"
+
+
+class Context:
+    """What actions need to build requests: the dataset, tokens and secrets."""
+
+    def __init__(self, dataset: Dataset, jwt_secret: str, webhook_secret: str, seed: int = 11):
+        self.data = dataset
+        self.rng = random.Random(seed)
+        self.webhook_secret = webhook_secret
+        self.tokens = {
+            user_id: jwt.encode({"data": {"user": {"id": user_id}}}, jwt_secret, algorithm="HS256")
+            for user_id in dataset.orders
+        }
+
+    def auth(self) -> Dict[str, str]:
+        user_id = self.rng.choice(list(self.tokens))
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def product(self) -> Dict:
+        # Popularity is skewed: a fifth of the catalog gets most of the views
+        products = self.data.products
+        hot = products[:max(1, len(products) // 5)]
+        return self.rng.choice(hot if self.rng.random() < 0.8 else products)
+
+
+def request(label: str, method: str, url: str, **kwargs) -> Dict:
+    return {"label": label, "method": method, "url": url, **kwargs}
+
+
+# -- Browse ------------------------------------------------------------------
+
+def browse_actions(authenticated: bool) -> List[Tuple[float, Callable]]:
+    def headers(ctx: Context) -> Dict[str, str]:
+        return ctx.auth() if authenticated else {}
+
+    def product_list(ctx):
+        params = {"page": ctx.rng.randint(1, 3), "per_page": 12, "fields": "card"}
+        if ctx.rng.random() < 0.3:
+            params["category"] = ctx.rng.choice(list(ctx.data.categories.values()))["slug"]
+        return [request("GET /products", "GET", f"{API}/products/", params=params, headers=headers(ctx))]
+
+    def featured(ctx):
+        return [request("GET /products/featured", "GET", f"{API}/products/featured", params={"fields": "card"}, headers=headers(ctx))]
+
+    def detail(ctx):
+        return [request("GET /products/{slug}", "GET", f"{API}/products/{ctx.product()['slug']}", headers=headers(ctx))]
+
+    def bundle(ctx):
+        return [request("GET /products/{slug}/bundle", "GET", f"{API}/products/{ctx.product()['slug']}/bundle", headers=headers(ctx))]
+
+    def reviews(ctx):
+        return [request("GET /reviews", "GET", f"{API}/reviews/", params={"product": ctx.product()["id"]}, headers=headers(ctx))]
+
+    def rating_summary(ctx):
+        ids = [ctx.product()["id"] for _ in range(12)]
+        return [request("GET /reviews/summary", "GET", f"{API}/reviews/summary", params={"product": ids}, headers=headers(ctx))]
+
+    def genres(ctx):
+        return [request("GET /products/genres", "GET", f"{API}/products/genres", headers=headers(ctx))]
+
+    actions = [
+        (30, product_list),
+        (10, featured),
+        (25, detail),
+        (10, bundle),
+        (10, reviews),
+        (10, rating_summary),
+        (5, genres),
+    ]
+    if authenticated:
+        def favorites_check(ctx):
+            ids = [ctx.product()["id"] for _ in range(12)]
+            return [request("GET /favorites/check", "GET", f"{API}/favorites/check", params={"ids": ids}, headers=ctx.auth())]
+
+        actions.append((10, favorites_check))
+    return actions
+
+
+# -- Library -----------------------------------------------------------------
+
+def library(ctx):
+    return [request("GET /products/library", "GET", f"{API}/products/library", params={"fields": "library"}, headers=ctx.auth())]
+
+
+def library_stream(ctx):
+    return [request(
+        "GET /products/library (ndjson)", "GET", f"{API}/products/library",
+        params={"fields": "library"}, headers={**ctx.auth(), "Accept": "application/x-ndjson"},
+    )]
+
+
+def order_history(ctx):
+    return [request("GET /orders", "GET", f"{API}/orders/", params={"per_page": 10}, headers=ctx.auth())]
+
+
+def favorite_products(ctx):
+    return [request("GET /products/favorites", "GET", f"{API}/products/favorites", headers=ctx.auth())]
+
+
+# -- Checkout ----------------------------------------------------------------
+
+def checkout(ctx):
+    headers = ctx.auth()
+    priced = [p for p in ctx.data.products if float(p["price"]) >= 0.5]
+    line_items = [{"product_id": p["id"], "quantity": 1, "total": p["price"]} for p in ctx.rng.sample(priced, ctx.rng.randint(1, 3))]
+    coupons = [{"code": ctx.rng.choice(ctx.data.coupons)["code"]}] if ctx.rng.random() < 0.3 else []
+    order = {
+        "payment_method": "stripe",
+        "payment_method_title": "Credit Card",
+        "set_paid": False,
+        "billing": {
+            "first_name": "Ada", "last_name": "Reader", "address_1": "1 Harbor Road", "city": "Portland",
+            "state": "ME", "postcode": "04101", "country": "US", "email": "ada@example.com", "phone": "555-0100",
+        },
+        "line_items": line_items,
+        "coupon_lines": coupons,
+    }
+    return [
+        request("POST /orders/quote", "POST", f"{API}/orders/quote", json={"line_items": line_items, "coupon_lines": coupons}, headers=headers),
+        request("POST /orders", "POST", f"{API}/orders/", json=order, headers={**headers, "Idempotency-Key": str(uuid.uuid4())}),
+    ]
+
+
+def login(ctx):
+    user_id = ctx.rng.choice(list(ctx.tokens))
+    return [request("POST /auth/login", "POST", f"{API}/auth/login", data={
+        "username": f"reader-{user_id}", "password": "bench", "recaptchaToken": "bench",
+    })]
+
+
+# -- Webhooks ----------------------------------------------------------------
+
+def product_webhook(ctx, product: Dict) -> Dict:
+    body = json.dumps({k: product[k] for k in ("id", "slug", "name", "price", "categories")}).encode()
+    signature = base64.b64encode(hmac.new(ctx.webhook_secret.encode(), body, hashlib.sha256).digest()).decode()
+    return request("POST /webhook/woocommerce", "POST", "/webhook/woocommerce", content=body, headers={
+        "Content-Type": "application/json",
+        "X-WC-Webhook-Topic": "product.updated",
+        "X-WC-Webhook-Signature": signature,
+    })
+
+
+def webhook_burst(ctx):
+    # A bulk edit in the admin fires one webhook per product, back to back
+    return [product_webhook(ctx, ctx.product()) for _ in range(ctx.rng.randint(3, 10))]
+
+
+SCENARIOS: Dict[str, List[Tuple[float, Callable]]] = {
+    "anonymous_browse": browse_actions(authenticated=False),
+    "logged_in_browse": browse_actions(authenticated=True),
+    "library": [(45, library), (10, library_stream), (30, order_history), (15, favorite_products)],
+    "checkout": [(85, checkout), (15, login)],
+    # Catalog edits arriving in bursts while shoppers browse: every webhook
+    # invalidates product caches the browse traffic is reading
+    "webhook_burst": [(w * 0.95, action) for w, action in browse_actions(authenticated=False)] + [(5, webhook_burst)],
+}
+
+
+def pick(ctx: Context, actions: List[Tuple[float, Callable]]) -> List[Dict]:
+    weights, funcs = zip(*actions)
+    return ctx.rng.choices(funcs, weights=weights)[0](ctx)
@@ -0,0 +1,414 @@
+# benchmarks/upstreams.py
+"""
+Stand-ins for WooCommerce, WordPress and Stripe.
+
+One Starlette app serves all three on a local port, built from the recorded
+payloads in fixtures/ (or any directory holding product/category/order/
+coupon/review JSON in the same shape). Every upstream answers after its own
+configurable latency, and product descriptions are padded to a configurable
+size so payload weight can be varied.
+"""
+import asyncio
+import copy
+import json
+import random
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import uvicorn
+from jose import jwt
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+WC_PREFIX = "/wp-json/wc/v3"
+AUTHORS = ["Mara Ellison", "Jon Okafor", "Priya Natarajan", "Lena Voss", "Tomas Reyes", "Hana Sato"]
+CATEGORY_NAMES = ["Fiction", "Mystery", "Science Fiction", "Poetry", "History", "Children"]
+TAG_NAMES = ["Literary", "Thriller", "Space", "Verse", "Memoir", "Adventure", "Classic", "Short"]
+
+
+class Latency:
+    """Response delay of one upstream: a mean plus normally distributed jitter, in ms."""
+
+    def __init__(self, mean_ms: float, jitter_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    def sample(self) -> float:
+        return max(0.0, random.gauss(self.mean_ms, self.jitter_ms)) / 1000
+
+    @classmethod
+    def parse(cls, value: str) -> "Latency":
+        """'40' or '40:10' (mean:jitter)"""
+        mean, _, jitter = value.partition(":")
+        return cls(float(mean), float(jitter or 0))
+
+
+def load_fixture(fixtures_dir: Path, name: str) -> Dict:
+    return json.loads((fixtures_dir / f"{name}.json").read_text())
+
+
+def pad(html: str, size: int) -> str:
+    """Repeat the paragraphs of `html` until it is about `size` bytes."""
+    if size <= len(html):
+        return html
+    return (html * (size // len(html) + 1))[:size]
+
+
+class Dataset:
+    """Catalog, orders, coupons, reviews and favorites built from the fixtures."""
+
+    def __init__(
+        self,
+        products: int = 200,
+        users: int = 50,
+        orders_per_user: int = 8,
+        reviews_per_product: int = 6,
+        description_bytes: int = 2000,
+        fixtures_dir: Path = FIXTURES_DIR,
+        seed: int = 7,
+    ):
+        rng = random.Random(seed)
+        product = load_fixture(fixtures_dir, "product")
+        category = load_fixture(fixtures_dir, "category")
+        order = load_fixture(fixtures_dir, "order")
+        coupon = load_fixture(fixtures_dir, "coupon")
+        review = load_fixture(fixtures_dir, "review")
+
+        self.categories = {}
+        for i, name in enumerate(CATEGORY_NAMES):
+            item = copy.deepcopy(category)
+            item.update(id=100 + i, name=name, slug=name.lower().replace(" ", "-"))
+            item["image"] = {**item["image"], "id": 5400 + i}
+            self.categories[item["id"]] = item
+        self.tags = [{"id": 200 + i, "name": name, "slug": name.lower(), "count": 0} for i, name in enumerate(TAG_NAMES)]
+
+        self.products: List[Dict] = []
+        for i in range(1, products + 1):
+            item = copy.deepcopy(product)
+            category = self.categories[100 + i % len(CATEGORY_NAMES)]
+            price = f"{rng.choice([0, 0.99, 2.99, 4.99, 9.99, 12.99, 19.99]):.2f}"
+            on_sale = i % 4 == 0
+            item.update(
+                id=i,
+                name=f"{product['name']} {i}",
+                slug=f"{product['slug']}-{i}",
+                sku=f"LKP-{i:04d}",
+                price=price,
+                regular_price=price,
+                sale_price=price if on_sale else "",
+                on_sale=on_sale,
+                featured=i % 10 == 0,
+                total_sales=rng.randint(0, 500),
+                average_rating=f"{rng.uniform(3, 5):.2f}",
+                rating_count=reviews_per_product,
+                date_created_gmt=f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00",
+                date_modified_gmt=f"2025-06-{1 + i % 28:02d}T{i % 24:02d}:00:00",
+                description=pad(product["description"], description_bytes),
+                categories=[{"id": category["id"], "name": category["name"], "slug": category["slug"]}],
+                tags=[{k: tag[k] for k in ("id", "name", "slug")} for tag in rng.sample(self.tags, 2)],
+                related_ids=rng.sample(range(1, products + 1), 3),
+            )
+            meta = [{"id": 9000 + i * 10, "key": "author", "value": AUTHORS[i % len(AUTHORS)]}]
+            # Half the catalog is ebooks, which is what the library lists
+            if i % 2:
+                meta.append({"id": 9001 + i * 10, "key": "_ebook_stream_url", "value": f"https://example.com/stream/{item['slug']}"})
+            item["meta_data"] = meta
+            self.products.append(item)
+        self.products_by_id = {p["id"]: p for p in self.products}
+        self.products_by_slug = {p["slug"]: p for p in self.products}
+
+        self.orders: Dict[int, List[Dict]] = {}
+        self.next_order_id = 10000
+        for user_id in range(1, users + 1):
+            self.orders[user_id] = []
+            for n in range(orders_per_user):
+                bought = rng.choice(self.products)
+                item = copy.deepcopy(order)
+                item.update(
+                    id=self.next_order_id,
+                    customer_id=user_id,
+                    total=bought["price"],
+                    date_created=f"2025-{1 + n % 12:02d}-{1 + user_id % 28:02d}T10:00:00",
+                )
+                item["line_items"] = [{
+                    **order["line_items"][0],
+                    "id": self.next_order_id * 10,
+                    "name": bought["name"],
+                    "product_id": bought["id"],
+                    "sku": bought["sku"],
+                    "subtotal": bought["price"],
+                    "total": bought["price"],
+                }]
+                self.orders[user_id].append(item)
+                self.next_order_id += 1
+
+        self.coupons = [
+            {**coupon, "id": coupon["id"] + i, "code": code, "amount": amount, "discount_type": kind}
+            for i, (code, amount, kind) in enumerate([
+                (coupon["code"], coupon["amount"], coupon["discount_type"]),
+                ("save5", "5.00", "fixed_cart"),
+                ("onedollar", "1.00", "fixed_product"),
+            ])
+        ]
+
+        self.reviews: Dict[int, List[Dict]] = {}
+        review_id = 1
+        for p in self.products:
+            self.reviews[p["id"]] = []
+            for n in range(reviews_per_product):
+                self.reviews[p["id"]].append({**review, "id": review_id, "product_id": p["id"], "rating": rng.randint(3, 5)})
+                review_id += 1
+
+        self.favorites = {user_id: set(rng.sample(range(1, products + 1), 5)) for user_id in range(1, users + 1)}
+
+
+def paginate(request: Request, items: List[Dict]) -> JSONResponse:
+    """WooCommerce style page with X-WP-Total headers and _fields projection."""
+    page = int(request.query_params.get("page", 1))
+    per_page = int(request.query_params.get("per_page", 10))
+    start = (page - 1) * per_page
+    data = items[start:start + per_page]
+
+    fields = request.query_params.get("_fields")
+    if fields:
+        wanted = fields.split(",")
+        data = [{k: item[k] for k in wanted if k in item} for item in data]
+
+    total_pages = (len(items) + per_page - 1) // per_page
+    return JSONResponse(data, headers={"X-WP-Total": str(len(items)), "X-WP-TotalPages": str(total_pages)})
+
+
+def id_list(request: Request, name: str) -> Optional[List[int]]:
+    values = request.query_params.getlist(name)
+    if not values:
+        return None
+    return [int(v) for value in values for v in value.split(",") if v]
+
+
+class FakeUpstreams:
+    """The Starlette app standing in for every upstream, plus per-upstream call counts."""
+
+    def __init__(self, dataset: Dataset, latency: Dict[str, Latency], jwt_secret: str):
+        self.data = dataset
+        self.latency = latency
+        self.jwt_secret = jwt_secret
+        self.calls = Counter()
+        self.app = Starlette(routes=[
+            Route(f"{WC_PREFIX}/products", self.products),
+            Route(f"{WC_PREFIX}/products/categories/{{category_id:int}}", self.category),
+            Route(f"{WC_PREFIX}/products/tags", self.tags),
+            Route(f"{WC_PREFIX}/products/reviews", self.reviews, methods=["GET", "POST"]),
+            Route(f"{WC_PREFIX}/orders", self.orders, methods=["GET", "POST"]),
+            Route(f"{WC_PREFIX}/orders/{{order_id:int}}", self.order, methods=["GET", "POST", "PUT"]),
+            Route(f"{WC_PREFIX}/coupons", self.coupons),
+            Route(f"{WC_PREFIX}/customers/{{customer_id:int}}", self.customer),
+            Route("/wp-json/wp/v2/users/me", self.me),
+            Route("/wp-json/jwt-auth/v1/token", self.token, methods=["POST"]),
+            Route("/wp-json/custom/v1/favorites", self.favorites),
+            Route("/wp-json/custom/v1/favorites/{action}", self.update_favorite, methods=["POST"]),
+            Route("/v1/payment_intents", self.payment_intent, methods=["POST"]),
+            Route("/v1/transfers", self.transfer, methods=["POST"]),
+        ])
+
+    async def wait(self, upstream: str):
+        self.calls[upstream] += 1
+        await asyncio.sleep(self.latency[upstream].sample())
+
+    def user_id(self, request: Request) -> Optional[int]:
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        try:
+            return int(jwt.decode(token, self.jwt_secret, algorithms=["HS256"])["data"]["user"]["id"])
+        except Exception:
+            return None
+
+    # -- WooCommerce --------------------------------------------------------
+
+    async def products(self, request: Request):
+        await self.wait("woocommerce")
+        q = request.query_params
+        items = self.data.products
+
+        if q.get("slug"):
+            item = self.data.products_by_slug.get(q["slug"])
+            items = [item] if item else []
+        include = id_list(request, "include")
+        if include is not None:
+            items = [self.data.products_by_id[i] for i in include if i in self.data.products_by_id]
+        exclude = id_list(request, "exclude")
+        if exclude:
+            items = [p for p in items if p["id"] not in exclude]
+        if q.get("featured") in ("true", "1", "True"):
+            items = [p for p in items if p["featured"]]
+        if q.get("category"):
+            items = [p for p in items if any(q["category"] in (str(c["id"]), c["slug"]) for c in p["categories"])]
+        if q.get("tag"):
+            items = [p for p in items if any(q["tag"] in (str(t["id"]), t["slug"]) for t in p["tags"])]
+        if q.get("search"):
+            term = q["search"].lower()
+            items = [p for p in items if term in p["name"].lower()]
+
+        if include is None:
+            field = {"title": "name", "price": "price", "popularity": "total_sales", "rating": "average_rating", "id": "id"}.get(
+                q.get("orderby", "date"), "date_created_gmt"
+            )
+            numeric = field in ("price", "average_rating")
+            items = sorted(items, key=lambda p: float(p[field] or 0) if numeric else p[field], reverse=q.get("order", "desc") == "desc")
+        return paginate(request, items)
+
+    async def category(self, request: Request):
+        await self.wait("woocommerce")
+        category = self.data.categories.get(request.path_params["category_id"])
+        if category is None:
+            return JSONResponse({"code": "woocommerce_rest_term_invalid"}, status_code=404)
+        return JSONResponse(category)
+
+    async def tags(self, request: Request):
+        await self.wait("woocommerce")
+        return JSONResponse(self.data.tags)
+
+    async def reviews(self, request: Request):
+        await self.wait("woocommerce")
+        if request.method == "POST":
+            review = await request.json()
+            created = {**review, "id": random.randint(10**6, 10**7), "status": "approved", "date_created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            self.data.reviews.setdefault(int(review["product_id"]), []).insert(0, created)
+            return JSONResponse(created, status_code=201)
+        product_id = int(request.query_params.get("product", 0))
+        return paginate(request, self.data.reviews.get(product_id, []))
+
+    async def orders(self, request: Request):
+        await self.wait("woocommerce")
+        if request.method == "POST":
+            return JSONResponse(self.create_order(await request.json()), status_code=201)
+        customer = int(request.query_params.get("customer", 0))
+        items = self.data.orders.get(customer, [])
+        status = request.query_params.get("status")
+        if status:
+            items = [o for o in items if o["status"] == status]
+        return paginate(request, items[::-1])
+
+    def create_order(self, payload: Dict) -> Dict:
+        total = 0.0
+        line_items = []
+        for item in payload.get("line_items", []):
+            product = self.data.products_by_id.get(item["product_id"], {})
+            price = float(product.get("price") or 0)
+            total += price * item["quantity"]
+            line_items.append({**item, "name": product.get("name"), "total": f"{price * item['quantity']:.2f}"})
+
+        order = {
+            "id": self.data.next_order_id,
+            "status": "pending",
+            "currency": "USD",
+            "date_created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "total": f"{total:.2f}",
+            "customer_id": payload.get("customer_id", 0),
+            "billing": payload.get("billing", {}),
+            "payment_method": payload.get("payment_method", "stripe"),
+            "payment_method_title": payload.get("payment_method_title", ""),
+            "line_items": line_items,
+        }
+        self.data.next_order_id += 1
+        self.data.orders.setdefault(order["customer_id"], []).append(order)
+        return order
+
+    async def order(self, request: Request):
+        await self.wait("woocommerce")
+        order_id = request.path_params["order_id"]
+        order = next((o for orders in self.data.orders.values() for o in orders if o["id"] == order_id), None)
+        if order is None:
+            return JSONResponse({"code": "woocommerce_rest_shop_order_invalid_id"}, status_code=404)
+        if request.method != "GET" and request.query_params.get("status"):
+            order["status"] = request.query_params["status"]
+        return JSONResponse(order)
+
+    async def coupons(self, request: Request):
+        await self.wait("woocommerce")
+        return paginate(request, self.data.coupons)
+
+    async def customer(self, request: Request):
+        await self.wait("woocommerce")
+        return JSONResponse({"id": request.path_params["customer_id"], "role": "customer"})
+
+    # -- WordPress ----------------------------------------------------------
+
+    async def me(self, request: Request):
+        await self.wait("wordpress")
+        user_id = self.user_id(request)
+        if user_id is None:
+            return JSONResponse({"code": "rest_not_logged_in"}, status_code=401)
+        return JSONResponse({"id": user_id, "name": f"Reader {user_id}", "slug": f"reader-{user_id}"})
+
+    async def token(self, request: Request):
+        await self.wait("wordpress")
+        form = await request.form()
+        user_id = int(str(form.get("username", "reader-1")).rsplit("-", 1)[-1] or 1)
+        return JSONResponse({
+            "token": jwt.encode({"data": {"user": {"id": user_id}}}, self.jwt_secret, algorithm="HS256"),
+            "user_id": user_id,
+            "username": form.get("username"),
+            "user_email": f"reader{user_id}@example.com",
+        })
+
+    async def favorites(self, request: Request):
+        await self.wait("wordpress")
+        return JSONResponse(sorted(self.data.favorites.get(self.user_id(request), set())))
+
+    async def update_favorite(self, request: Request):
+        await self.wait("wordpress")
+        favorites = self.data.favorites.setdefault(self.user_id(request), set())
+        product_id = int((await request.json())["product_id"])
+        if request.path_params["action"] == "add":
+            favorites.add(product_id)
+        else:
+            favorites.discard(product_id)
+        return JSONResponse(sorted(favorites))
+
+    # -- Stripe -------------------------------------------------------------
+
+    async def payment_intent(self, request: Request):
+        await self.wait("stripe")
+        form = await request.form()
+        intent_id = f"pi_bench{random.randint(10**8, 10**9)}"
+        return JSONResponse({
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": int(form.get("amount", 0)),
+            "currency": form.get("currency", "usd"),
+            "status": "requires_payment_method",
+            "client_secret": f"{intent_id}_secret_bench",
+            "metadata": {},
+        })
+
+    async def transfer(self, request: Request):
+        await self.wait("stripe")
+        return JSONResponse({"id": f"tr_bench{random.randint(10**8, 10**9)}", "object": "transfer"})
+
+
+class UpstreamServer:
+    """Runs the fake upstreams with uvicorn on a background thread, so their
+    work doesn't share the event loop of the app being measured."""
+
+    def __init__(self, upstreams: FakeUpstreams, host: str = "127.0.0.1", port: int = 8765):
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(upstreams.app, host=host, port=port, log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"Fake upstreams failed to start on {self.url}")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
@@ -0,0 +1,28 @@
+# tests/conftest.py
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Settings are read at import; nothing here is called
+for name, value in {
+    "WC_API_URL": "http://127.0.0.1:9/wp-json/wc/v3",
+    "WC_CONSUMER_KEY": "ck_test",
+    "WC_CONSUMER_SECRET": "cs_test",
+    "WC_WEBHOOK_SECRET": "wc_test",
+    "WP_URL": "http://127.0.0.1:9",
+    "JWT_SECRET": "jwt_test",
+    "WP_ADMIN_USER": "test",
+    "WP_ADMIN_PASS": "test",
+    "REDIRECT_URL": "http://localhost",
+    "STRIPE_SECRET_KEY": "sk_test",
+    "STRIPE_WEBHOOK_SECRET": "whsec_test",
+    "GOOGLE_APPLICATION_CREDENTIALS": "",
+    "RECAPTCHA_PROJECT_ID": "test",
+    "RECAPTCHA_SITE_KEY": "test",
+    "CORS_ORIGINS": '["http://localhost"]',
+    "REDIS_HOST": "127.0.0.1",
+    "REDIS_PORT": "6379",
+}.items():
+    os.environ.setdefault(name, value)
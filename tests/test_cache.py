@@ -0,0 +1,61 @@
+# tests/test_cache.py
+import asyncio
+
+import pytest
+from redis.asyncio import ConnectionPool, Redis
+
+from app.utils.cache import InstrumentedConnection
+from app.utils.deadline import deadline_scope
+
+SLOW_REPLY_DELAY = 0.3
+
+
+async def fake_redis_server(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Answers GET with the key itself, GET slow only after SLOW_REPLY_DELAY, anything else with +OK."""
+    try:
+        while True:
+            header = await reader.readline()
+            if not header:
+                return
+            args = []
+            for _ in range(int(header[1:])):
+                await reader.readline()  # $<length>
+                args.append((await reader.readline()).rstrip(b"\r\n"))
+            if args[0].upper() == b"GET":
+                key = args[1]
+                if key == b"slow":
+                    await asyncio.sleep(SLOW_REPLY_DELAY)
+                writer.write(b"$%d\r\n%s\r\n" % (len(key), key))
+            else:
+                writer.write(b"+OK\r\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def read_after_timed_out_read():
+    server = await asyncio.start_server(fake_redis_server, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    # One connection, so the second command reuses whatever the first left behind
+    pool = ConnectionPool(
+        host="127.0.0.1", port=port, max_connections=1, decode_responses=True,
+        connection_class=InstrumentedConnection,
+    )
+    client = Redis(connection_pool=pool)
+    try:
+        with deadline_scope(0.1):
+            with pytest.raises(TimeoutError):
+                await client.get("slow")
+        await asyncio.sleep(SLOW_REPLY_DELAY)  # The slow reply has been sent by now
+        return await client.get("fast")
+    finally:
+        await client.aclose()
+        await pool.disconnect()
+        server.close()
+        await server.wait_closed()
+
+
+def test_timed_out_read_does_not_leave_its_reply_for_the_next_command():
+    assert asyncio.run(read_after_timed_out_read()) == "fast"
@@ -0,0 +1,8 @@
+# tests/test_import_budget.py
+from benchmarks.coldstart import child_env, measure_import
+
+
+def test_importing_the_app_loads_no_lazy_module():
+    # Heavy SDKs are imported on first use; a module-level import of one is a cold-start regression
+    loaded = measure_import(child_env())["loaded"]
+    assert loaded == [], f"Loaded at import, should be lazy: {', '.join(loaded)}"